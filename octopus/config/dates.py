@@ -21,3 +21,6 @@ DATE_FORMATS = [
     "%B %Y",                # e.g. February 2014
     "%Y"                    # e.g. 1978
 ]
+
+# how many parsed date strings to remember, so that repeated values are not parsed again (0 to disable)
+DATE_PARSE_CACHE_SIZE = 10000
@@ -44,3 +44,64 @@ HTTP_STREAM_CUT_OFF = 0
 # When streaming content, size of chunks to download by (this default is 250Kb)
 HTTP_STREAM_CHUNK_SIZE = 262144
 
+# When downloading to a temporary file, the size at which the content will be moved from memory to disk
+# (this default is 10Mb)
+HTTP_STREAM_SPOOL_THRESHOLD = 10485760
+
+
+# Should requests be made through a pool of keep-alive sessions (one per host), so that connections are re-used
+# between requests to the same service?
+HTTP_POOL_SESSIONS = True
+
+# Number of connection pools each host's session will cache (one is needed for each host the session is redirected to)
+HTTP_POOL_CONNECTIONS = 10
+
+# Maximum number of connections to keep open in each connection pool
+HTTP_POOL_MAXSIZE = 10
+
+# If all the connections in a pool are in use, should further requests block until one is free (True), or open
+# an additional connection which will be discarded afterwards (False)?  Set to True to cap the number of connections
+# to each host at HTTP_POOL_MAXSIZE
+HTTP_POOL_BLOCK = False
+
+# Number of seconds a host's session may be idle before it is closed and replaced.  0 means never expire
+HTTP_POOL_IDLE_EXPIRY = 60
+
+# When making a batch of requests with fetch_many, the maximum number of requests to have in flight at once
+HTTP_BATCH_CONCURRENCY = 10
+
+# When making a batch of requests with fetch_many, the maximum number of requests to have in flight to any one
+# host at once.  0 means no limit other than HTTP_BATCH_CONCURRENCY
+HTTP_BATCH_PER_HOST_LIMIT = 4
+
+# When making a batch of requests with fetch_many, the minimum number of seconds between starting requests to any one
+# host.  0 means no limit
+HTTP_BATCH_MIN_INTERVAL = 0
+
+# Responses to GET requests made on behalf of a service (e.g. http.get(url, cache="EPMC")) are cached if
+# <SERVICE>_CACHE_TTL is set, in seconds.  Each service may also set <SERVICE>_CACHE_NEGATIVE_TTL,
+# <SERVICE>_CACHE_STALE_TTL and <SERVICE>_CACHE_TIERS to override the defaults below
+
+# The cache tiers to look responses up in, fastest first.  Available tiers are
+# octopus.lib.httpcache.MemoryTier, octopus.lib.httpcache.SQLiteTier and octopus.modules.cache.responses.ESTier
+HTTP_CACHE_TIERS = ["octopus.lib.httpcache.MemoryTier"]
+
+# Maximum number of responses to hold in the in-process cache tier
+HTTP_CACHE_MEMORY_SIZE = 1000
+
+# Maximum total size, in bytes, of the response bodies held in the in-process cache tier
+HTTP_CACHE_MEMORY_MAX_BYTES = 67108864
+
+# Responses larger than this, in bytes (e.g. EPMC full texts), are not held in the in-process cache tier at all,
+# though they are still cached in any other tiers
+HTTP_CACHE_MEMORY_MAX_ENTRY_BYTES = 1048576
+
+# Path to the database file for the SQLite cache tier
+HTTP_CACHE_SQLITE_PATH = None
+
+# Number of seconds to cache 404 and 410 responses for.  0 means don't cache them
+HTTP_CACHE_NEGATIVE_TTL = 3600
+
+# Number of seconds after a cached response expires for which it will still be served, while a fresh copy is
+# fetched in the background.  0 means always wait for the fresh copy
+HTTP_CACHE_STALE_TTL = 0
@@ -0,0 +1,14 @@
+# settings which name plugins (classes or functions), all of which are loaded and checked when the app is initialised
+# (see octopus.lib.plugin.initialise), so that a bad path stops the app starting rather than failing requests.  Each
+# is a dotted path through the config, starting with the setting name, where "*" stands for every value of a dict or
+# every item of a list
+PLUGIN_CONFIG_PATHS = [
+    "SEARCHAPI.*.query_builder",
+    "SEARCHAPI.*.dao",
+    "SEARCHAPI.*.results_filter",
+    "QUERY_ROUTE.*.*.dao",
+    "AUTOCOMPLETE_COMPOUND.*.dao",
+    "AUTOCOMPLETE_TERM.*.dao",
+    "ESDAO_ROLLING_PLUGINS.*",
+    "CRUD.*.model"
+]
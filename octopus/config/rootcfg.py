@@ -7,6 +7,7 @@ CONFIG_FILES = [
     "magnificent-octopus/octopus/config/googlemap.py",
     "magnificent-octopus/octopus/config/http.py",
     "magnificent-octopus/octopus/config/mail.py",
+    "magnificent-octopus/octopus/config/plugin.py",
     "magnificent-octopus/octopus/config/webapp.py",
 
     # octopus.module config files
@@ -75,6 +76,7 @@ SETUP_MODULES = [
 # module import paths for the startup modules that need to run at application startup (in the order you want them run)
 # (e.g. to do things like create/pre-populate the database)
 INITIALISE_MODULES = [
+    "octopus.lib.plugin",
     "octopus.modules.es.initialise",
     "service.initialise"
 ]
\ No newline at end of file
@@ -11,4 +11,23 @@ PORT = 5000
 SSL = True
 
 # Start the webapp with threading enabled?
-THREADED = False
\ No newline at end of file
+THREADED = False
+# rebuild the index of static files when a file can't be found, and check files for changes as they are
+# served (see octopus.lib.webapp.StaticIndex).  None to do so only when in debug mode
+STATIC_INDEX_RELOAD = None
+
+# minimum number of seconds between rebuilds of the static file index when reloading
+STATIC_INDEX_RELOAD_INTERVAL = 1
+
+# number of seconds static files may be cached by clients, and for fingerprinted files (name.<hash>.ext, or
+# requested with ?v=<hash>), which never change
+STATIC_MAX_AGE = 43200
+STATIC_IMMUTABLE_MAX_AGE = 31536000
+
+# content-codings of precompressed variants of static files (e.g. app.js.br, app.js.gz) to serve, where they
+# exist and the client accepts them, in order of preference.  Empty to only serve the files as they are
+STATIC_PRECOMPRESSED = []
+
+# file of fingerprinted asset names written by the asset build (its parameters.asset_map), which the asset_path
+# template function looks names up in.  None if assets are not fingerprinted
+ASSET_MAP_FILE = None
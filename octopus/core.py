@@ -86,6 +86,12 @@ def setup_jinja(app):
         return ''
     app.jinja_env.filters['debug']=jinja_debug
 
+    # the fingerprinted name of a built asset, e.g. {{ asset_path("js/app.js") }}
+    def asset_path(name):
+        from octopus.lib import webapp
+        return webapp.asset_path(name)
+    app.jinja_env.globals['asset_path'] = asset_path
+
 def setup_error_email(app):
     ADMINS = app.config.get('ADMINS', '')
     if not app.debug and ADMINS:
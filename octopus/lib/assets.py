@@ -1,71 +1,112 @@
 """
 Module for compiling javascript and css assets into minified resources with all dependencies satisfied
+
+Minification runs in parallel across a pool of processes (parameters.processes, default: one per cpu), and
+is incremental: each minified file is kept in the tmp dir under the hash of its source, and a manifest of
+those hashes means that sources which have not changed since the last build are not minified again.  Set
+parameters.incremental to false to rebuild everything from scratch.
+
+Any pipeline with "fingerprint" : true in its configuration emits fingerprinted names: the src pipelines
+write their output as <name>.<hash>.<ext> (recorded in the manifest's "outputs"), and the includes
+pipelines add ?v=<hash> to each reference, so that all of them can be served with far-future cache headers.
+Set parameters.asset_map to a file to write the fingerprinted names to, keyed by the output's path under its
+base path, for the app to find them with (see ASSET_MAP_FILE and octopus.lib.webapp.asset_path).
+
+With parameters.cleanup (the default) the working files are thrown away after the build; when building
+incrementally the minified files and the manifest are kept for next time, otherwise the whole tmp dir goes.
 """
-import json, shutil, os, subprocess, codecs, collections
+import json, shutil, os, subprocess, codecs, collections, hashlib, multiprocessing, glob, re
 from copy import deepcopy
-from random import randint
+
+class AssetException(Exception):
+    pass
+
+MANIFEST_FILE = "manifest.json"
 
 def build_assets(config, outputs=None):
-    # start by constructing the temporary file structure for the build
-    tmpdir = config.get("parameters", {}).get("tmp_dir", "tmp")
-    if os.path.exists(tmpdir):
+    params = config.get("parameters", {})
+    tmpdir = params.get("tmp_dir", "tmp")
+    incremental = params.get("incremental", True)
+
+    # start by constructing the temporary file structure for the build.  When building incrementally, the
+    # minified files from previous builds are kept, along with the manifest which describes them
+    if os.path.exists(tmpdir) and not incremental:
         shutil.rmtree(tmpdir)
-    os.mkdir(tmpdir)
 
     js_compdir = os.path.join(tmpdir, "js")
     css_compdir = os.path.join(tmpdir, "css")
-    os.mkdir(js_compdir)
-    os.mkdir(css_compdir)
-
-    # first, assemble the full config from the embedded imports
-    imports = config.get("import", {})
-    imported = []
-    for k, v in imports.iteritems():
-        with open(v) as f:
-            imp = json.loads(f.read())
-        localised = _localise_import(k, os.path.dirname(v), imp)
-        imported.append(localised)
-        localised_file = os.path.join(tmpdir, k + "_assets.json")
-        with open(localised_file, "w") as f:
-            f.write(json.dumps(localised, indent=2, sort_keys=True))
-
-    # now merge all the imports with the primary config
-    for imp in imported:
-        config = _merge_import(config, imp)
-    full_file = os.path.join(tmpdir, "full_assets.json")
-    with open(full_file, "w") as f:
-        f.write(json.dumps(config, indent=2, sort_keys=True))
-
-    # if no outputs are specified, do all of them
-    if outputs is None:
-        outputs = config.get("outputs", {}).keys()
-
-    # construct each output
-    for output in outputs:
-        # get a list of the assets that are the target of the build
-        outcfg = config.get("outputs", {}).get(output, {})
-        asset_idents = outcfg.get("assets", [])
-
-        # bottom out all the dependencies from the list
-        all_idents = _expand_dependencies(asset_idents, config)
-
-        # sequence the assets we want to use according to their dependencies
-        all_idents = _sequence(all_idents, config)
-
-        # filter the identifiers
-        filtered_idents = _filter_idents(all_idents, outcfg, config)
-
-        # resolve the source paths for each asset
-        sources = _resolve_sources(filtered_idents, config)
-
-        # apply the appropriate build pipelines to the list of ordered sources
-        pipelines = outcfg.get("pipelines", {}).keys()
-        for pipeline in pipelines:
-            PIPELINES[pipeline](output, sources, outcfg, config)
-
-    if config.get("parameters", {}).get("cleanup", True):
-        shutil.rmtree(tmpdir)
-
+    for d in [tmpdir, js_compdir, css_compdir]:
+        if not os.path.exists(d):
+            os.mkdir(d)
+
+    manifest = _load_manifest(tmpdir)
+    processes = params.get("processes")
+    pool = multiprocessing.Pool(processes if processes else None)
+    context = {"manifest" : manifest, "pool" : pool, "used" : set()}
+
+    try:
+        # first, assemble the full config from the embedded imports
+        imports = config.get("import", {})
+        imported = []
+        for k, v in imports.iteritems():
+            with open(v) as f:
+                imp = json.loads(f.read())
+            localised = _localise_import(k, os.path.dirname(v), imp)
+            imported.append(localised)
+            localised_file = os.path.join(tmpdir, k + "_assets.json")
+            with open(localised_file, "w") as f:
+                f.write(json.dumps(localised, indent=2, sort_keys=True))
+
+        # now merge all the imports with the primary config
+        for imp in imported:
+            config = _merge_import(config, imp)
+        full_file = os.path.join(tmpdir, "full_assets.json")
+        with open(full_file, "w") as f:
+            f.write(json.dumps(config, indent=2, sort_keys=True))
+
+        # if no outputs are specified, do all of them
+        if outputs is None:
+            outputs = config.get("outputs", {}).keys()
+
+        # construct each output
+        for output in outputs:
+            # get a list of the assets that are the target of the build
+            outcfg = config.get("outputs", {}).get(output, {})
+            asset_idents = outcfg.get("assets", [])
+
+            # bottom out all the dependencies from the list
+            all_idents = _expand_dependencies(asset_idents, config)
+
+            # sequence the assets we want to use according to their dependencies
+            all_idents = _sequence(all_idents, config)
+
+            # filter the identifiers
+            filtered_idents = _filter_idents(all_idents, outcfg, config)
+
+            # resolve the source paths for each asset
+            sources = _resolve_sources(filtered_idents, config)
+
+            # apply the appropriate build pipelines to the list of ordered sources
+            pipelines = outcfg.get("pipelines", {}).keys()
+            for pipeline in pipelines:
+                PIPELINES[pipeline](output, sources, outcfg, config, context)
+    finally:
+        pool.close()
+        pool.join()
+        _save_manifest(tmpdir, manifest)
+
+    if params.get("asset_map") is not None:
+        _save_json(params.get("asset_map"), manifest["outputs"])
+
+    if params.get("cleanup", True):
+        if not incremental:
+            shutil.rmtree(tmpdir)
+        else:
+            # throw away the working files, but keep the minified files which are still in use for next time
+            for fn in glob.glob(os.path.join(tmpdir, "*_assets.json")):
+                os.remove(fn)
+            if len(outputs) == len(config.get("outputs", {}).keys()):
+                _prune(manifest, context["used"], [js_compdir, css_compdir])
 
 def _merge_import(target, source):
     for k, v in source.iteritems():
@@ -103,6 +144,117 @@ def _cat(sources, outfile):
             f.write("\n")
 
 
+def _load_manifest(tmpdir):
+    path = os.path.join(tmpdir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"sources" : {}, "outputs" : {}}
+    with open(path) as f:
+        return json.loads(f.read())
+
+def _save_manifest(tmpdir, manifest):
+    _save_json(os.path.join(tmpdir, MANIFEST_FILE), manifest)
+
+def _save_json(path, obj):
+    with open(path + ".tmp", "w") as f:
+        f.write(json.dumps(obj, indent=2, sort_keys=True))
+    os.rename(path + ".tmp", path)
+
+def _hash_file(path, manifest):
+    # only read the file again if it has been touched since it was last hashed
+    st = os.stat(path)
+    entry = manifest["sources"].get(path)
+    if entry is not None and entry.get("mtime") == st.st_mtime and entry.get("size") == st.st_size:
+        return entry.get("hash")
+
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), ""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    manifest["sources"][path] = {"mtime" : st.st_mtime, "size" : st.st_size, "hash" : digest}
+    return digest
+
+def _run_job(cmd):
+    # runs in the pool's worker processes
+    print cmd
+    return subprocess.call(cmd, shell=True)
+
+def _minify(sources, compdir, template, context):
+    """
+    Minify each of the asset sources with the command template (which is formatted with source and out),
+    reusing the output of previous builds where the source and command are unchanged.
+
+    :return: the minified files, in the order of the sources
+    """
+    manifest = context["manifest"]
+    outputs = []
+    jobs = []
+    for source in sources:
+        if source[0] == "reference":
+            continue
+        path = source[1]
+        fn = os.path.split(path)[-1]
+
+        # the minified file is named for the source content and the command that produces it, so any change
+        # to either gives a new file
+        key = hashlib.sha1(_hash_file(path, manifest) + template).hexdigest()[:16]
+        out = os.path.join(compdir, key + "_" + fn)
+        outputs.append(out)
+        context["used"].add(out)
+        if not os.path.exists(out):
+            jobs.append((template.format(source=path, out=out + ".part"), out))
+
+    results = context["pool"].map(_run_job, [cmd for cmd, out in jobs])
+    for (cmd, out), code in zip(jobs, results):
+        if code != 0 or not os.path.exists(out + ".part"):
+            raise AssetException("Asset build command failed with code {x}: {y}".format(x=code, y=cmd))
+        os.rename(out + ".part", out)
+
+    return outputs
+
+def _write_output(path_elements, outcfg_pipeline, sources, config, context):
+    """
+    Concatenate the sources into the pipeline's output file, adding the fingerprint to the name if requested
+    """
+    outfile = _pathify(path_elements, config)
+    outdir = os.path.dirname(outfile)
+    if not os.path.exists(outdir):
+        os.makedirs(outdir)
+
+    if not outcfg_pipeline.get("fingerprint", False):
+        _cat(sources, outfile)
+        return outfile
+
+    tmp = outfile + ".tmp"
+    _cat(sources, tmp)
+    with open(tmp, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()[:10]
+    base, ext = os.path.splitext(outfile)
+    fingerprinted = base + "." + digest + ext
+
+    # remove the fingerprinted files from earlier builds
+    rx = re.compile(re.escape(os.path.basename(base)) + r"\.[0-9a-f]{10}" + re.escape(ext) + "$")
+    for old in glob.glob(base + ".*" + ext):
+        if old != fingerprinted and rx.match(os.path.basename(old)):
+            os.remove(old)
+    os.rename(tmp, fingerprinted)
+
+    # record the name the output is served under, against the name it is asked for by
+    name = path_elements[1]
+    context["manifest"]["outputs"][name] = os.path.join(os.path.dirname(name), os.path.basename(fingerprinted))
+    return fingerprinted
+
+def _prune(manifest, used, compdirs):
+    for compdir in compdirs:
+        for fn in os.listdir(compdir):
+            path = os.path.join(compdir, fn)
+            if path not in used:
+                os.remove(path)
+    for path in manifest["sources"].keys():
+        if not os.path.exists(path):
+            del manifest["sources"][path]
+
+
 def _filter_idents(idents, outcfg, config):
 
     if "exclude" in outcfg:
@@ -231,48 +383,38 @@ def _sequence_dependencies(dependencies):
 
     return sequenced
 
-def _random():
-    return str(randint(10000, 99999))
-
-
-def _css_pipeline(name, sources, outcfg, config):
+def _css_pipeline(name, sources, outcfg, config, context):
     node = config.get("parameters", {}).get("node", "node")
     r_file = config.get("parameters", {}).get("r_file", "r.js")
     tmpdir = config.get("parameters", {}).get("tmp_dir", "tmp")
     css_compdir = os.path.join(tmpdir, "css")
 
-    outputs = []
-    for source in sources:
-        if source[0] == "reference":
-            continue
-        fn = os.path.split(source[1])[-1]
-        prefix = name + "_" + _random()
-        out = os.path.join(css_compdir, prefix + "_" + fn)
-        outputs.append(out)
-        cmd = "{node} {r_file} -o cssIn={source} out={out} baseUrl=.".format(node=node, r_file=r_file, source=source[1], out=out)
-        print cmd
-        print subprocess.call(cmd, shell=True)
+    template = "{node} {r_file} -o cssIn={{source}} out={{out}} baseUrl=.".format(node=node, r_file=r_file)
+    outputs = _minify(sources, css_compdir, template, context)
+
+    pipecfg = outcfg.get("pipelines", {}).get("css-src", {})
+    _write_output(pipecfg.get("out"), pipecfg, outputs, config, context)
 
-    path_elements = outcfg.get("pipelines", {}).get("css-src", {}).get("out")
-    outfile = _pathify(path_elements, config)
-    outdir = os.path.dirname(outfile)
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
-    _cat(outputs, outfile)
 
+def _include_path(source, substitutions, pipecfg, context):
+    s = source[1]
+    for sub, rep in substitutions.iteritems():
+        if s.startswith(sub):
+            s = s.replace(sub, rep, 1)
+            break
+    if pipecfg.get("fingerprint", False) and source[0] == "asset":
+        s += ("&" if "?" in s else "?") + "v=" + _hash_file(source[1], context["manifest"])[:10]
+    return s
 
-def _css_includes_pipeline(name, sources, outcfg, config):
-    substitutions = outcfg.get("pipelines", {}).get("css-includes", {}).get("path_prefix_substitutions", {})
+def _css_includes_pipeline(name, sources, outcfg, config, context):
+    pipecfg = outcfg.get("pipelines", {}).get("css-includes", {})
+    substitutions = pipecfg.get("path_prefix_substitutions", {})
     frag = ""
     for source in sources:
-        s = source[1]
-        for sub, rep in substitutions.iteritems():
-            if s.startswith(sub):
-                s = s.replace(sub, rep, 1)
-                break
+        s = _include_path(source, substitutions, pipecfg, context)
         frag += '<link rel="stylesheet" href="' + s + '">\n'
 
-    path_elements = outcfg.get("pipelines", {}).get("css-includes", {}).get("out")
+    path_elements = pipecfg.get("out")
     outfile = _pathify(path_elements, config)
     outdir = os.path.dirname(outfile)
     if not os.path.exists(outdir):
@@ -280,44 +422,28 @@ def _css_includes_pipeline(name, sources, outcfg, config):
     with codecs.open(outfile, "wb", "utf-8") as f:
         f.write(frag)
 
-def _js_pipeline(name, sources, outcfg, config):
+def _js_pipeline(name, sources, outcfg, config, context):
     node = config.get("parameters", {}).get("node", "node")
     uglify = config.get("parameters", {}).get("uglify", "uglifyjs")
     tmpdir = config.get("parameters", {}).get("tmp_dir", "tmp")
     js_compdir = os.path.join(tmpdir, "js")
 
-    outputs = []
-    for source in sources:
-        if source[0] == "reference":
-            continue
-        fn = os.path.split(source[1])[-1]
-        prefix = name + "_" + _random()
-        out = os.path.join(js_compdir, prefix + "_" + fn)
-        outputs.append(out)
-        cmd = "{node} {uglify} -o {out} {source}".format(node=node, uglify=uglify, source=source[1], out=out)
-        print cmd
-        print subprocess.call(cmd, shell=True)
+    template = "{node} {uglify} -o {{out}} {{source}}".format(node=node, uglify=uglify)
+    outputs = _minify(sources, js_compdir, template, context)
 
-    path_elements = outcfg.get("pipelines", {}).get("js-src", {}).get("out")
-    outfile = _pathify(path_elements, config)
-    outdir = os.path.dirname(outfile)
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
-    _cat(outputs, outfile)
+    pipecfg = outcfg.get("pipelines", {}).get("js-src", {})
+    _write_output(pipecfg.get("out"), pipecfg, outputs, config, context)
 
 
-def _js_includes_pipeline(name, sources, outcfg, config):
-    substitutions = outcfg.get("pipelines", {}).get("js-includes", {}).get("path_prefix_substitutions", {})
+def _js_includes_pipeline(name, sources, outcfg, config, context):
+    pipecfg = outcfg.get("pipelines", {}).get("js-includes", {})
+    substitutions = pipecfg.get("path_prefix_substitutions", {})
     frag = ""
     for source in sources:
-        s = source[1]
-        for sub, rep in substitutions.iteritems():
-            if s.startswith(sub):
-                s = s.replace(sub, rep, 1)
-                break
+        s = _include_path(source, substitutions, pipecfg, context)
         frag += '<script type="text/javascript" src="' + s + '"></script>\n'
 
-    path_elements = outcfg.get("pipelines", {}).get("js-includes", {}).get("out")
+    path_elements = pipecfg.get("out")
     outfile = _pathify(path_elements, config)
     outdir = os.path.dirname(outfile)
     if not os.path.exists(outdir):
@@ -325,19 +451,15 @@ def _js_includes_pipeline(name, sources, outcfg, config):
     with codecs.open(outfile, "wb", "utf-8") as f:
         f.write(frag)
 
-def _concatenate(name, sources, outcfg, config):
+def _concatenate(name, sources, outcfg, config, context):
     outputs = []
     for source in sources:
         if source[0] == "reference":
             continue
         outputs.append(source[1])
 
-    path_elements = outcfg.get("pipelines", {}).get("cat", {}).get("out")
-    outfile = _pathify(path_elements, config)
-    outdir = os.path.dirname(outfile)
-    if not os.path.exists(outdir):
-        os.makedirs(outdir)
-    _cat(outputs, outfile)
+    pipecfg = outcfg.get("pipelines", {}).get("cat", {})
+    _write_output(pipecfg.get("out"), pipecfg, outputs, config, context)
 
 
 PIPELINES = {
@@ -0,0 +1,247 @@
+"""
+Character encoding detection for uploaded files.
+
+Rather than decoding a file with each candidate encoding in turn until one works, the bytes are read once: a byte
+order mark or valid UTF-8 settles it straight away, and otherwise the first of the candidate single-byte encodings
+which can read a sample of the non-ASCII text is used, unless a later candidate reads it with clearly less evidence
+of being the wrong code page.  Results are cached by the hash of the file content, so the same file is only
+examined once.
+"""
+from collections import OrderedDict
+import codecs, hashlib, re, threading, unicodedata
+
+# how much of the non-ASCII part of the file to score the single-byte candidates against
+SAMPLE_SIZE = 65536
+
+# how many file hashes to remember the encoding of
+CACHE_SIZE = 1024
+
+# the size of the blocks a file is read in
+CHUNK_SIZE = 65536
+
+BOMS = [
+    (codecs.BOM_UTF32_LE, "utf-32"),    # checked before utf-16, as it starts with the utf-16 LE BOM
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+]
+
+class EncodingException(Exception):
+    pass
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def detect(data, candidates):
+    """
+    Choose the encoding from the candidates (in order of preference) which best reads the bytes
+
+    :param data: the bytes
+    :param candidates: list of encoding names
+    :return: the encoding name, or None if none of the candidates can read the data
+    """
+    detector = _Detector(candidates)
+    detector.feed(data, final=True)
+    return detector.finish()
+
+def detect_file(path, candidates):
+    """
+    Choose the encoding from the candidates which best reads the file, reading it once in blocks.  The result is
+    cached against the hash of the content.
+
+    :return: the encoding name, or None if none of the candidates can read the file
+    """
+    # hash the file first, so that a file we have seen before is not examined again
+    hasher = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), ""):
+            hasher.update(block)
+
+    key = (hasher.hexdigest(), tuple(candidates))
+    hit = _cache_get(key)
+    if hit is not None:
+        return hit
+
+    detector = _Detector(candidates)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), ""):
+            detector.feed(block)
+    detector.feed("", final=True)
+    enc = detector.finish()
+    _cache_put(key, enc)
+    return enc
+
+def decode(data, candidates):
+    """
+    Decode the bytes with the encoding from the candidates which best reads them.  The chosen encoding is cached
+    against the hash of the data.
+
+    :return: tuple of (unicode text, encoding name)
+    """
+    key = (hashlib.sha1(data).hexdigest(), tuple(candidates))
+    enc = _cache_get(key)
+    if enc is None:
+        enc = detect(data, candidates)
+        if enc is None:
+            raise EncodingException(u"None of the encodings {x} can read the data".format(x=u", ".join(candidates)))
+        _cache_put(key, enc)
+    return data.decode(enc), enc
+
+def decode_file(path, candidates):
+    """
+    Read the file and decode it as in decode()
+
+    :return: tuple of (unicode text, encoding name)
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    return decode(data, candidates)
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+def _cache_get(key):
+    with _cache_lock:
+        enc = _cache.pop(key, None)
+        if enc is not None:
+            _cache[key] = enc
+        return enc
+
+def _cache_put(key, enc):
+    if enc is None:
+        return
+    with _cache_lock:
+        _cache.pop(key, None)
+        _cache[key] = enc
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def _canonical(name):
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+_NON_ASCII = re.compile("[\x80-\xff]")
+
+class _Detector(object):
+    """
+    Works out the encoding of a byte stream fed to it in blocks: the first block is checked for a byte order mark,
+    and every block is run through a UTF-8 decoder (if UTF-8 is a candidate) to find out whether the stream is
+    valid UTF-8 as a whole.  If not, the single-byte candidates are checked against a sample of the non-ASCII parts
+    of the stream, which is all that distinguishes them, and the first of those with the least evidence against it
+    is chosen.
+    """
+    def __init__(self, candidates):
+        self.candidates = [c for c in candidates if _canonical(c) is not None]
+        self.bom = None
+        self.ascii = True
+        self.sample = ""
+        self._started = False
+        self._utf8 = None
+        for c in self.candidates:
+            if _canonical(c) == "utf-8":
+                self._utf8 = c
+                break
+        self._utf8_decoder = codecs.getincrementaldecoder("utf-8")() if self._utf8 is not None else None
+
+    def feed(self, block, final=False):
+        if not self._started:
+            self._started = True
+            for bom, enc in BOMS:
+                if block.startswith(bom):
+                    self.bom = enc
+                    break
+        if self.bom is not None:
+            return
+        match = _NON_ASCII.search(block)
+        if match is not None:
+            self.ascii = False
+            if len(self.sample) < SAMPLE_SIZE:
+                start = max(0, match.start() - 64)
+                self.sample += block[start:start + SAMPLE_SIZE - len(self.sample)]
+        if self._utf8_decoder is not None and not self.ascii:
+            try:
+                self._utf8_decoder.decode(block, final)
+            except UnicodeDecodeError:
+                self._utf8_decoder = None
+
+    def finish(self):
+        if self.bom is not None:
+            return self.bom
+        if len(self.candidates) == 0:
+            return None
+        if self.ascii:
+            return self.candidates[0]
+        if self._utf8_decoder is not None:
+            return self._utf8
+
+        best, best_penalty = None, None
+        for c in self.candidates:
+            if _canonical(c).startswith("utf"):
+                continue
+            try:
+                text = self.sample.decode(c)
+            except UnicodeDecodeError:
+                continue
+            penalty = _penalty(text)
+            if best_penalty is None or penalty < best_penalty:
+                best, best_penalty = c, penalty
+            if penalty == 0:
+                break
+        return best
+
+# runs of letters
+_WORDS = re.compile(ur"[^\W\d_]+", re.UNICODE)
+
+# the kinds of non-ASCII character other than letters which are to be expected in text: currency symbols, dashes,
+# quotes and spaces
+_PLAUSIBLE = frozenset(["Sc", "Pd", "Pi", "Pf", "Zs"])
+
+def _penalty(text):
+    """
+    How much evidence there is that the text was decoded with the wrong code page: control characters and unassigned
+    code points count heavily, and unlikely symbols in the middle of a word, letters from different scripts in the
+    same word, capitals in the middle of a word, and long "latin" words with no ASCII letters in them at all (which
+    is what Cyrillic looks like in cp1252) count against it too.
+    """
+    penalty = 0
+    for word in _WORDS.findall(text):
+        penalty += _word_penalty(word)
+
+    for i, ch in enumerate(text):
+        if ch < u"\x80" or ch.isalpha():
+            continue
+        cat = unicodedata.category(ch)
+        if cat in ("Cc", "Cn", "Co"):
+            penalty += 10
+        elif cat not in _PLAUSIBLE and 0 < i < len(text) - 1 and text[i - 1].isalpha() and text[i + 1].isalpha():
+            penalty += 1
+    return penalty
+
+def _word_penalty(word):
+    ascii_letters = 0
+    latin = 0
+    other = 0
+    for ch in word:
+        if ch < u"\x80":
+            ascii_letters += 1
+        elif unicodedata.name(ch, "").startswith("LATIN"):
+            latin += 1
+        else:
+            other += 1
+    if latin + other == 0:
+        return 0
+
+    penalty = 0
+    if other > 0 and (ascii_letters > 0 or latin > 0):
+        penalty += 2
+    if latin >= 4 and ascii_letters == 0 and other == 0:
+        penalty += 2
+
+    for i in range(1, len(word)):
+        if word[i] >= u"\x80" and word[i].isupper() and word[i - 1].islower():
+            penalty += 1
+    return penalty
@@ -1,6 +1,7 @@
 import csv, codecs, re, os
 import cStringIO
 from octopus.core import app
+from octopus.lib import charsets
 from StringIO import StringIO
 
 class CsvReadException(Exception):
@@ -15,9 +16,14 @@ class ClCsv():
                  output_encoding="utf-8", input_encoding="utf-8",
                  try_encodings_hard=True, fallback_input_encodings=None,
                  from_row=0, from_col=0, ignore_blank_rows=False,
-                 input_dialect=csv.excel):
+                 input_dialect=csv.excel, streaming=False):
         """
         Class to wrap the Python CSV library. Allows reading and writing by column.
+
+        In streaming mode the sheet is not read into memory: objects() reads the rows from the file as they are
+        asked for, and add_object() writes each row out as it is added, so the sheet can be any size.  Only the
+        row-wise operations (headers, set_headers, objects, add_object, triples, save) are available.
+
         :param file_path: A file object or path to a file. Will create one at specified path if it does not exist.
         """
         self.file_path = None
@@ -27,7 +33,7 @@ class ClCsv():
         # useful to know about this for any future work on encodings: https://docs.python.org/2.4/lib/standard-encodings.html
         if fallback_input_encodings is None and try_encodings_hard:
             fallback_input_encodings = ["cp1252", "cp1251", "iso-8859-1", "iso-8859-2", "windows-1252", "windows-1251", "mac_roman"]
-        else:
+        elif not try_encodings_hard:
             fallback_input_encodings = []
         self.fallback_input_encodings = fallback_input_encodings
 
@@ -39,6 +45,12 @@ class ClCsv():
         # Store the csv contents in a list of tuples, [ (column_header, [contents]) ]
         self.data = []
 
+        # the row reader and writer, in streaming mode
+        self.streaming = streaming
+        self._reader = None
+        self._writer = None
+        self._writer_headers = []
+
         # Get an open file object from the given file_path or file object
         if file_path is not None:
             if type(file_path) == file:
@@ -55,7 +67,12 @@ class ClCsv():
                 self._read_file(self.file_object)
             else:
                 self.file_path = file_path
-                if os.path.exists(file_path) and os.path.isfile(file_path):
+                if os.path.exists(file_path) and os.path.isfile(file_path) and streaming:
+                    self.input_encoding = self._detect_encoding(file_path)
+                    self._reader = CsvRowReader(file_path, encoding=self.input_encoding, dialect=self.input_dialect,
+                                                from_row=self.from_row, from_col=self.from_col,
+                                                ignore_blank_rows=self.ignore_blank_rows)
+                elif os.path.exists(file_path) and os.path.isfile(file_path):
                     self._read_from_path(file_path)
                 else:
                     # If the file doesn't exist, create it.
@@ -65,22 +82,23 @@ class ClCsv():
             self.file_object = writer
 
     def _read_from_path(self, file_path):
+        # read the bytes once, work out the encoding from them (see octopus.lib.charsets), and decode them once
         codes = [self.input_encoding] + self.fallback_input_encodings
-        for code in codes:
-            try:
-                file_object = codecs.open(file_path, 'r+b', encoding=code)
-                self._read_file(file_object)
-                self.file_object = file_object
-                self.input_encoding = code
-                return
-            except CsvReadException as e:
-                app.logger.info(e.message)
-            except CsvStructureException as e:
-                app.logger.info(e.message)
-            except Exception as e:
-                app.logger.info(e.message)
-        # if we get to here, we were unable to read the file using any method
-        raise CsvReadException("Unable to find a codec which can parse the file correctly")
+        try:
+            text, code = charsets.decode_file(file_path, codes)
+        except (charsets.EncodingException, UnicodeDecodeError) as e:
+            app.logger.info(e.message)
+            raise CsvReadException("Unable to find a codec which can parse the file correctly")
+
+        self.input_encoding = code
+        self._read_file(iter(text.splitlines(True)))
+        self.file_object = codecs.open(file_path, 'r+b', encoding=code)
+
+    def _detect_encoding(self, file_path):
+        code = charsets.detect_file(file_path, [self.input_encoding] + self.fallback_input_encodings)
+        if code is None:
+            raise CsvReadException("Unable to find a codec which can parse the file correctly")
+        return code
 
     def _read_file(self, file_object):
         """
@@ -88,8 +106,8 @@ class ClCsv():
         :return: Entire CSV contents, a list of rows (like the standard csv lib)
         """
         try:
-            if file_object.closed:
-                codecs.open(file_object.name, 'r+b', encoding=self.input_encoding)
+            if getattr(file_object, "closed", False):
+                file_object = codecs.open(file_object.name, 'r+b', encoding=self.input_encoding)
 
             reader = UnicodeReader(file_object, output_encoding=self.output_encoding, dialect=self.input_dialect)
             rows = []
@@ -109,9 +127,21 @@ class ClCsv():
         Return the headers of all of the columns in the csv in the order that they appear
         :return: just the headers
         """
+        if self._reader is not None:
+            return self._reader.headers
+        if self.streaming:
+            return self._writer_headers
         return [h for h, _ in self.data]
 
     def set_headers(self, headers):
+        if self.streaming:
+            if self._writer is not None:
+                raise CsvStructureException("Headers cannot be changed once rows have been written")
+            for h in headers:
+                if h not in self._writer_headers:
+                    self._writer_headers.append(h)
+            return
+
         for h in headers:
             c = self.get_column(h)
             if c is None:
@@ -122,9 +152,8 @@ class ClCsv():
         Iterate over the columns in the csv in the order that they appear
         :return: a generator which yields columns
         """
-        headers = self.headers()
-        for h in headers:
-            col = self.get_column(h)
+        self._not_streaming("columns")
+        for col in self.data:
             yield col
 
     def objects(self):
@@ -133,18 +162,31 @@ class ClCsv():
         as objects keyed by the header row
         :return: a generator which yields objects
         """
-        _, c = self.get_column(0)
-        size = len(c)
-        headers = self.headers()
-        for i in range(size):
+        if self._reader is not None:
+            for obj in self._reader.objects():
+                yield obj
+            return
+        if self.streaming or len(self.data) == 0:
+            return
+
+        # where a header is repeated, the first column with it is used, as get_column does
+        index = _header_index(self.headers())
+        cols = [c for _, c in self.data]
+        for i in range(len(cols[0])):
             obj = {}
-            for h in headers:
-                _, col = self.get_column(h)
-                val = col[i]
-                obj[h] = val
+            for h, j in index.iteritems():
+                obj[h] = cols[j][i]
             yield obj
 
     def add_object(self, obj):
+        if self.streaming:
+            if self._reader is not None:
+                raise CsvStructureException("Rows cannot be added to a sheet which is being read in streaming mode")
+            if self._writer is None:
+                self._writer = CsvRowWriter(self.file_object, self._writer_headers, encoding=self.output_encoding)
+            self._writer.write_object(obj)
+            return
+
         for h, c in self.columns():
             v = obj.get(h)
             if v is not None:
@@ -158,22 +200,34 @@ class ClCsv():
         first value in the row as the indices, and the value in the intersecting cell
         :return: (column header, row title, value)
         """
-        _, c = self.get_column(0)
         headers = self.headers()
+        if self._reader is not None:
+            for row in self._reader.rows():
+                for x, val in zip(headers[1:], row[1:]):
+                    yield x, row[0], val
+            return
+        if self.streaming or len(self.data) == 0:
+            return
 
+        _, c = self.get_column(0)
+        cols = [col for _, col in self.data[1:]]
         vert = 0
         for y in c:
-            for x in headers[1:]:
-                _, col = self.get_column(x)
+            for x, col in zip(headers[1:], cols):
                 yield x, y, col[vert]
             vert += 1
 
+    def _not_streaming(self, op):
+        if self.streaming:
+            raise CsvStructureException("{x} is not available in streaming mode".format(x=op))
+
     def get_column(self, col_identifier):
         """
         Get a column from the CSV file.
         :param col_identifier: An int column index or a str column heading.
         :return: The column, as a { heading : [contents] } dict.
         """
+        self._not_streaming("get_column")
         try:
             if type(col_identifier) == int:
                 # get column by index
@@ -192,6 +246,7 @@ class ClCsv():
         :param col_identifier: An int column index or a str column heading.
         :param col_contents: The contents for the column
         """
+        self._not_streaming("set_column")
         try:
             if type(col_identifier) == int:
                 self.data[col_identifier] = col_contents
@@ -228,10 +283,12 @@ class ClCsv():
         :return: The row number
         """
 
+        self._not_streaming("get_rownumber")
         try:
             (col_name, col_contents) = self.data[0]
-            col_data = [col_name] + col_contents
-            return col_data.index(first_col_val)
+            if col_name == first_col_val:
+                return 0
+            return col_contents.index(first_col_val) + 1
         except ValueError:
             return None
 
@@ -239,31 +296,31 @@ class ClCsv():
         """
         Write and close the file.
         """
-        rows = []
+        if self.streaming:
+            # everything has already been written as it was added, unless there were no rows
+            if self._writer is None and self._reader is None:
+                self._writer = CsvRowWriter(self.file_object, self._writer_headers, encoding=self.output_encoding)
+                self._writer.write_headers()
+            if close and self._reader is None:
+                self.file_object.close()
+            return
+
         # find out how many rows we're going to need to write
         max_rows = 0
         for _, cont in self.data:
             if len(cont) > max_rows:
                 max_rows = len(cont)
-        max_rows += 1 # add the header row
-
-        for i in range(0, max_rows):
-            row = []
-            for (col_name, col_contents) in self.data:
-                col_data = [col_name] + col_contents
-                if len(col_data) > i:
-                    row.append(col_data[i])
-                else:
-                    row.append("")
-            rows.insert(i, row)
 
         # Remove current contents of file
         self.file_object.seek(0)
         self.file_object.truncate()
 
-        # Write new CSV data
+        # Write new CSV data, a row at a time
         writer = UnicodeWriter(self.file_object, encoding=self.output_encoding)
-        writer.writerows(rows)
+        writer.writerow([col_name for col_name, _ in self.data])
+        cols = [col_contents for _, col_contents in self.data]
+        for i in range(0, max_rows):
+            writer.writerow([col[i] if len(col) > i else "" for col in cols])
 
         if close:
             self.file_object.close()
@@ -274,7 +331,7 @@ class ClCsv():
         return None
 
     def _is_empty(self, row):
-        return sum([1 if c is not None and c != "" else 0 for c in row]) == 0
+        return _is_empty(row)
 
     def _populate_data(self, csv_rows):
         # Reset the stored data
@@ -293,6 +350,86 @@ class ClCsv():
                 col_data.append(row[i])
             self.data.append((csv_rows[self.from_row][i], col_data))    # register along with the header
 
+class CsvRowReader(object):
+    """
+    Reads the rows of a csv file lazily, one at a time, for ClCsv's streaming mode.  The header row (at from_row)
+    is read when the reader is created, and the header to column index map is built once from it.
+    """
+    def __init__(self, path, encoding="utf-8", dialect=csv.excel, from_row=0, from_col=0, ignore_blank_rows=False):
+        self.path = path
+        self.encoding = encoding
+        self.dialect = dialect
+        self.from_row = from_row
+        self.from_col = from_col
+        self.ignore_blank_rows = ignore_blank_rows
+
+        self.headers = []
+        for i, row in enumerate(self._raw_rows()):
+            if i == self.from_row:
+                self.headers = row[self.from_col:]
+                break
+        self.header_index = _header_index(self.headers)
+
+    def _raw_rows(self):
+        with codecs.open(self.path, 'rb', encoding=self.encoding) as f:
+            for row in UnicodeReader(f, dialect=self.dialect):
+                yield row
+
+    def rows(self):
+        """
+        Iterate over the body rows of the sheet, as lists of values lined up with the headers
+        """
+        width = len(self.headers)
+        for i, row in enumerate(self._raw_rows()):
+            if i <= self.from_row:
+                continue
+            row = row[self.from_col:]
+            if self.ignore_blank_rows and _is_empty(row):
+                continue
+            if len(row) < width:
+                row += [u""] * (width - len(row))
+            yield row[:width]
+
+    def objects(self):
+        """
+        Iterate over the body rows of the sheet, as objects keyed by the headers
+        """
+        index = self.header_index.items()
+        for row in self.rows():
+            yield dict((h, row[i]) for h, i in index)
+
+class CsvRowWriter(object):
+    """
+    Writes rows to a csv file as they are given, for ClCsv's streaming mode.  The header row is written before
+    the first row.
+    """
+    def __init__(self, file_object, headers, encoding="utf-8", dialect=csv.excel):
+        self.headers = headers
+        self._writer = UnicodeWriter(file_object, dialect=dialect, encoding=encoding)
+        self._started = False
+
+    def write_headers(self):
+        if not self._started:
+            self._writer.writerow(self.headers)
+            self._started = True
+
+    def writerow(self, row):
+        self.write_headers()
+        self._writer.writerow(row)
+
+    def write_object(self, obj):
+        self.writerow([obj.get(h, "") for h in self.headers])
+
+def _header_index(headers):
+    # the index of the first column with each header
+    index = {}
+    for i, h in enumerate(headers):
+        index.setdefault(h, i)
+    return index
+
+def _is_empty(row):
+    return sum([1 if c is not None and c != "" else 0 for c in row]) == 0
+
 class BadCharReplacer:
     """
     Iterator that reads an encoded stream and replaces Bad Characters!
@@ -472,14 +609,23 @@ class SheetWrapper(object):
     # and a list of values in an array that should be ignored
     IGNORE_VALUES = {}
 
-    def __init__(self, path=None, writer=None, spec=None):
+    def __init__(self, path=None, writer=None, spec=None, streaming=False):
+        """
+        :param streaming: read the rows from the file as they are asked for, or write them out as they are added,
+            rather than holding the whole sheet in memory (see ClCsv)
+        """
         self._sheet = None
         if path is not None:
-            self._sheet = ClCsv(path, ignore_blank_rows=True)
+            self._sheet = ClCsv(path, ignore_blank_rows=True, streaming=streaming)
         elif writer is not None:
-            self._sheet = ClCsv(writer=writer, ignore_blank_rows=True)
+            self._sheet = ClCsv(writer=writer, ignore_blank_rows=True, streaming=streaming)
             self._set_headers(spec)
 
+        # lookups between the human readable headers and the internal names, built on first use
+        self._key_map = None
+        self._value_map = None
+        self._header_map = None
+
     def _set_headers(self, spec=None):
         headers = []
 
@@ -505,15 +651,18 @@ class SheetWrapper(object):
         self._sheet.set_headers(headers)
 
     def _header_key_map(self, key):
-        for k, v in self.HEADERS.iteritems():
-            if key.strip().lower() == k.lower():
-                return v
-        return None
+        if self._key_map is None:
+            self._key_map = {}
+            for k, v in self.HEADERS.iteritems():
+                self._key_map.setdefault(k.lower(), v)
+        return self._key_map.get(key.strip().lower())
 
     def _header_value_map(self, val):
-        for k, v in self.HEADERS.iteritems():
-            if v.strip().lower() == val.lower():
-                return k
+        if self._value_map is None:
+            self._value_map = {}
+            for k, v in self.HEADERS.iteritems():
+                self._value_map.setdefault(v.strip().lower(), k)
+        return self._value_map.get(val.lower())
 
     def _value(self, field, value):
         # first thing is, do we trim the value
@@ -568,28 +717,39 @@ class SheetWrapper(object):
     def objects(self, use_headers=True, beyond_headers=False):
         if self._sheet is None:
             return
+
+        # work out the internal name for each header once, rather than for every cell
+        keys = {}
+        for key in self._sheet.headers():
+            hk = None
+            if use_headers:
+                hk = self._header_key_map(key)
+            if hk is None and beyond_headers:
+                hk = key
+                if len(self.HEADER_NORMALISER) > 0:
+                    for fn in self.HEADER_NORMALISER:
+                        hk = fn(hk)
+            keys[key] = hk
+
         for o in self._sheet.objects():
             no = {}
             for key, val in o.iteritems():
-                hk = None
-                if use_headers:
-                    hk = self._header_key_map(key)
-                if hk is None and beyond_headers:
-                    hk = key
-                    if len(self.HEADER_NORMALISER) > 0:
-                        for fn in self.HEADER_NORMALISER:
-                            hk = fn(hk)
+                hk = keys.get(key)
                 if hk is not None:
                     no[hk] = self._value(hk, val)
             yield no
 
     def add_object(self, obj):
+        if self._header_map is None:
+            self._header_map = {}
+            for k, v in self.HEADERS.iteritems():
+                self._header_map.setdefault(v, k)
+
         no = {}
         for k, v in obj.iteritems():
-            for k1, v1 in self.HEADERS.iteritems():
-                if k == v1:
-                    no[k1] = self._value(k, v)
-                    break
+            k1 = self._header_map.get(k)
+            if k1 is not None:
+                no[k1] = self._value(k, v)
         self._sheet.add_object(no)
 
     def dataobjs(self, template, skip_on_error=False):
@@ -171,8 +171,7 @@ def to_bool(val):
     raise ValueError(u"Could not convert {val} to boolean. Expect either boolean or string.".format(val=val))
 
 def to_currency_code(val):
-    l = locality.Locality()
-    cc = l.currency_code_for(val)
+    cc = locality.currency_code_for(val)
     if cc is None:
         raise ValueError(u"Could not map {x} to a known currency code".format(x=val))
     return cc
@@ -181,19 +180,21 @@ def to_currency_code(val):
 ## Data coerce closures
 
 def date_str(in_format=None, out_format=None):
+    parser = dates.DateParser()
     def datify(val):
         if val is None or val == "":
             return None
         if isinstance(val, date) or isinstance(val, datetime):
             return dates.format(val, format=out_format)
         else:
-            return dates.reformat(val, in_format=in_format, out_format=out_format)
+            return dates.reformat(val, in_format=in_format, out_format=out_format, parser=parser)
 
     return datify
 
 def to_datestamp(in_format=None):
+    parser = dates.DateParser()
     def stampify(val):
-        return dates.parse(val, format=in_format)
+        return parser.parse(val, format=in_format)
 
     return stampify
 
@@ -79,19 +79,21 @@ def to_float():
     return floatify
 
 def date_str(in_format=None, out_format=None):
+    parser = dates.DateParser()
     def datify(val):
         if val is None or val == "":
             return None
         if isinstance(val, date) or isinstance(val, datetime):
             return dates.format(val, format=out_format)
         else:
-            return dates.reformat(val, in_format=in_format, out_format=out_format)
+            return dates.reformat(val, in_format=in_format, out_format=out_format, parser=parser)
 
     return datify
 
 def to_datestamp(in_format=None):
+    parser = dates.DateParser()
     def stampify(val):
-        return dates.parse(val, format=in_format)
+        return parser.parse(val, format=in_format)
 
     return stampify
 
@@ -176,6 +178,12 @@ class DataObj(object):
 
     SCHEMA = None
 
+    # (struct, coerce map, AccessorPlans) for this instance, populated on first dynamic property access
+    _accessor_plans = None
+
+    # state for frozen (read-only) objects, see DataObj.frozen.  None for normal objects
+    _frozen = None
+
     DEFAULT_COERCE = {
         "unicode": to_unicode(),
         "utcdatetime": date_str(),
@@ -231,7 +239,7 @@ class DataObj(object):
 
         # restructure the object based on the struct if requried
         if self._struct is not None and raw is not None and construct_raw:
-            self.data = construct(self.data, self._struct, self._coerce_map, silent_prune=construct_silent_prune)
+            self.data = self._get_accessor_plans().compiled().construct(self.data, silent_prune=construct_silent_prune)
 
         # run against the old validation routine
         # (now deprecated)
@@ -314,140 +322,131 @@ class DataObj(object):
             setattr(self, k, v)
 
     def clone(self):
+        if self._frozen is not None:
+            # a frozen object never modifies its data, so the clone can share it
+            return self.__class__.frozen(self.data)
         return self.__class__(deepcopy(self.data))
 
-    def json(self):
-        return json.dumps(self.data)
+    @classmethod
+    def frozen(cls, raw, *args, **kwargs):
+        """
+        Create a read-only view of the raw data, for code which only needs to read from the object.
 
-    def _get_internal_property(self, path, wrapper=None):
-        # pull the object from the structure, to find out what kind of retrieve it needs
-        # (if there is a struct)
-        type, substruct, instructions = None, None, None
-        if self._struct:
-            type, substruct, instructions = construct_lookup(path, self._struct)
+        The raw data is neither copied nor constructed against the struct.  Instead each path is validated the
+        first time it is read, raising a DataStructureException if it does not conform.  The first attempt to
+        modify the object will copy and construct the data, after which it behaves as a normal object.
 
-        if type is None:
-            # if there is no struct, or no object mapping was found, try to pull the path
-            # as a single node (may be a field, list or dict, we'll find out in a mo)
-            val = self._get_single(path)
+        Values returned from a frozen object (including lists obtained by reference) are the raw data itself,
+        and must not be modified.  Objects wrapped from a frozen object are also frozen, and stay read-only for
+        good, since they hold the raw data rather than the thawed copy; to modify them, get them again from the
+        object they came from, once it has been thawed.
 
-            # if this is a dict or a list and a wrapper is supplied, wrap it
-            if wrapper is not None:
-                if isinstance(val, dict):
-                    return wrapper(val, expose_data=self._expose_data)
-                elif isinstance(val, list) and len(val) > 0:
-                    if isinstance(val[0], dict):    # just check the first one
-                        return [wrapper(v, expose_data=self._expose_data) for v in val]
+        Any other arguments are passed to the class's constructor, which must be callable without raw data.
 
-            # otherwise, return the raw value if it is not None, or raise an AttributeError
-            if val is None:
-                raise AttributeError('{name} is not set'.format(name=path))
-
-            return val
+        :param raw: the raw data to wrap
+        :return: an instance of the class, frozen around the raw data
+        """
+        obj = cls(*args, **kwargs)
+        obj.data = raw if raw is not None else {}
+        obj._freeze(silent_prune=kwargs.get("construct_silent_prune", False))
+        return obj
 
-        if instructions is None:
-            instructions = {}
+    def thaw(self):
+        """
+        Convert a frozen object into a normal, modifiable, one, by copying and constructing its data.  This
+        happens automatically on the first modification, so need not normally be called directly.
+        """
+        if self._frozen is None:
+            return
+        if self._frozen["parent"] is not None:
+            raise DataSchemaException(u"Attempt to modify an object wrapped from a frozen object; thaw the original object and get this one from it again")
 
-        # if the struct contains a reference to the path, always return something, even if it is None - don't raise an AttributeError
-        kwargs = construct_kwargs(type, "get", instructions)
-        coerce_fn = self._coerce_map.get(instructions.get("coerce"))
-        if coerce_fn is not None:
-            kwargs["coerce"] = coerce_fn
+        # only unfreeze once the data has been copied, so that if construct fails the raw data is still protected
+        if self._struct is not None:
+            data = self._get_accessor_plans().compiled().construct(self.data, silent_prune=self._frozen["silent_prune"])
+        else:
+            data = deepcopy(self.data)
+        self.data = data
+        self._frozen = None
 
-        if type == "field":
-            return self._get_single(path, **kwargs)
-        elif type == "object":
-            d = self._get_single(path, **kwargs)
-            if wrapper:
-                return wrapper(d, substruct, construct_raw=False, expose_data=self._expose_data)    # FIXME: this means all substructures are forced to use this classes expose_data policy, whatever it is
-            else:
-                return d
-        elif type == "list":
-            if instructions.get("contains") == "field":
-                return self._get_list(path, **kwargs)
-            elif instructions.get("contains") == "object":
-                l = self._get_list(path, **kwargs)
-                if wrapper:
-                    return [wrapper(o, substruct, construct_raw=False, expose_data=self._expose_data) for o in l]    # FIXME: this means all substructures are forced to use this classes expose_data policy, whatever it is
-                else:
-                    return l
+    def json(self):
+        return json.dumps(self.data)
 
-        # if for whatever reason we get here, raise the AttributeError
-        raise AttributeError('{name} is not set'.format(name=path))
+    def _get_internal_property(self, path, wrapper=None):
+        return self._get_accessor_plans().accessor(path).get(self, wrapper)
 
     def _set_internal_property(self, path, value, wrapper=None):
+        return self._get_accessor_plans().accessor(path).set(self, value, wrapper)
 
-        def _wrap_validate(val, wrap, substruct):
-            if wrap is None:
-                if isinstance(val, DataObj):
-                    return val.data
-                else:
-                    return val
-
-            else:
-                if isinstance(val, DataObj):
-                    if isinstance(val, wrap):
-                        return val.data
-                    else:
-                        raise AttributeError("Attempt to set {x} failed; is not of an allowed type.".format(x=path))
-                else:
-                    try:
-                        d = wrap(val, substruct)
-                        return d.data
-                    except DataStructureException as e:
-                        raise AttributeError(e.message)
-
-        # pull the object from the structure, to find out what kind of retrieve it needs
-        # (if there is a struct)
-        type, substruct, instructions = None, None, None
-        if self._struct:
-            type, substruct, instructions = construct_lookup(path, self._struct)
+    def _freeze(self, parent=None, silent_prune=False):
+        self._frozen = {"validated" : set(), "parent" : parent, "silent_prune" : silent_prune}
 
-        # if no type is found, then this means that either the struct was undefined, or the
-        # path did not point to a valid point in the struct.  In the case that the struct was
-        # defined, this means the property is trying to set something outside the struct, which
-        # isn't allowed.  So, only set types which are None against objects which don't define
-        # the struct.
-        if type is None:
-            if self._struct is None:
-                if isinstance(value, list):
-                    value = [_wrap_validate(v, wrapper, None) for v in value]
-                    self._set_list(path, value)
-                else:
-                    value = _wrap_validate(value, wrapper, None)
-                    self._set_single(path, value)
+    def _validate_frozen_path(self, path):
+        validated = self._frozen["validated"]
+        if path in validated:
+            return
 
-                return True
-            else:
-                return False
+        if self._struct:
+            accessor = self._get_accessor_plans().accessor(path)
+            val = self._get_path(path, None)
+            if val is not None and accessor.type is not None:
+                self._validate_value(path, val, accessor)
+
+        validated.add(path)
+
+    def _validate_value(self, path, val, accessor):
+        # carry out the same checks against a single value as construct would have done
+        plans = self._get_accessor_plans()
+        instructions = accessor.instructions
+        silent_prune = self._frozen["silent_prune"]
+
+        def _coerce_fn():
+            name = instructions.get("coerce", "unicode")
+            fn = self._coerce_map.get(name)
+            if fn is None:
+                raise DataStructureException("No coersion function defined for type '{x}' at '{c}'".format(x=name, c=path))
+            return fn
 
-        if instructions is None:
-            instructions = {}
+        try:
+            if accessor.type == "field":
+                _set_single_value(path, val, coerce=_coerce_fn(), **accessor.set_kwargs)
 
-        kwargs = construct_kwargs(type, "set", instructions)
-        coerce_fn = self._coerce_map.get(instructions.get("coerce"))
-        if coerce_fn is not None:
-            kwargs["coerce"] = coerce_fn
+            elif accessor.type == "object":
+                if type(val) != dict:
+                    raise DataStructureException("Found '{x}' = '{y}' but expected object/dict".format(x=path, y=val))
+                if accessor.substruct is not None:
+                    plans.compiled(accessor.substruct).validate(val, context=path + ".", silent_prune=silent_prune)
+
+            elif accessor.type == "list":
+                if not isinstance(val, list):
+                    raise DataStructureException(u"Expecting list at {x} but found something else".format(x=path))
+                contains = instructions.get("contains")
+                if contains == "field":
+                    coerce_fn = _coerce_fn()
+                    scratch = []
+                    for v in val:
+                        _add_list_value(scratch, path, v, coerce=coerce_fn, **accessor.set_kwargs)
+                elif contains == "object":
+                    for i in xrange(len(val)):
+                        if type(val[i]) != dict:
+                            raise DataStructureException("Found '{x}[{p}]' = '{y}' but expected object/dict".format(x=path, y=val[i], p=i))
+                        if accessor.substruct is not None:
+                            plans.compiled(accessor.substruct).validate(val[i], context=path + "[" + str(i) + "].", silent_prune=silent_prune)
+        except DataSchemaException as e:
+            raise DataStructureException(e.message)
 
-        if type == "field":
-            self._set_single(path, value, **kwargs)
-            return True
-        elif type == "object":
-            v = _wrap_validate(value, wrapper, substruct)
-            self._set_single(path, v, **kwargs)
-            return True
-        elif type == "list":
-            if instructions.get("contains") == "field":
-                self._set_list(path, value, **kwargs)
-                return True
-            elif instructions.get("contains") == "object":
-                if not isinstance(value, list):
-                    value = [value]
-                vals = [_wrap_validate(v, wrapper, substruct) for v in value]
-                self._set_list(path, vals, **kwargs)
-                return True
+    def _get_accessor_plans(self):
+        # the plans are held alongside the struct and coerce map they were compiled from, so if either
+        # of those has been replaced since, we go back to the class-level cache for the right ones
+        current = self._accessor_plans
+        if current is not None:
+            struct, coerce_map, plans = current
+            if struct is self._struct and coerce_map is self._coerce_map:
+                return plans
 
-        return False
+        plans = accessor_plans(self.__class__, self._struct, self._coerce_map)
+        self._accessor_plans = (self._struct, self._coerce_map, plans)
+        return plans
 
     def _list_dynamic_properties(self):
         # list the dynamic properties the object could have
@@ -462,7 +461,7 @@ class DataObj(object):
         try:
             if self._expose_data:
                 if self._struct:
-                    data_attrs = construct_data_keys(self._struct)
+                    data_attrs = self._get_accessor_plans().data_keys
                 else:
                     data_attrs = self.data.keys()
         except AttributeError:
@@ -478,6 +477,9 @@ class DataObj(object):
         except:
             self._struct = struct
 
+        # any accessors compiled against the previous struct are no longer valid
+        self._accessor_plans = None
+
     def _get_path(self, path, default):
         parts = path.split(".")
         context = self.data
@@ -489,6 +491,9 @@ class DataObj(object):
         return context
 
     def _set_path(self, path, val):
+        if self._frozen is not None:
+            self.thaw()
+
         parts = path.split(".")
         context = self.data
 
@@ -504,6 +509,9 @@ class DataObj(object):
                 context[p] = val
 
     def _delete_from_list(self, path, val=None, matchsub=None, prune=True):
+        if self._frozen is not None:
+            self.thaw()
+
         l = self._get_list(path)
 
         removes = []
@@ -529,6 +537,9 @@ class DataObj(object):
             self._delete(path, prune)
 
     def _delete(self, path, prune=True):
+        if self._frozen is not None:
+            self.thaw()
+
         parts = path.split(".")
         context = self.data
 
@@ -556,16 +567,12 @@ class DataObj(object):
                 del context[d]
 
     def _coerce(self, val, cast, accept_failure=False):
-        if cast is None:
-            return val
-        try:
-            return cast(val)
-        except (ValueError, TypeError):
-            if accept_failure:
-                return val
-            raise DataSchemaException(u"Cast with {x} failed on {y}".format(x=cast, y=val))
+        return _coerce_value(val, cast, accept_failure=accept_failure)
 
     def _get_single(self, path, coerce=None, default=None, allow_coerce_failure=True):
+        if self._frozen is not None:
+            self._validate_frozen_path(path)
+
         # get the value at the point in the object
         val = self._get_path(path, default)
 
@@ -577,9 +584,20 @@ class DataObj(object):
             return val
 
     def _get_list(self, path, coerce=None, by_reference=True, allow_coerce_failure=True):
+        frozen = self._frozen is not None
+        if frozen:
+            self._validate_frozen_path(path)
+
         # get the value at the point in the object
         val = self._get_path(path, None)
 
+        # frozen objects don't bind new lists or coerced values into the data
+        if frozen and by_reference:
+            if val is None:
+                return []
+            if coerce is not None and isinstance(val, list):
+                return [self._coerce(v, coerce, accept_failure=allow_coerce_failure) for v in val]
+
         # if there is no value and we want to do by reference, then create it, bind it and return it
         if val is None and by_reference:
             mylist = []
@@ -660,6 +678,9 @@ class DataObj(object):
         self._set_path(path, val)
 
     def _add_to_list(self, path, val, coerce=None, allow_coerce_failure=False, allow_none=False, ignore_none=True, unique=False):
+        if self._frozen is not None:
+            self.thaw()
+
         if val is None and ignore_none:
             return
 
@@ -680,30 +701,31 @@ class DataObj(object):
         current.append(val)
 
     def _set_with_struct(self, path, val):
-        type, struct, instructions = construct_lookup(path, self._struct)
+        plans = self._get_accessor_plans()
+        accessor = plans.accessor(path)
+        type, struct = accessor.type, accessor.substruct
         if type == "field":
-            kwargs = construct_kwargs(type, "set", instructions)
-            self._set_single(path, val, **kwargs)
+            self._set_single(path, val, **accessor.set_kwargs)
         elif type == "list":
             if not isinstance(val, list):
                 val = [val]
             if struct is not None:
-                val = [construct(x, struct, self._coerce_map) for x in val]
-            kwargs = construct_kwargs(type, "set", instructions)
-            self._set_list(path, val, **kwargs)
+                compiled = plans.compiled(struct)
+                val = [compiled.construct(x) for x in val]
+            self._set_list(path, val, **accessor.set_kwargs)
         elif type == "object":
             if struct is not None:
-                val = construct(val, struct, self._coerce_map)
+                val = plans.compiled(struct).construct(val)
             self._set_single(path, val)
 
     def _add_to_list_with_struct(self, path, val):
-        type, struct, instructions = construct_lookup(path, self._struct)
-        if type != "list":
+        plans = self._get_accessor_plans()
+        accessor = plans.accessor(path)
+        if accessor.type != "list":
             raise DataStructureException(u"Attempt to add to list {x} failed - it is not a list element".format(x=path))
-        if struct is not None:
-            val = construct(val, struct, self._coerce_map)
-        kwargs = construct_kwargs(type, "set", instructions)
-        self._add_to_list(path, val, **kwargs)
+        if accessor.substruct is not None:
+            val = plans.compiled(accessor.substruct).construct(val)
+        self._add_to_list(path, val, **accessor.set_kwargs)
 
 
     def _utf8_unicode(self):
@@ -1147,6 +1169,492 @@ def construct_kwargs(type, dir, instructions):
 def construct_data_keys(struct):
     return struct.get("fields", {}).keys() + struct.get("objects", []) + struct.get("lists", {}).keys()
 
+############################################################
+## Compiled accessor plans
+
+class Accessor(object):
+    """
+    The resolved get/set behaviour for a single path in a struct.  The struct lookup, the coerce function and the
+    keyword arguments for the getters and setters are all worked out once, when the accessor is compiled, and
+    then bound into the get and set closures.
+    """
+    def __init__(self, path, type, substruct, instructions, get, set, get_kwargs=None, set_kwargs=None):
+        self.path = path
+        self.type = type
+        self.substruct = substruct
+        self.instructions = instructions
+        self.get = get
+        self.set = set
+        self.get_kwargs = get_kwargs if get_kwargs is not None else {}
+        self.set_kwargs = set_kwargs if set_kwargs is not None else {}
+
+
+class AccessorPlans(object):
+    """
+    All the compiled accessors for a struct and coerce map pair.  Accessors are compiled lazily, the first time
+    each path is requested, and then held for the lifetime of the plan.
+    """
+    def __init__(self, struct, coerce_map):
+        self.struct = struct
+        self.coerce_map = coerce_map
+        self.data_keys = construct_data_keys(struct) if struct else []
+        self._accessors = {}
+        self._compiled = {}
+
+    def matches(self, struct, coerce_map):
+        if self.struct is struct and self.coerce_map is coerce_map:
+            return True
+        return self.struct == struct and self.coerce_map == coerce_map
+
+    def accessor(self, path):
+        acc = self._accessors.get(path)
+        if acc is None:
+            acc = compile_accessor(path, self.struct, self.coerce_map)
+            self._accessors[path] = acc
+        return acc
+
+    def compiled(self, struct=None):
+        """
+        The CompiledStruct for the plan's struct, or for one of its sub-structs.  Sub-structs are cached by
+        identity, so must be ones which were obtained from this plan (e.g. an Accessor's substruct)
+        """
+        if struct is None:
+            struct = self.struct
+        c = self._compiled.get(id(struct))
+        if c is None:
+            c = compile_struct(struct, self.coerce_map)
+            self._compiled[id(struct)] = c
+        return c
+
+# per-class cache of the most recently used plans.  Most classes only ever have one struct, but the base DataObj
+# is used as a wrapper for many different sub-structs, so we keep a handful
+_ACCESSOR_PLAN_CACHE = {}
+ACCESSOR_PLAN_CACHE_SIZE = 16
+
+def accessor_plans(klazz, struct, coerce_map):
+    """
+    Get the AccessorPlans for the given class, struct and coerce map, compiling a new set if there are not
+    already equivalent plans in the cache for this class.
+
+    :param klazz: the DataObj class the plans are for
+    :param struct: the struct the instance is using
+    :param coerce_map: the coerce map the instance is using
+    :return: AccessorPlans
+    """
+    cached = _ACCESSOR_PLAN_CACHE.get(klazz)
+    if cached is None:
+        cached = []
+        _ACCESSOR_PLAN_CACHE[klazz] = cached
+
+    # first look for the exact same struct object, which is the case for sub-structs handed to wrappers,
+    # then fall back to comparing the structs, which is the case for classes which build their struct in __init__
+    for plans in cached:
+        if plans.struct is struct and plans.coerce_map is coerce_map:
+            return plans
+    for plans in cached:
+        if plans.matches(struct, coerce_map):
+            return plans
+
+    plans = AccessorPlans(struct, coerce_map)
+    cached.insert(0, plans)
+    del cached[ACCESSOR_PLAN_CACHE_SIZE:]
+    return plans
+
+def compile_accessor(path, struct, coerce_map):
+    """
+    Resolve the path against the struct (if there is one), and produce an Accessor whose get and set functions
+    carry out the same operations as DataObj would, with everything that does not depend on the data
+    pre-computed.
+
+    :param path: the dot-separated path to the property
+    :param struct: the struct of the object, or None
+    :param coerce_map: the coerce map of the object
+    :return: Accessor
+    """
+    type, substruct, instructions = None, None, None
+    if struct:
+        type, substruct, instructions = construct_lookup(path, struct)
+
+    if type is None:
+        def get_unstructured(obj, wrapper=None):
+            # if there is no struct, or no object mapping was found, try to pull the path
+            # as a single node (may be a field, list or dict, we'll find out in a mo)
+            val = obj._get_single(path)
+
+            # if this is a dict or a list and a wrapper is supplied, wrap it
+            if wrapper is not None:
+                if isinstance(val, dict):
+                    return _frozen_wrap(obj, wrapper(val, expose_data=obj._expose_data))
+                elif isinstance(val, list) and len(val) > 0:
+                    if isinstance(val[0], dict):    # just check the first one
+                        return [_frozen_wrap(obj, wrapper(v, expose_data=obj._expose_data)) for v in val]
+
+            # otherwise, return the raw value if it is not None, or raise an AttributeError
+            if val is None:
+                raise AttributeError('{name} is not set'.format(name=path))
+
+            return val
+
+        # if no type is found, then this means that either the struct was undefined, or the
+        # path did not point to a valid point in the struct.  In the case that the struct was
+        # defined, this means the property is trying to set something outside the struct, which
+        # isn't allowed.  So, only set types which are None against objects which don't define
+        # the struct.
+        if struct is None:
+            def set_unstructured(obj, value, wrapper=None):
+                if isinstance(value, list):
+                    value = [_wrap_validate(path, v, wrapper, None) for v in value]
+                    obj._set_list(path, value)
+                else:
+                    value = _wrap_validate(path, value, wrapper, None)
+                    obj._set_single(path, value)
+                return True
+        else:
+            def set_unstructured(obj, value, wrapper=None):
+                return False
+
+        return Accessor(path, None, None, None, get_unstructured, set_unstructured)
+
+    if instructions is None:
+        instructions = {}
+
+    # if the struct contains a reference to the path, always return something, even if it is None - don't raise an AttributeError
+    get_kwargs = construct_kwargs(type, "get", instructions)
+    set_kwargs = construct_kwargs(type, "set", instructions)
+
+    bound_get_kwargs = dict(get_kwargs)
+    bound_set_kwargs = dict(set_kwargs)
+    coerce_fn = coerce_map.get(instructions.get("coerce"))
+    if coerce_fn is not None:
+        bound_get_kwargs["coerce"] = coerce_fn
+        bound_set_kwargs["coerce"] = coerce_fn
+
+    def fail_get(obj, wrapper=None):
+        # if for whatever reason we get here, raise the AttributeError
+        raise AttributeError('{name} is not set'.format(name=path))
+
+    def fail_set(obj, value, wrapper=None):
+        return False
+
+    get, set = fail_get, fail_set
+    contains = instructions.get("contains")
+
+    if type == "field":
+        def get(obj, wrapper=None):
+            return obj._get_single(path, **bound_get_kwargs)
+
+        def set(obj, value, wrapper=None):
+            obj._set_single(path, value, **bound_set_kwargs)
+            return True
+
+    elif type == "object":
+        def get(obj, wrapper=None):
+            d = obj._get_single(path, **bound_get_kwargs)
+            if wrapper:
+                return _frozen_wrap(obj, wrapper(d, substruct, construct_raw=False, expose_data=obj._expose_data))    # FIXME: this means all substructures are forced to use this classes expose_data policy, whatever it is
+            else:
+                return d
+
+        def set(obj, value, wrapper=None):
+            v = _wrap_validate(path, value, wrapper, substruct)
+            obj._set_single(path, v, **bound_set_kwargs)
+            return True
+
+    elif type == "list" and contains == "field":
+        def get(obj, wrapper=None):
+            return obj._get_list(path, **bound_get_kwargs)
+
+        def set(obj, value, wrapper=None):
+            obj._set_list(path, value, **bound_set_kwargs)
+            return True
+
+    elif type == "list" and contains == "object":
+        def get(obj, wrapper=None):
+            l = obj._get_list(path, **bound_get_kwargs)
+            if wrapper:
+                return [_frozen_wrap(obj, wrapper(o, substruct, construct_raw=False, expose_data=obj._expose_data)) for o in l]    # FIXME: this means all substructures are forced to use this classes expose_data policy, whatever it is
+            else:
+                return l
+
+        def set(obj, value, wrapper=None):
+            if not isinstance(value, list):
+                value = [value]
+            vals = [_wrap_validate(path, v, wrapper, substruct) for v in value]
+            obj._set_list(path, vals, **bound_set_kwargs)
+            return True
+
+    return Accessor(path, type, substruct, instructions, get, set, get_kwargs=get_kwargs, set_kwargs=set_kwargs)
+
+def _frozen_wrap(parent, wrapped):
+    # objects wrapped from a frozen object share its data, so must be frozen too
+    if parent._frozen is not None:
+        wrapped._freeze(parent=parent, silent_prune=parent._frozen["silent_prune"])
+    return wrapped
+
+def _wrap_validate(path, val, wrap, substruct):
+    if wrap is None:
+        if isinstance(val, DataObj):
+            return val.data
+        else:
+            return val
+
+    else:
+        if isinstance(val, DataObj):
+            if isinstance(val, wrap):
+                return val.data
+            else:
+                raise AttributeError("Attempt to set {x} failed; is not of an allowed type.".format(x=path))
+        else:
+            try:
+                d = wrap(val, substruct)
+                return d.data
+            except DataStructureException as e:
+                raise AttributeError(e.message)
+
+############################################################
+## Compiled structs
+
+class CompiledStruct(object):
+    """
+    A struct which has been pre-processed for repeated use by construct.  The allowed keys, required fields,
+    coerce functions and setter arguments are all worked out once, and each sub-struct is compiled into its own
+    CompiledStruct, so that constructing an object does no more than walk the data.
+
+    Use compile_struct to create one, and then call construct(obj) as many times as you like.  The behaviour is
+    the same as the construct function.
+    """
+    def __init__(self, struct, coerce_map):
+        self.struct = struct
+        self.coerce_map = coerce_map
+
+        self.required = list(struct.get("required", []))
+        self.allowed = set(construct_data_keys(struct))
+
+        structs = struct.get("structs", {})
+
+        # (field name, coerce function or None, coerce name, kwargs)
+        self.fields = []
+        for field_name, instructions in struct.get("fields", {}).iteritems():
+            coerce_name = instructions.get("coerce", "unicode")
+            kwargs = construct_kwargs("field", "set", instructions)
+            self.fields.append((field_name, coerce_map.get(coerce_name), coerce_name, kwargs))
+
+        # (field name, compiled sub-struct or None)
+        self.objects = []
+        for field_name in struct.get("objects", []):
+            substruct = structs.get(field_name)
+            sub = compile_struct(substruct, coerce_map) if substruct is not None else None
+            self.objects.append((field_name, sub))
+
+        # (field name, contains, coerce function or None, coerce name, kwargs, compiled sub-struct or None)
+        self.lists = []
+        for field_name, instructions in struct.get("lists", {}).iteritems():
+            contains = instructions.get("contains")
+            coerce_name = instructions.get("coerce", "unicode")
+            kwargs = construct_kwargs("list", "set", instructions)
+            sub = None
+            if contains == "object":
+                substruct = structs.get(field_name)
+                if substruct is not None:
+                    sub = compile_struct(substruct, coerce_map)
+            self.lists.append((field_name, contains, coerce_map.get(coerce_name), coerce_name, kwargs, sub))
+
+    def construct(self, obj, context="", silent_prune=False):
+        return self._walk(obj, context, silent_prune, True)
+
+    def validate(self, obj, context="", silent_prune=False):
+        """
+        Carry out all the checks that construct would, raising the same DataStructureExceptions, but without
+        building the new object
+        """
+        self._walk(obj, context, silent_prune, False)
+        return True
+
+    def _walk(self, obj, context, silent_prune, build):
+        if obj is None:
+            return None
+
+        # check that all the required fields are there
+        try:
+            keys = obj.keys()
+        except:
+            c = context if context != "" else "root"
+            raise DataStructureException(u"Expected an object at {c} but found something else instead".format(c=c))
+
+        for r in self.required:
+            if r not in obj:
+                c = context if context != "" else "root"
+                raise DataStructureException("Field '{r}' is required but not present at '{c}'".format(r=r, c=c))
+
+        # check that there are no fields that are not allowed
+        if not silent_prune:
+            allowed = self.allowed
+            for k in keys:
+                if k not in allowed:
+                    c = context if context != "" else "root"
+                    raise DataStructureException("Field '{k}' is not permitted at '{c}'".format(k=k, c=c))
+
+        # this is the new object we'll be creating from the old
+        constructed = {}
+
+        for field_name, coerce_fn, coerce_name, kwargs in self.fields:
+            val = obj.get(field_name)
+            if val is None:
+                continue
+            if coerce_fn is None:
+                raise DataStructureException("No coersion function defined for type '{x}' at '{c}'".format(x=coerce_name, c=context + field_name))
+            try:
+                val = _set_single_value(field_name, val, coerce=coerce_fn, **kwargs)
+            except DataSchemaException as e:
+                raise DataStructureException(e.message)
+            if build:
+                _set_path_value(constructed, field_name, val)
+
+        for field_name, sub in self.objects:
+            val = obj.get(field_name)
+            if val is None:
+                continue
+            if type(val) != dict:
+                raise DataStructureException("Found '{x}' = '{y}' but expected object/dict".format(x=context + field_name, y=val))
+
+            if sub is None:
+                # this is the lowest point at which we have instructions, so just accept the data structure as-is
+                # (taking a deep copy to destroy any references)
+                if build:
+                    _set_path_value(constructed, field_name, deepcopy(val))
+            else:
+                beneath = sub._walk(val, context + field_name + ".", silent_prune, build)
+                if build:
+                    _set_path_value(constructed, field_name, beneath)
+
+        for field_name, contains, coerce_fn, coerce_name, kwargs, sub in self.lists:
+            vals = obj.get(field_name)
+            if vals is None:
+                continue
+            if not isinstance(vals, list):
+                raise DataStructureException(u"Expecting list at {x} but found something else".format(x=context + field_name))
+
+            current = []
+            if contains == "field":
+                if coerce_fn is None:
+                    raise DataStructureException("No coersion function defined for type '{x}' at '{c}'".format(x=coerce_name, c=context + field_name))
+                for val in vals:
+                    try:
+                        _add_list_value(current, field_name, val, coerce=coerce_fn, **kwargs)
+                    except DataSchemaException as e:
+                        raise DataStructureException(e.message)
+
+            elif contains == "object":
+                for i in xrange(len(vals)):
+                    val = vals[i]
+                    if type(val) != dict:
+                        raise DataStructureException("Found '{x}[{p}]' = '{y}' but expected object/dict".format(x=context + field_name, y=val, p=i))
+
+                    if sub is None:
+                        if build:
+                            current.append(deepcopy(val))
+                    else:
+                        beneath = sub._walk(val, context + field_name + "[" + str(i) + "].", silent_prune, build)
+                        if build:
+                            current.append(beneath)
+
+            else:
+                raise DataStructureException("Cannot understand structure where list '{x}' elements contain '{y}'".format(x=context + field_name, y=contains))
+
+            # lists which end up empty are not written, as with construct
+            if build and len(current) > 0:
+                _set_path_value(constructed, field_name, current)
+
+        return constructed
+
+def compile_struct(struct, coerce_map):
+    """
+    Compile the struct against the coerce map, for use in repeated calls to construct
+
+    :param struct: the struct, as per construct
+    :param coerce_map: the map of coerce names to coerce functions
+    :return: CompiledStruct
+    """
+    return CompiledStruct(struct, coerce_map)
+
+# compiled structs for callers which hold on to their struct and coerce map between calls, keyed by object identity.
+# The originals are kept in the entry so that the ids cannot be re-used while they are cached
+_COMPILED_STRUCT_CACHE = {}
+COMPILED_STRUCT_CACHE_SIZE = 64
+
+def compiled_struct(struct, coerce_map):
+    """
+    Get the CompiledStruct for this struct and coerce map from the cache, compiling it if necessary.  This relies
+    on the struct and coerce map not being modified in-place once they have been used, so should only be used
+    with long-lived, effectively constant, structs such as module-level definitions.
+
+    :param struct: the struct, as per construct
+    :param coerce_map: the map of coerce names to coerce functions
+    :return: CompiledStruct
+    """
+    key = (id(struct), id(coerce_map))
+    entry = _COMPILED_STRUCT_CACHE.get(key)
+    if entry is not None and entry[0] is struct and entry[1] is coerce_map:
+        return entry[2]
+
+    compiled = compile_struct(struct, coerce_map)
+    if len(_COMPILED_STRUCT_CACHE) >= COMPILED_STRUCT_CACHE_SIZE:
+        _COMPILED_STRUCT_CACHE.clear()
+    _COMPILED_STRUCT_CACHE[key] = (struct, coerce_map, compiled)
+    return compiled
+
+def _coerce_value(val, cast, accept_failure=False):
+    if cast is None:
+        return val
+    try:
+        return cast(val)
+    except (ValueError, TypeError):
+        if accept_failure:
+            return val
+        raise DataSchemaException(u"Cast with {x} failed on {y}".format(x=cast, y=val))
+
+def _set_single_value(path, val, coerce=None, allow_coerce_failure=False, allowed_values=None, allowed_range=None,
+                      allow_none=True, ignore_none=False):
+    # the value checks from DataObj._set_single, without the write to the object (the caller never supplies None)
+    if coerce is not None:
+        val = _coerce_value(val, coerce, accept_failure=allow_coerce_failure)
+
+    if allowed_values is not None and val not in allowed_values:
+        raise DataSchemaException(u"Value {x} is not permitted at {y}".format(x=val, y=path))
+
+    if allowed_range is not None:
+        lower, upper = allowed_range
+        if (lower is not None and val < lower) or (upper is not None and val > upper):
+            raise DataSchemaException("Value {x} is outside the allowed range: {l} - {u}".format(x=val, l=lower, u=upper))
+
+    return val
+
+def _add_list_value(current, path, val, coerce=None, allow_coerce_failure=False, allow_none=False, ignore_none=True, unique=False):
+    # the equivalent of DataObj._add_to_list, against a list we already hold
+    if val is None and ignore_none:
+        return
+
+    if val is None and not allow_none:
+        raise DataSchemaException(u"NoneType is not allowed in list at {x}".format(x=path))
+
+    if coerce is not None:
+        val = _coerce_value(val, coerce, accept_failure=allow_coerce_failure)
+
+    if unique and val in current:
+        return
+
+    current.append(val)
+
+def _set_path_value(context, path, val):
+    # field names are almost never dotted, but if they are then DataObj would have nested them
+    if "." not in path:
+        context[path] = val
+        return
+    parts = path.split(".")
+    for p in parts[:-1]:
+        context = context.setdefault(p, {})
+    context[parts[-1]] = val
+
 ############################################################
 ## Unit test support
 
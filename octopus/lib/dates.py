@@ -1,32 +1,178 @@
 from octopus.core import app
 from datetime import datetime, timedelta
 from random import randint
+from collections import OrderedDict
+import re, threading
 
-def parse(s, format=None, guess=True):
-    s = s.strip()
+# the ISO 8601 / RFC 3339 forms we parse by hand rather than with strptime: a date, optionally followed by a time
+# with or without seconds, fractional seconds and a zone (which is applied, to give a naive UTC datetime)
+_ISO = re.compile(r"^(\d{4})-(\d{2})-(\d{2})(?:([T ])(\d{2}):(\d{2})(?::(\d{2})(?:\.(\d+))?)?(Z|[+-]\d{2}:?\d{2})?)?$")
 
-    if format is not None:
-        try:
-            return datetime.strptime(s, format)
-        except ValueError as e:
-            if not guess:
-                raise e
+# the strptime formats which the hand-written parser gives the same answer as, for the strings it reads
+ISO_DATETIME = "%Y-%m-%dT%H:%M:%SZ"
+ISO_SPACED = "%Y-%m-%d %H:%M:%S"
+ISO_DATE = "%Y-%m-%d"
 
-    for f in app.config.get("DATE_FORMATS", []):
-        try:
-            return datetime.strptime(s, f)
-        except ValueError as e:
-            pass
+# recently parsed strings, and their datetimes
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
 
-    raise ValueError("Unable to parse {x} with any known format".format(x=s))
+def parse(s, format=None, guess=True):
+    return _parser.parse(s, format=format, guess=guess)
+
+def parse_many(strs, format=None, guess=True, ignore_errors=False):
+    """
+    Parse a list of date strings, which are expected to mostly share a format, so the format which read the last
+    one is tried first on the next.
+
+    :param ignore_errors: give None for the strings which can't be parsed, rather than raising a ValueError
+    :return: list of datetimes, in the same order as the strings
+    """
+    parser = DateParser()
+    seen = {}
+    out = []
+    for s in strs:
+        if s in seen:
+            out.append(seen[s])
+            continue
+        try:
+            d = parser.parse(s, format=format, guess=guess)
+        except ValueError:
+            if not ignore_errors:
+                raise
+            d = None
+        seen[s] = d
+        out.append(d)
+    return out
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
+
+class DateParser(object):
+    """
+    Parses dates like dates.parse, but remembers which of the DATE_FORMATS last succeeded and tries it first next
+    time.  Give each place which parses a stream of similar dates (e.g. a coerce function) its own parser.
+
+    This relies on no two of the DATE_FORMATS reading the same string, which is true of the default ones, as
+    strptime has to consume the whole string.
+    """
+    def __init__(self):
+        self.last = None
+
+    def parse(self, s, format=None, guess=True):
+        s = s.strip()
+
+        key = (s, format, guess)
+        d = _cache_get(key)
+        if d is not None:
+            return d
+
+        d = self._parse(s, format, guess)
+        _cache_put(key, d)
+        return d
+
+    def _parse(self, s, format, guess):
+        iso = _parse_iso(s)
+
+        if format is not None:
+            try:
+                return _strptime(s, format, iso)
+            except ValueError as e:
+                if not guess:
+                    raise e
+
+        # the ISO forms which none of the formats can read
+        if iso is not None and iso[0] is None:
+            return iso[1]
+
+        formats = app.config.get("DATE_FORMATS", [])
+        last = self.last
+        if last is not None and last in formats:
+            try:
+                return _strptime(s, last, iso)
+            except ValueError:
+                pass
+
+        for f in formats:
+            if f == last:
+                continue
+            try:
+                d = _strptime(s, f, iso)
+                self.last = f
+                return d
+            except ValueError as e:
+                pass
+
+        raise ValueError("Unable to parse {x} with any known format".format(x=s))
+
+_parser = DateParser()
+
+def _strptime(s, f, iso):
+    if iso is not None and f in (ISO_DATETIME, ISO_SPACED, ISO_DATE):
+        if iso[0] == f:
+            return iso[1]
+        # the string is ISO shaped, but not this one
+        raise ValueError("{x} does not match {f}".format(x=s, f=f))
+    return datetime.strptime(s, f)
+
+def _parse_iso(s):
+    """
+    Parse the string by hand if it is one of the ISO forms
+
+    :return: tuple of (the strptime format which would have read it, if any, the datetime), or None
+    """
+    m = _ISO.match(s)
+    if m is None:
+        return None
+    year, month, day, sep, hour, minute, second, frac, zone = m.groups()
+    try:
+        d = datetime(int(year), int(month), int(day),
+                     int(hour) if hour is not None else 0,
+                     int(minute) if minute is not None else 0,
+                     int(second) if second is not None else 0,
+                     int(frac[:6].ljust(6, "0")) if frac is not None else 0)
+    except ValueError:
+        return None
+
+    if zone is not None and zone != "Z":
+        offset = timedelta(hours=int(zone[1:3]), minutes=int(zone[-2:]))
+        d = d - offset if zone[0] == "+" else d + offset
+
+    if sep is None:
+        return ISO_DATE, d
+    if second is not None and frac is None:
+        if sep == "T" and zone == "Z":
+            return ISO_DATETIME, d
+        if sep == " " and zone is None:
+            return ISO_SPACED, d
+    return None, d
+
+def _cache_get(key):
+    with _cache_lock:
+        d = _cache.pop(key, None)
+        if d is not None:
+            _cache[key] = d
+        return d
+
+def _cache_put(key, d):
+    size = app.config.get("DATE_PARSE_CACHE_SIZE", 10000)
+    if size <= 0:
+        return
+    with _cache_lock:
+        _cache[key] = d
+        while len(_cache) > size:
+            _cache.popitem(last=False)
 
 def format(d, format=None):
     if format is None:
         format = app.config.get("DEFAULT_DATE_FORMAT")
     return unicode(d.strftime(format))
 
-def reformat(s, in_format=None, out_format=None):
-    return format(parse(s, format=in_format), format=out_format)
+def reformat(s, in_format=None, out_format=None, parser=None):
+    if parser is None:
+        parser = _parser
+    return format(parser.parse(s, format=in_format), format=out_format)
 
 def now():
     return format(datetime.utcnow())
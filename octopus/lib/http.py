@@ -1,10 +1,102 @@
 from octopus.core import app
-import requests, time, urllib, json
+from octopus.lib import httpcache
+import requests, time, urllib, json, urlparse, threading, os, cookielib, tempfile, shutil, heapq, Queue
+from collections import deque
+from requests.adapters import HTTPAdapter
 from StringIO import StringIO
 
 class SizeExceededException(Exception):
     pass
 
+######################################################
+# Pooled sessions
+
+class SessionManager(object):
+    """
+    Keeps one requests.Session per host, so that repeated requests to the same service can re-use
+    their connections rather than opening a new one (and doing a new TLS handshake) each time.
+
+    Sessions which have not been used for idle_expiry seconds are closed and replaced on their next use.
+    The manager is safe to share between threads, and discards any sessions inherited from a parent
+    process after a fork.
+    """
+    def __init__(self, pool_connections=None, pool_maxsize=None, pool_block=None, idle_expiry=None):
+        self.pool_connections = pool_connections if pool_connections is not None else app.config.get("HTTP_POOL_CONNECTIONS", 10)
+        self.pool_maxsize = pool_maxsize if pool_maxsize is not None else app.config.get("HTTP_POOL_MAXSIZE", 10)
+        self.pool_block = pool_block if pool_block is not None else app.config.get("HTTP_POOL_BLOCK", False)
+        self.idle_expiry = idle_expiry if idle_expiry is not None else app.config.get("HTTP_POOL_IDLE_EXPIRY", 60)
+
+        self._lock = threading.Lock()
+        self._sessions = {}
+        self._pid = os.getpid()
+
+    def session(self, url):
+        key = self._host_key(url)
+        now = time.time()
+        expired = None
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # we have been forked, and the sockets belong to the parent process, so start again
+                self._sessions = {}
+                self._pid = os.getpid()
+
+            entry = self._sessions.get(key)
+            if entry is not None:
+                session, last_used = entry
+                if self.idle_expiry > 0 and now - last_used > self.idle_expiry:
+                    expired = session
+                    entry = None
+
+            if entry is None:
+                session = self._make_session()
+
+            self._sessions[key] = (session, now)
+
+        if expired is not None:
+            expired.close()
+
+        return session
+
+    def close(self):
+        with self._lock:
+            sessions = self._sessions.values()
+            self._sessions = {}
+        for session, last_used in sessions:
+            session.close()
+
+    def _make_session(self):
+        session = requests.Session()
+
+        # requests.get and friends never carried cookies from one request to the next, and a shared session
+        # must not either, or they would leak between unrelated callers
+        session.cookies.set_policy(cookielib.DefaultCookiePolicy(allowed_domains=[]))
+
+        adapter = HTTPAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize, pool_block=self.pool_block)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _host_key(self, url):
+        parsed = urlparse.urlparse(url)
+        return parsed.scheme.lower() + "://" + parsed.netloc.lower()
+
+_session_manager = None
+_session_manager_lock = threading.Lock()
+
+def session_manager():
+    global _session_manager
+    if _session_manager is None:
+        with _session_manager_lock:
+            if _session_manager is None:
+                _session_manager = SessionManager()
+    return _session_manager
+
+def _requester(url):
+    if app.config.get("HTTP_POOL_SESSIONS", True):
+        return session_manager().session(url)
+    return requests
+
 def quote(s, **kwargs):
     try:
         return urllib.quote_plus(s, **kwargs)
@@ -22,11 +114,8 @@ def _backoff(attempt_number, back_off_factor, max_back_off):
     seconds = seconds if seconds < max_back_off else max_back_off
     return seconds
 
-def _make_request(method, url,
-                  retries=None, back_off_factor=None, max_back_off=None, timeout=None, response_encoding=None,
-                  retry_on_timeout=None, retry_codes=None,
-                  **kwargs):
-
+def _request_settings(retries=None, back_off_factor=None, max_back_off=None, timeout=None, response_encoding=None,
+                      retry_on_timeout=None, retry_codes=None):
     # fill out all the default arguments
     if retries is None:
         retries = app.config.get("HTTP_MAX_RETRIES", 0)
@@ -49,47 +138,95 @@ def _make_request(method, url,
     if response_encoding is None:
         response_encoding = app.config.get("HTTP_RESPONSE_ENCODING")
 
+    return {
+        "retries" : retries,
+        "back_off_factor" : back_off_factor,
+        "max_back_off" : max_back_off,
+        "timeout" : timeout,
+        "retry_on_timeout" : retry_on_timeout,
+        "retry_codes" : retry_codes,
+        "response_encoding" : response_encoding
+    }
+
+# outcomes of a single attempt at a request
+ATTEMPT_DONE = "done"           # got a response we are not going to retry
+ATTEMPT_RETRY = "retry"         # may be retried, if there are retries left
+ATTEMPT_STOP = "stop"           # failed, and must not be retried
+ATTEMPT_INVALID = "invalid"     # the request could not be made at all
+
+def _attempt_request(method, url, attempt, timeout, retry_on_timeout, retry_codes, **kwargs):
+    """
+    Make a single attempt at the request
+
+    :return: tuple of the response (or None if there was no response), the new attempt number, and the outcome (one of the ATTEMPT_* values)
+    """
+    try:
+        requester = _requester(url)
+        if method == "GET":
+            r = requester.get(url, timeout=timeout, **kwargs)
+        elif method == "POST":
+            r = requester.post(url, timeout=timeout, **kwargs)
+        elif method == "PUT":
+            r = requester.put(url, timeout=timeout, **kwargs)
+        elif method == "DELETE":
+            r = requester.delete(url, timeout=timeout, **kwargs)
+        else:
+            # FIXME: is this right?  Maybe raising an exception would be better
+            app.logger.debug("Method {method} not allowed".format(method=method))
+            return None, attempt, ATTEMPT_INVALID
+
+        if r.status_code not in retry_codes:
+            return r, attempt, ATTEMPT_DONE
+        else:
+            attempt += 1
+            app.logger.debug("Request to {url} resulted in status {status}, attempt {attempt}".format(status=r.status_code, url=url, attempt=attempt))
+            return r, attempt, ATTEMPT_RETRY
+    except requests.exceptions.Timeout:
+        attempt += 1
+        app.logger.debug('Request to {url} timeout, attempt {attempt}'.format(url=url, attempt=attempt))
+        if not retry_on_timeout:
+            return None, attempt, ATTEMPT_STOP
+        return None, attempt, ATTEMPT_RETRY
+    except requests.exceptions.ConnectionError:
+        attempt += 1
+        app.logger.debug('Request to {url} connection error, attempt {attempt}'.format(url=url, attempt=attempt))
+        return None, attempt, ATTEMPT_RETRY
+
+def _rewind(kwargs):
+    # reset any file pointers to the beginning
+    if "data" in kwargs and hasattr(kwargs["data"], "read") and hasattr(kwargs["data"], "seek"):
+        kwargs["data"].seek(0)
+
+def _make_request(method, url,
+                  retries=None, back_off_factor=None, max_back_off=None, timeout=None, response_encoding=None,
+                  retry_on_timeout=None, retry_codes=None,
+                  **kwargs):
+
+    settings = _request_settings(retries=retries, back_off_factor=back_off_factor, max_back_off=max_back_off,
+                                 timeout=timeout, response_encoding=response_encoding,
+                                 retry_on_timeout=retry_on_timeout, retry_codes=retry_codes)
+
     attempt = 0
     r = None
 
-    while attempt <= retries:
-        try:
-            if method == "GET":
-                r = requests.get(url, timeout=timeout, **kwargs)
-            elif method == "POST":
-                r = requests.post(url, timeout=timeout, **kwargs)
-            elif method == "PUT":
-                r = requests.put(url, timeout=timeout, **kwargs)
-            elif method == "DELETE":
-                r = requests.delete(url, timeout=timeout, **kwargs)
-            else:
-                # FIXME: is this right?  Maybe raising an exception would be better
-                app.logger.debug("Method {method} not allowed".format(method=method))
-                return None
+    while attempt <= settings["retries"]:
+        resp, attempt, outcome = _attempt_request(method, url, attempt, settings["timeout"],
+                                                  settings["retry_on_timeout"], settings["retry_codes"], **kwargs)
+        if resp is not None:
+            r = resp
 
-            if r.status_code not in retry_codes:
-                break
-            else:
-                attempt += 1
-                app.logger.debug("Request to {url} resulted in status {status}, attempt {attempt}".format(status=r.status_code, url=url, attempt=attempt))
-        except requests.exceptions.Timeout:
-            attempt += 1
-            app.logger.debug('Request to {url} timeout, attempt {attempt}'.format(url=url, attempt=attempt))
-            if not retry_on_timeout:
-                break
-        except requests.exceptions.ConnectionError:
-            attempt += 1
-            app.logger.debug('Request to {url} connection error, attempt {attempt}'.format(url=url, attempt=attempt))
+        if outcome == ATTEMPT_INVALID:
+            return None
+        if outcome in [ATTEMPT_DONE, ATTEMPT_STOP]:
+            break
 
-        bo = _backoff(attempt, back_off_factor, max_back_off)
+        bo = _backoff(attempt, settings["back_off_factor"], settings["max_back_off"])
         app.logger.debug('Request to {url} backing off for {bo} seconds'.format(url=url, bo=bo))
         time.sleep(bo)
 
-        # reset any file pointers to the beginning
-        if "data" in kwargs and hasattr(kwargs["data"], "read") and hasattr(kwargs["data"], "seek"):
-            kwargs["data"].seek(0)
+        _rewind(kwargs)
 
-    if response_encoding is not None and r is not None:
+    if settings["response_encoding"] is not None and r is not None:
         r.encoding = 'utf-8'
 
     return r
@@ -128,30 +265,25 @@ def post(url, retries=None, back_off_factor=None, max_back_off=None, timeout=Non
                          **kwargs)
 
 def get(url, retries=None, back_off_factor=None, max_back_off=None, timeout=None, response_encoding=None,
-        retry_on_timeout=None, retry_codes=None, **kwargs):
-    return _make_request("GET", url,
-                         retries=retries, back_off_factor=back_off_factor,
-                         max_back_off=max_back_off,
-                         timeout=timeout,
-                         response_encoding=response_encoding,
-                         retry_on_timeout=retry_on_timeout,
-                         retry_codes=retry_codes,
-                         **kwargs)
+        retry_on_timeout=None, retry_codes=None, cache=None, **kwargs):
+    """
+    cache may be the name of a service (e.g. "EPMC") whose response cache should be used for
+    this request; see octopus.lib.httpcache
+    """
+    def fetch():
+        return _make_request("GET", url,
+                             retries=retries, back_off_factor=back_off_factor,
+                             max_back_off=max_back_off,
+                             timeout=timeout,
+                             response_encoding=response_encoding,
+                             retry_on_timeout=retry_on_timeout,
+                             retry_codes=retry_codes,
+                             **kwargs)
+    return httpcache.fetch(cache, url, fetch, request_args=kwargs)
 
 def get_stream(url, retries=None, back_off_factor=None, max_back_off=None, timeout=None, response_encoding=None,
         retry_on_timeout=None, retry_codes=None, size_limit=None, chunk_size=None, cut_off=None, read_stream=True, **kwargs):
 
-    # set the defaults where necessary from configuration
-
-    if size_limit is None:
-        size_limit = app.config.get("HTTP_STREAM_MAX_SIZE", 0)  # size of 0 means no limit
-
-    if cut_off is None:
-        cut_off = app.config.get("HTTP_STREAM_CUT_OFF", 0)  # size of 0 means no limit
-
-    if chunk_size is None:
-        chunk_size = app.config.get("HTTP_STREAM_CHUNK_SIZE", 262144)   # 250Kb
-
     # actually make the request (note that we pass stream=True)
     resp = _make_request("GET", url,
              retries=retries, back_off_factor=back_off_factor,
@@ -166,42 +298,393 @@ def get_stream(url, retries=None, back_off_factor=None, max_back_off=None, timeo
     if resp is None:
         return None, "", 0
 
-    # check that content length header for an early view on whether the resource
-    # is too large
-    if size_limit > 0:
-        header_reported_size = resp.headers.get("content-length")
-        try:
-            header_reported_size = int(header_reported_size)
-        except Exception as e:
-            header_reported_size = 0
-
-        if header_reported_size > size_limit:
-            resp.connection.close()
-            raise SizeExceededException("Size as announced by Content-Type header is larger than maximum allowed size")
+    stream = ResponseStream(resp, size_limit=size_limit, chunk_size=chunk_size, cut_off=cut_off)
 
-    downloaded_bytes = 0
     content = ''
-    chunk_no = 0
-
     if read_stream:
-        for chunk in resp.iter_content(chunk_size=chunk_size):
-            chunk_no += 1
-            downloaded_bytes += len(bytes(chunk))
+        content = stream.read()
+        stream.close()
+
+    return resp, content, stream.downloaded_bytes
+
+def get_spooled(url, retries=None, back_off_factor=None, max_back_off=None, timeout=None, response_encoding=None,
+        retry_on_timeout=None, retry_codes=None, size_limit=None, chunk_size=None, cut_off=None, spool_threshold=None, **kwargs):
+    """
+    Download the resource at the url into a temporary file, which is held in memory until it
+    grows past the spool threshold, and then moved to disk.  The size limit and cut off are as
+    for get_stream.
+
+    :return: tuple of the response object, the temporary file (positioned at the start, and deleted
+        when closed), and the number of bytes downloaded.  If the request failed entirely, the response
+        and file will be None
+    """
+    if spool_threshold is None:
+        spool_threshold = app.config.get("HTTP_STREAM_SPOOL_THRESHOLD", 10485760)
+
+    resp = _make_request("GET", url,
+             retries=retries, back_off_factor=back_off_factor,
+             max_back_off=max_back_off,
+             timeout=timeout,
+             response_encoding=response_encoding,
+             retry_on_timeout=retry_on_timeout,
+             retry_codes=retry_codes,
+             stream=True,
+             **kwargs)
+
+    if resp is None:
+        return None, None, 0
+
+    stream = ResponseStream(resp, size_limit=size_limit, chunk_size=chunk_size, cut_off=cut_off)
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_threshold)
+    try:
+        shutil.copyfileobj(stream, spool, stream.chunk_size)
+    except:
+        spool.close()
+        raise
+    finally:
+        stream.close()
+
+    spool.seek(0)
+    return resp, spool, stream.downloaded_bytes
+
+class ResponseStream(object):
+    """
+    Read-only file-like object over the body of a streamed response, which downloads the content
+    chunk by chunk as it is read, so that it can be passed on (e.g. to a Store) without holding the
+    whole thing in memory.
+
+    The size limit is enforced as the data arrives (and first against the Content-Length header),
+    raising a SizeExceededException, and reading stops once the cut off has been reached.
+    """
+    def __init__(self, resp, size_limit=None, chunk_size=None, cut_off=None):
+        # set the defaults where necessary from configuration
+        if size_limit is None:
+            size_limit = app.config.get("HTTP_STREAM_MAX_SIZE", 0)  # size of 0 means no limit
+
+        if cut_off is None:
+            cut_off = app.config.get("HTTP_STREAM_CUT_OFF", 0)  # size of 0 means no limit
+
+        if chunk_size is None:
+            chunk_size = app.config.get("HTTP_STREAM_CHUNK_SIZE", 262144)   # 250Kb
+
+        self.resp = resp
+        self.size_limit = size_limit
+        self.cut_off = cut_off
+        self.chunk_size = chunk_size
+        self.downloaded_bytes = 0
+
+        # the chunk currently being read, and how far through it we are
+        self._buffer = ""
+        self._offset = 0
+        self._chunks = None
+        self._finished = False
+
+        # check that content length header for an early view on whether the resource
+        # is too large
+        if size_limit > 0:
+            header_reported_size = resp.headers.get("content-length")
+            try:
+                header_reported_size = int(header_reported_size)
+            except Exception as e:
+                header_reported_size = 0
+
+            if header_reported_size > size_limit:
+                self.close()
+                raise SizeExceededException("Size as announced by Content-Type header is larger than maximum allowed size")
+
+    def __iter__(self):
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                break
+            yield chunk
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return "".join(self)
+
+        parts = []
+        have = 0
+        while have < size:
+            if self._offset >= len(self._buffer):
+                chunk = self._next_chunk()
+                if chunk is None:
+                    break
+                self._buffer = chunk
+                self._offset = 0
+            take = min(size - have, len(self._buffer) - self._offset)
+            parts.append(self._buffer[self._offset:self._offset + take])
+            self._offset += take
+            have += take
+
+        return "".join(parts)
+
+    def close(self):
+        self._finished = True
+        close = getattr(self.resp, "close", None)
+        if close is not None:
+            close()
+
+    def _next_chunk(self):
+        if self._offset < len(self._buffer):
+            chunk = self._buffer[self._offset:]
+            self._buffer = ""
+            self._offset = 0
+            return chunk
+        self._buffer = ""
+        self._offset = 0
+
+        if self._finished:
+            return None
+
+        if self._chunks is None:
+            self._chunks = self.resp.iter_content(chunk_size=self.chunk_size)
+
+        for chunk in self._chunks:
+            if not chunk:   # filter out keep-alive new chunks
+                continue
+
+            self.downloaded_bytes += len(bytes(chunk))
 
             # check the size limit again
-            if size_limit > 0 and downloaded_bytes > size_limit:
-                resp.connection.close()
+            if self.size_limit > 0 and self.downloaded_bytes > self.size_limit:
+                self.close()
                 raise SizeExceededException("Size limit exceeded during download")
-            if chunk:  # filter out keep-alive new chunks
-                content += chunk
 
             # now check to see if we have exceeded the cut off point
-            if cut_off > 0 and downloaded_bytes >= cut_off:
-                break
+            if self.cut_off > 0 and self.downloaded_bytes >= self.cut_off:
+                self.close()
+
+            return chunk
+
+        self.close()
+        return None
+
+######################################################
+# Concurrent batches of requests
+
+class _BatchJob(object):
+    def __init__(self, index, method, url, settings, kwargs):
+        self.index = index
+        self.method = method
+        self.url = url
+        self.host = session_manager()._host_key(url)
+        self.settings = settings
+        self.kwargs = kwargs
+        self.attempt = 0
+        self.response = None
+
+class _BatchRunner(object):
+    """
+    Runs a batch of requests across a pool of worker threads.  A request which needs to be retried is
+    put back into the queue with the time at which it is next due, rather than holding its worker
+    while it backs off, so the rest of the batch carries on in the meantime.
+    """
+    def __init__(self, jobs, concurrency, per_host_limit, min_interval=0):
+        self.concurrency = concurrency
+        self.per_host_limit = per_host_limit
+        self.min_interval = min_interval
+        self.results = Queue.Queue()
+
+        self._cond = threading.Condition()
+        self._ready = {}            # host -> deque of jobs which can be made now
+        self._delayed = []          # heap of (due time, index, job) for jobs which are backing off
+        self._active = {}           # host -> number of requests in flight
+        self._next_start = {}       # host -> earliest time the next request may be started
+        self._remaining = len(jobs)
+        self._cancelled = False
+
+        for job in jobs:
+            self._ready.setdefault(job.host, deque()).append(job)
+
+    def start(self):
+        for i in range(min(self.concurrency, self._remaining)):
+            t = threading.Thread(target=self._work)
+            t.daemon = True
+            t.start()
+
+    def cancel(self):
+        with self._cond:
+            self._cancelled = True
+            self._cond.notify_all()
+
+    def _next_job(self):
+        # must be called with the condition held.  Returns None when there is nothing left to do
+        while True:
+            if self._cancelled or self._remaining == 0:
+                return None
 
-        resp.connection.close()
+            now = time.time()
+            while len(self._delayed) > 0 and self._delayed[0][0] <= now:
+                due, idx, job = heapq.heappop(self._delayed)
+                self._ready.setdefault(job.host, deque()).append(job)
+
+            wait = None
+            for host, queue in self._ready.iteritems():
+                if len(queue) > 0 and (self.per_host_limit <= 0 or self._active.get(host, 0) < self.per_host_limit):
+                    start = self._next_start.get(host, 0)
+                    if start > now:
+                        wait = start - now if wait is None else min(wait, start - now)
+                        continue
+                    if self.min_interval > 0:
+                        self._next_start[host] = now + self.min_interval
+                    self._active[host] = self._active.get(host, 0) + 1
+                    return queue.popleft()
+
+            # nothing we can do yet, so wait until the next delayed job is due, a host's rate limit allows
+            # another request, or another worker finishes
+            if len(self._delayed) > 0:
+                due = max(self._delayed[0][0] - now, 0)
+                wait = due if wait is None else min(wait, due)
+            self._cond.wait(wait)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                job = self._next_job()
+            if job is None:
+                return
+
+            retry_at = None
+            error = None
+            try:
+                settings = job.settings
+                resp, job.attempt, outcome = _attempt_request(job.method, job.url, job.attempt, settings["timeout"],
+                                                              settings["retry_on_timeout"], settings["retry_codes"], **job.kwargs)
+                if resp is not None:
+                    job.response = resp
+
+                if outcome == ATTEMPT_INVALID:
+                    job.response = None
+                elif outcome == ATTEMPT_RETRY and job.attempt <= settings["retries"]:
+                    bo = _backoff(job.attempt, settings["back_off_factor"], settings["max_back_off"])
+                    app.logger.debug('Request to {url} backing off for {bo} seconds'.format(url=job.url, bo=bo))
+                    _rewind(job.kwargs)
+                    retry_at = time.time() + bo
+            except Exception as e:
+                error = e
+
+            with self._cond:
+                self._active[job.host] -= 1
+                if retry_at is not None:
+                    heapq.heappush(self._delayed, (retry_at, job.index, job))
+                else:
+                    self._remaining -= 1
+                self._cond.notify_all()
+
+            if retry_at is None:
+                if error is None and job.settings["response_encoding"] is not None and job.response is not None:
+                    job.response.encoding = 'utf-8'
+                self.results.put((job.index, job.response, error))
+
+def fetch_many(reqs, concurrency=None, per_host_limit=None, ordered=True, min_interval=None,
+               retries=None, back_off_factor=None, max_back_off=None, timeout=None, response_encoding=None,
+               retry_on_timeout=None, retry_codes=None, raise_errors=True):
+    """
+    Make many requests concurrently.  Each request gets the same retry and back-off behaviour as it
+    would through get/post/put/delete, but while one request is backing off the others carry on.
+
+    Each request may be a url, which will be requested with GET, or a dict with a "url", an optional
+    "method" (defaults to GET), and any other keyword arguments that could be passed to get/post/put/delete
+    (including the retry settings, which override those passed to this function).
+
+    This is a generator, which yields (index, response) tuples, where index is the position of the request
+    in the list given.  As with get/post/put/delete, the response is None if no response could be obtained.
+    If making a request raised an exception, that exception is raised when its turn comes to be yielded, or, if
+    raise_errors is False, it is yielded in place of the response, and the other requests carry on.
+
+    :param reqs: iterable of urls or request dicts
+    :param concurrency: maximum number of requests in flight at once
+    :param per_host_limit: maximum number of requests in flight to any one host at once (0 for no limit)
+    :param ordered: if True, yield responses in the order the requests were given, otherwise yield them as they complete
+    :param min_interval: minimum number of seconds between starting requests to any one host (0 for no limit)
+    :return: generator of (index, response)
+    """
+    if concurrency is None:
+        concurrency = app.config.get("HTTP_BATCH_CONCURRENCY", 10)
+
+    if per_host_limit is None:
+        per_host_limit = app.config.get("HTTP_BATCH_PER_HOST_LIMIT", 4)
+
+    if min_interval is None:
+        min_interval = app.config.get("HTTP_BATCH_MIN_INTERVAL", 0)
+
+    defaults = {
+        "retries" : retries,
+        "back_off_factor" : back_off_factor,
+        "max_back_off" : max_back_off,
+        "timeout" : timeout,
+        "response_encoding" : response_encoding,
+        "retry_on_timeout" : retry_on_timeout,
+        "retry_codes" : retry_codes
+    }
+
+    jobs = []
+    for i, req in enumerate(reqs):
+        if isinstance(req, basestring):
+            req = {"url" : req}
+        kwargs = dict(req)
+        url = kwargs.pop("url")
+        method = kwargs.pop("method", "GET")
+        setting_args = {}
+        for k, v in defaults.iteritems():
+            setting_args[k] = kwargs.pop(k, v)
+        jobs.append(_BatchJob(i, method, url, _request_settings(**setting_args), kwargs))
+
+    if len(jobs) == 0:
+        return
+
+    runner = _BatchRunner(jobs, concurrency, per_host_limit, min_interval)
+    runner.start()
+
+    waiting = {}
+    next_index = 0
+    try:
+        for i in range(len(jobs)):
+            idx, resp, error = runner.results.get()
+            if not ordered:
+                if error is not None:
+                    if raise_errors:
+                        raise error
+                    resp = error
+                yield idx, resp
+                continue
+
+            waiting[idx] = (resp, error)
+            while next_index in waiting:
+                resp, error = waiting.pop(next_index)
+                if error is not None:
+                    if raise_errors:
+                        raise error
+                    resp = error
+                yield next_index, resp
+                next_index += 1
+    finally:
+        # if the caller stops early (or we raised), don't carry on making requests nobody is waiting for
+        runner.cancel()
 
-    return resp, content, downloaded_bytes
+######################################################
+# Rate limiting
+
+class RateLimiter(object):
+    """
+    Ensures that calls to wait() return at least interval seconds apart, across all the
+    threads which share the limiter
+    """
+    def __init__(self, interval):
+        self.interval = interval
+        self._next = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval or self.interval <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            start = now if self._next is None or self._next < now else self._next
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
 
 ######################################################
 # Mock requests Response object - useful for testing
@@ -228,9 +711,9 @@ class MockResponse(object):
     def headers(self):
         return self._headers if self._headers is not None else {}
 
-    def iter_content(self, num_bytes):
+    def iter_content(self, chunk_size=1):
         while True:
-            b = self._stream.read(num_bytes)
+            b = self._stream.read(chunk_size)
             if b == "":
                 # we have reached the end of the file
                 break
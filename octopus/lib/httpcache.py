@@ -0,0 +1,330 @@
+"""
+A response cache for GET requests to external services, shared by the API clients.
+
+Each service (e.g. "EPMC") gets its own ResponseCache, configured by <SERVICE>_CACHE_* settings, which looks
+responses up in a list of tiers (in-process, on-disk, Elasticsearch, ...) in order, and stores fresh responses
+in all of them.
+"""
+from octopus.core import app
+from octopus.lib import plugin
+from collections import OrderedDict
+from requests.structures import CaseInsensitiveDict
+import requests, threading, time, json, base64, hashlib, sqlite3, os
+
+class CacheException(Exception):
+    pass
+
+######################################################
+# Cache entries
+
+def make_entry(resp, ttl, stale_ttl=0):
+    now = time.time()
+    return {
+        "status" : resp.status_code,
+        "reason" : resp.reason,
+        "headers" : dict(resp.headers),
+        "encoding" : resp.encoding,
+        "content" : resp.content,
+        "stored" : now,
+        "expires" : now + ttl,
+        "stale_until" : now + ttl + stale_ttl
+    }
+
+def make_response(entry, url):
+    resp = requests.Response()
+    resp.status_code = entry.get("status")
+    resp.reason = entry.get("reason")
+    resp.headers = CaseInsensitiveDict(entry.get("headers", {}))
+    resp.encoding = entry.get("encoding")
+    resp.url = url
+    resp._content = entry.get("content")
+    resp._content_consumed = True
+    resp.from_cache = True
+    return resp
+
+def serialise(entry):
+    s = dict(entry)
+    s["content"] = base64.b64encode(entry.get("content") or "")
+    return json.dumps(s)
+
+def deserialise(raw):
+    entry = json.loads(raw)
+    entry["content"] = base64.b64decode(entry.get("content", ""))
+    return entry
+
+def cache_key(url, request_args=None):
+    """
+    The key for the response to a GET on the url, made with the given extra arguments to requests (headers,
+    params, etc), which may change the response.  Returns None if the arguments can't be turned into a key, in
+    which case the response should not be cached.
+    """
+    if request_args:
+        if request_args.get("stream"):
+            return None
+        try:
+            url += u"\n" + json.dumps(request_args, sort_keys=True)
+        except (TypeError, ValueError):
+            return None
+
+    # urls may carry api keys, so don't store them in the clear
+    if isinstance(url, unicode):
+        url = url.encode("utf-8")
+    return hashlib.sha1(url).hexdigest()
+
+######################################################
+# Tiers
+
+class CacheTier(object):
+    def get(self, key):
+        raise NotImplementedError()
+
+    def set(self, key, entry):
+        raise NotImplementedError()
+
+    def delete(self, key):
+        raise NotImplementedError()
+
+class MemoryTier(CacheTier):
+    """
+    In-process LRU of at most max_entries responses, holding at most max_bytes of response bodies.  Responses
+    larger than max_entry_bytes (such as full texts) are not held in memory at all.
+    """
+    def __init__(self, max_entries=None, max_bytes=None, max_entry_bytes=None):
+        self.max_entries = max_entries if max_entries is not None else app.config.get("HTTP_CACHE_MEMORY_SIZE", 1000)
+        self.max_bytes = max_bytes if max_bytes is not None else app.config.get("HTTP_CACHE_MEMORY_MAX_BYTES", 67108864)
+        self.max_entry_bytes = max_entry_bytes if max_entry_bytes is not None else app.config.get("HTTP_CACHE_MEMORY_MAX_ENTRY_BYTES", 1048576)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        size = len(entry.get("content") or "")
+        with self._lock:
+            self._remove(key)
+            if size > self.max_entry_bytes:
+                return
+            self._entries[key] = entry
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= len(old.get("content") or "")
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.get("content") or "")
+
+class SQLiteTier(CacheTier):
+    """
+    On-disk cache in a single SQLite database, which can be shared between processes
+    """
+    def __init__(self, path=None):
+        self.path = path if path is not None else app.config.get("HTTP_CACHE_SQLITE_PATH")
+        if self.path is None:
+            raise CacheException("HTTP_CACHE_SQLITE_PATH must be set to use the SQLite cache tier")
+        dir = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(dir):
+            os.makedirs(dir)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires REAL, entry TEXT)")
+
+    def _conn(self):
+        # sqlite connections can't be shared between threads, so each thread gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._conn().execute("SELECT entry FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return deserialise(row[0])
+
+    def set(self, key, entry):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO responses (key, expires, entry) VALUES (?, ?, ?)",
+                         (key, entry.get("stale_until"), serialise(entry)))
+
+    def delete(self, key):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def purge(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM responses WHERE expires < ?", (time.time(),))
+
+######################################################
+# The cache
+
+class ResponseCache(object):
+    """
+    Caches the responses to GET requests.
+
+    Successful responses are kept for ttl seconds, and 404/410 responses for negative_ttl seconds.  For a
+    further stale_ttl seconds after that an expired response is still returned, while a fresh copy is
+    fetched in the background.  Any other response is never cached.
+    """
+    NEGATIVE_CODES = [404, 410]
+
+    def __init__(self, tiers, ttl, negative_ttl=0, stale_ttl=0):
+        self.tiers = tiers
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+
+        self._revalidating = set()
+        self._lock = threading.Lock()
+
+    def get(self, url, fetch, request_args=None):
+        key = cache_key(url, request_args)
+        if key is None:
+            return fetch()
+        entry = self.lookup(key)
+        if entry is not None:
+            now = time.time()
+            if now < entry.get("expires"):
+                return make_response(entry, url)
+            if now < entry.get("stale_until"):
+                self._revalidate(key, fetch)
+                return make_response(entry, url)
+
+        resp = fetch()
+        self.store(key, resp)
+        return resp
+
+    def lookup(self, key):
+        for i, tier in enumerate(self.tiers):
+            entry = tier.get(key)
+            if entry is None:
+                continue
+            if time.time() >= entry.get("stale_until"):
+                tier.delete(key)
+                continue
+            # promote to the faster tiers we missed in
+            for faster in self.tiers[:i]:
+                faster.set(key, entry)
+            return entry
+        return None
+
+    def store(self, key, resp):
+        if resp is None:
+            return
+        if 200 <= resp.status_code < 300:
+            ttl = self.ttl
+        elif resp.status_code in self.NEGATIVE_CODES:
+            ttl = self.negative_ttl
+        else:
+            return
+        if not ttl:
+            return
+
+        entry = make_entry(resp, ttl, self.stale_ttl)
+        for tier in self.tiers:
+            tier.set(key, entry)
+
+    def invalidate(self, url, request_args=None):
+        key = cache_key(url, request_args)
+        if key is None:
+            return
+        for tier in self.tiers:
+            tier.delete(key)
+
+    def _revalidate(self, key, fetch):
+        with self._lock:
+            if key in self._revalidating:
+                return
+            self._revalidating.add(key)
+
+        def refresh():
+            try:
+                self.store(key, fetch())
+            except Exception as e:
+                app.logger.info("Unable to revalidate cached response: {x}".format(x=e))
+            finally:
+                with self._lock:
+                    self._revalidating.discard(key)
+
+        t = threading.Thread(target=refresh)
+        t.daemon = True
+        t.start()
+
+######################################################
+# Per-service caches
+
+_caches = {}
+_tiers = {}
+_lock = threading.Lock()
+
+def cache_for(service):
+    """
+    Get the ResponseCache for the named service, or None if <SERVICE>_CACHE_TTL is not set
+    """
+    if isinstance(service, ResponseCache):
+        return service
+
+    service = service.upper()
+    if service in _caches:
+        return _caches[service]
+
+    with _lock:
+        if service not in _caches:
+            _caches[service] = _make_cache(service)
+    return _caches[service]
+
+def reset():
+    with _lock:
+        _caches.clear()
+        _tiers.clear()
+
+def _make_cache(service):
+    ttl = app.config.get(service + "_CACHE_TTL")
+    if not ttl:
+        return None
+
+    negative_ttl = app.config.get(service + "_CACHE_NEGATIVE_TTL")
+    if negative_ttl is None:
+        negative_ttl = app.config.get("HTTP_CACHE_NEGATIVE_TTL", 0)
+
+    stale_ttl = app.config.get(service + "_CACHE_STALE_TTL")
+    if stale_ttl is None:
+        stale_ttl = app.config.get("HTTP_CACHE_STALE_TTL", 0)
+
+    tier_names = app.config.get(service + "_CACHE_TIERS")
+    if tier_names is None:
+        tier_names = app.config.get("HTTP_CACHE_TIERS", ["octopus.lib.httpcache.MemoryTier"])
+
+    # tiers are shared between all the services which use them
+    tiers = []
+    for name in tier_names:
+        if name not in _tiers:
+            klazz = plugin.load_class(name)
+            if klazz is None:
+                raise CacheException("Unable to load cache tier {x}".format(x=name))
+            _tiers[name] = klazz()
+        tiers.append(_tiers[name])
+
+    return ResponseCache(tiers, ttl, negative_ttl=negative_ttl, stale_ttl=stale_ttl)
+
+def fetch(service, url, fn, request_args=None):
+    """
+    Get the response for url from the service's cache, calling fn() to make the request if it
+    is not cached.  request_args are any other arguments the request is made with, which form part of the key.
+    """
+    cache = cache_for(service) if service is not None else None
+    if cache is None:
+        return fn()
+    return cache.get(url, fn, request_args=request_args)
@@ -3,10 +3,17 @@
 # characters written straight into this source file
 
 def find(lang):
-    key = lang.lower()
-    for row in ISO_639_2:
-        if key in [r.lower() for r in row]:
-            return as_dict(row)
+    row = _INDEX.get(lang.lower())
+    if row is not None:
+        return as_dict(row)
+
+def find_many(langs):
+    """
+    Look up each of the languages, giving None for the ones which aren't known
+
+    :return: list of dicts (as from find), in the same order as langs
+    """
+    return [find(lang) if lang is not None else None for lang in langs]
 
 def as_dict(row):
     return {
@@ -507,3 +514,18 @@ ISO_639_2 = [
     ["zxx", "", "", "No linguistic content; Not applicable", "pas de contenu linguistique; non applicable"],
     ["zza", "", "", "Zaza; Dimili; Dimli; Kirdki; Kirmanjki; Zazaki", "zaza; dimili; dimli; kirdki; kirmanjki; zazaki"]
 ]
+
+###############################################################
+# Index of the spec, by every cell of every row, lowercased.  Where two rows share a value, the first one
+# wins, as it would when scanning the table in order
+
+def _build_index(table):
+    index = {}
+    for row in table:
+        for cell in row:
+            index.setdefault(cell.lower(), row)
+            # so that unicode strings find the rows by their non-ascii names too
+            index.setdefault(cell.decode("utf-8").lower(), row)
+    return index
+
+_INDEX = _build_index(ISO_639_2)
@@ -16,18 +16,32 @@ class Locality(object):
 
     def currency_code_for(self, val):
         self._load_currencies()
-        comp = val.lower()
-        for k,v in self._currency_name2code.iteritems():
-            if k == comp:
-                return v
-        return None
+        return self._currency_name2code.get(val.lower())
+
+    def currency_codes_for(self, vals):
+        """
+        Look up the currency code for each of the names or codes, giving None for the ones which aren't known
+        """
+        self._load_currencies()
+        return [self._currency_name2code.get(v.lower()) if v is not None else None for v in vals]
 
     def _load_currencies(self):
         if len(self._currency_codes) == 0:
+            seen = set()
             for code, country_info in self._raw.iteritems():
                 if 'currency_alphabetic_code' in country_info and 'currency_name' in country_info:
-                    if country_info['currency_alphabetic_code'] not in self._currency_codes:
-                        self._currency_name2code[country_info['currency_name']] = country_info['currency_alphabetic_code']
+                    if country_info['currency_alphabetic_code'] not in seen:
                         self._currency_name2code[country_info['currency_name'].lower()] = country_info['currency_alphabetic_code']
                         self._currency_name2code[country_info['currency_alphabetic_code'].lower()] = country_info['currency_alphabetic_code']
-                        self._currency_codes.append(country_info['currency_alphabetic_code'])
\ No newline at end of file
+                        self._currency_codes.append(country_info['currency_alphabetic_code'])
+                        seen.add(country_info['currency_alphabetic_code'])
+
+# the locality for the standard data set, with its lookup tables built once, for the module functions below
+_default = Locality()
+_default._load_currencies()
+
+def currency_code_for(val):
+    return _default.currency_code_for(val)
+
+def currency_codes_for(vals):
+    return _default.currency_codes_for(vals)
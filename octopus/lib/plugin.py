@@ -1,4 +1,4 @@
-import importlib
+import importlib, threading, types
 
 # Note that we delay import of app to the functions which need it,
 # since we may want to load plugins during app creation too, and otherwise
@@ -7,6 +7,13 @@ import importlib
 class PluginException(Exception):
     pass
 
+# the plugins resolved so far, by kind ("class" or "function") and path, since each kind can be overridden separately
+# in the config.  Paths which could not be resolved are held too (as _MISSING), so that they are not imported again
+# on every call
+_MISSING = object()
+_registry = {}
+_registry_lock = threading.Lock()
+
 def load_class_raw(classpath):
     modpath = ".".join(classpath.split(".")[:-1])
     classname = classpath.split(".")[-1]
@@ -18,22 +25,7 @@ def load_class_raw(classpath):
     return klazz
 
 def load_class(classpath, cache_class_ref=True):
-    from octopus.core import app
-    klazz = app.config.get("PLUGIN_CLASS_REFS", {}).get(classpath)
-    if klazz is not None:
-        return klazz
-
-    klazz = load_class_raw(classpath)
-    if klazz is None:
-        app.logger.info("Could not load class {x}".format(x=classpath))
-        return None
-
-    if cache_class_ref:
-        if "PLUGIN_CLASS_REFS" not in app.config:
-            app.config["PLUGIN_CLASS_REFS"] = {}
-        app.config["PLUGIN_CLASS_REFS"][classpath] = klazz
-
-    return klazz
+    return _load(classpath, "PLUGIN_CLASS_REFS", load_class_raw, "class", cache_class_ref)
 
 def load_module(modpath):
     return importlib.import_module(modpath)
@@ -49,19 +41,111 @@ def load_function_raw(fnpath):
     return fn
 
 def load_function(fnpath, cache_fn_ref=True):
+    return _load(fnpath, "PLUGIN_FN_REFS", load_function_raw, "function", cache_fn_ref)
+
+def _load(path, refs_cfg, loader, kind, cache):
+    key = (kind, path)
+    ref = _registry.get(key)
+    if ref is not None:
+        return ref if ref is not _MISSING else None
+
+    # anything registered in the config takes precedence
     from octopus.core import app
-    fn = app.config.get("PLUGIN_FN_REFS", {}).get(fnpath)
-    if fn is not None:
-        return fn
+    ref = app.config.get(refs_cfg, {}).get(path)
+    if ref is None:
+        ref = loader(path) if path is not None else None
 
-    fn = load_function_raw(fnpath)
-    if fn is None:
-        app.logger.info("Could not load function {x}".format(x=fnpath))
-        return None
+    if ref is None:
+        app.logger.info("Could not load {k} {x}".format(k=kind, x=path))
+    if cache and path is not None:
+        with _registry_lock:
+            _registry[key] = ref if ref is not None else _MISSING
+    return ref
 
-    if cache_fn_ref:
-        if "PLUGIN_FN_REFS" not in app.config:
-            app.config["PLUGIN_FN_REFS"] = {}
-        app.config["PLUGIN_FN_REFS"][fnpath] = fn
+def register(path, ref):
+    """
+    Make the class or function available as the plugin at the path, without importing it
+    """
+    with _registry_lock:
+        _registry[("class", path)] = ref
+        _registry[("function", path)] = ref
 
-    return fn
+def reset():
+    """
+    Forget everything resolved so far (including failures), so that it will be loaded again
+    """
+    with _registry_lock:
+        _registry.clear()
+
+def resolve(path):
+    """
+    Load the class or function at the path, raising a PluginException if it can't be.  Overrides in either
+    PLUGIN_CLASS_REFS or PLUGIN_FN_REFS are respected.  A path which turns out to be a class is resolved as a
+    class too, so that later load_class calls for it are answered from the registry.
+    """
+    from octopus.core import app
+    if path in app.config.get("PLUGIN_CLASS_REFS", {}):
+        ref = load_class(path)
+    else:
+        ref = load_function(path)
+        if isinstance(ref, (type, types.ClassType)):
+            ref = load_class(path)
+    if ref is None:
+        raise PluginException(u"Unable to load plugin {x}".format(x=path))
+    return ref
+
+def configured_paths(specs=None):
+    """
+    Get the plugin paths named in the config by the specs (by default PLUGIN_CONFIG_PATHS).  Each spec is a
+    dotted path through the config, starting with the setting name, where "*" stands for every value of
+    a dict or every item of a list, e.g. "SEARCHAPI.*.dao"
+    """
+    from octopus.core import app
+    if specs is None:
+        specs = app.config.get("PLUGIN_CONFIG_PATHS", [])
+
+    paths = []
+    for spec in specs:
+        parts = spec.split(".")
+        for val in _walk(app.config.get(parts[0]), parts[1:]):
+            if isinstance(val, basestring) and val not in paths:
+                paths.append(val)
+    return paths
+
+def _walk(obj, parts):
+    if obj is None:
+        return []
+    if len(parts) == 0:
+        return [obj]
+
+    part, rest = parts[0], parts[1:]
+    if part == "*":
+        if isinstance(obj, dict):
+            children = obj.values()
+        elif isinstance(obj, (list, tuple)):
+            children = obj
+        else:
+            return []
+    elif isinstance(obj, dict):
+        children = [obj.get(part)]
+    else:
+        return []
+
+    vals = []
+    for c in children:
+        vals += _walk(c, rest)
+    return vals
+
+def initialise():
+    """
+    Resolve all of the plugins named in the config (see configured_paths) up front, so that a misconfigured
+    path stops the app from starting, rather than failing the requests which use it
+    """
+    failed = []
+    for path in configured_paths():
+        try:
+            resolve(path)
+        except PluginException:
+            failed.append(path)
+    if len(failed) > 0:
+        raise PluginException(u"Unable to load configured plugins: {x}".format(x=u", ".join(failed)))
@@ -1,18 +1,181 @@
-import re, os
+import re, os, threading, time, hashlib, mimetypes, json
 from unicodedata import normalize
 from functools import wraps
+from datetime import datetime
 from flask import request, current_app, flash, redirect, send_from_directory, abort, render_template, make_response
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
 from urlparse import urlparse, urljoin
 
 from octopus.core import app
 
+class StaticIndex(object):
+    """
+    Index of the files in the STATIC_PATHS, mapping each request path to the file that serves it (from the first
+    directory it appears in), so that serving a static file does not have to probe the filesystem.
+
+    The index is built once, when first used.  If reload is set (by default, when the app is in debug mode) a
+    path which is not found causes the index to be rebuilt (at most every STATIC_INDEX_RELOAD_INTERVAL
+    seconds), and files are checked for changes each time they are served.
+    """
+    # content-codings we can serve precompressed variants for, and the extension of the variant
+    ENCODINGS = {"br" : ".br", "gzip" : ".gz"}
+
+    def __init__(self, dirs=None, reload=None):
+        self.dirs = dirs if dirs is not None else app.config.get("STATIC_PATHS", [])
+        if reload is None:
+            reload = app.config.get("STATIC_INDEX_RELOAD")
+        self.reload = reload if reload is not None else app.debug
+        self._files = None
+        self._meta = {}
+        self._built = 0
+        self._lock = threading.Lock()
+
+    def build(self):
+        files = {}
+        for dir in self.dirs:
+            for root, dirnames, filenames in os.walk(dir):
+                rel = os.path.relpath(root, dir)
+                for fn in filenames:
+                    path = fn if rel == "." else os.path.join(rel, fn)
+                    files.setdefault(path.replace(os.sep, "/"), os.path.join(root, fn))
+        with self._lock:
+            self._files = files
+            self._meta = {}
+            self._built = time.time()
+
+    def find(self, path):
+        """
+        The absolute path of the file which serves the request path, or None
+        """
+        if self._files is None:
+            self.build()
+        target = self._files.get(path)
+        if target is None and self.reload and time.time() - self._built > app.config.get("STATIC_INDEX_RELOAD_INTERVAL", 1):
+            self.build()
+            target = self._files.get(path)
+        return target
+
+    def meta(self, target):
+        """
+        The modification time, size and (strong) ETag of the file, worked out once per file, or once per
+        change to the file if reloading
+        """
+        meta = self._meta.get(target)
+        if meta is not None and not self.reload:
+            return meta
+
+        st = os.stat(target)
+        if meta is not None and meta[0] == st.st_mtime and meta[1] == st.st_size:
+            return meta
+
+        h = hashlib.sha1()
+        with open(target, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), ""):
+                h.update(chunk)
+        meta = (st.st_mtime, st.st_size, h.hexdigest())
+        self._meta[target] = meta
+        return meta
+
+    def variant(self, path, accept_encodings):
+        """
+        The best precompressed variant of the file for the accepted encodings, as a tuple of the
+        content-coding and the file, or (None, None) if there isn't one
+        """
+        best = (0, None, None)
+        for encoding in app.config.get("STATIC_PRECOMPRESSED", []):
+            q = accept_encodings[encoding]
+            if q <= best[0]:
+                continue
+            target = self.find(path + self.ENCODINGS.get(encoding, "." + encoding))
+            if target is not None:
+                best = (q, encoding, target)
+        return best[1], best[2]
+
+_static_index = None
+_static_index_lock = threading.Lock()
+
+def static_index():
+    global _static_index
+    if _static_index is None:
+        with _static_index_lock:
+            if _static_index is None:
+                _static_index = StaticIndex()
+    return _static_index
+
+_asset_map = None
+_asset_map_lock = threading.Lock()
+
+def asset_path(name):
+    """
+    The fingerprinted name of the built asset (as produced by octopus.lib.assets), from the ASSET_MAP_FILE, or
+    the name itself if it is not fingerprinted.  The file is read once, or re-read whenever it changes if the
+    static index is reloading.
+    """
+    global _asset_map
+    path = app.config.get("ASSET_MAP_FILE")
+    if path is None:
+        return name
+
+    current = _asset_map
+    if current is None or current[0] != path or static_index().reload:
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return name
+        if current is None or current[0] != path or current[1] != mtime:
+            with _asset_map_lock:
+                with open(path) as f:
+                    current = (path, mtime, json.loads(f.read()))
+                _asset_map = current
+
+    return current[2].get(name, name)
+
+# fingerprinted asset names, as produced by octopus.lib.assets
+_fingerprint_rx = re.compile(r"\.[0-9a-f]{10}\.[^./]+$")
+
 # serve static files from multiple potential locations
 def custom_static(path):
-    for dir in app.config.get("STATIC_PATHS", []):
-        target = os.path.join(dir, path)
-        if os.path.isfile(target):
-            return send_from_directory(os.path.dirname(target), os.path.basename(target))
-    abort(404)
+    index = static_index()
+    target = index.find(path)
+    if target is None:
+        abort(404)
+
+    mimetype = mimetypes.guess_type(target)[0] or "application/octet-stream"
+    encoding = None
+    if len(app.config.get("STATIC_PRECOMPRESSED", [])) > 0:
+        encoding, variant = index.variant(path, request.accept_encodings)
+        if encoding is not None:
+            target = variant
+
+    try:
+        mtime, size, etag = index.meta(target)
+    except (OSError, IOError):
+        abort(404)
+
+    # fingerprinted files never change, so can be cached indefinitely
+    if _fingerprint_rx.search(path) or "v" in request.args:
+        max_age = app.config.get("STATIC_IMMUTABLE_MAX_AGE", 31536000)
+    else:
+        max_age = app.config.get("STATIC_MAX_AGE", 43200)
+    last_modified = datetime.utcfromtimestamp(int(mtime))
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        resp = current_app.response_class(status=304)
+    else:
+        resp = current_app.response_class(wrap_file(request.environ, open(target, "rb")),
+                                          mimetype=mimetype, direct_passthrough=True)
+        resp.content_length = size
+        if encoding is not None:
+            resp.content_encoding = encoding
+
+    resp.set_etag(etag)
+    resp.last_modified = last_modified
+    resp.cache_control.public = True
+    resp.cache_control.max_age = max_age
+    if len(app.config.get("STATIC_PRECOMPRESSED", [])) > 0:
+        resp.vary.add("Accept-Encoding")
+    return resp
 
 # a decorator to be used elsewhere (or in this file) in the app,
 # anywhere where a view f() should be served only over SSL
@@ -10,6 +10,15 @@ def detect_encoding(s):
     return m.group(1)
 
 def fromstring(s):
+    # lxml refuses unicode strings which carry an encoding declaration, so rather than fail a parse
+    # first, strip the declaration up front and parse the string once
+    if isinstance(s, unicode) and encoding_rx.match(s) is not None:
+        try:
+            return etree.fromstring(encoding_rx.sub("", s).strip())
+        except etree.XMLSyntaxError:
+            # fall through to the slower strategies below
+            pass
+
     # first try and parse the string directly
     error = None
     try:
@@ -42,14 +51,20 @@ def fromstring(s):
     clean = encoding_rx.sub("", s).strip()
     return etree.fromstring(clean)
 
+def _xp(element, xpath):
+    # xpath may be a string, or a precompiled etree.XPath
+    if callable(xpath):
+        return xpath(element)
+    return element.xpath(xpath)
+
 def xp_first_text(element, xpath, default=None):
-    el = element.xpath(xpath)
+    el = _xp(element, xpath)
     if len(el) > 0:
         return el[0].text
     return default
 
 def xp_texts(element, xpath):
-    els = element.xpath(xpath)
+    els = _xp(element, xpath)
     return [e.text for e in els if e.text is not None]
 
 def objectify(element):
@@ -3,3 +3,18 @@ from octopus.core import app
 
 class CachedFileDAO(dao.ESDAO):
     __type__ = app.config.get("CACHE_ES_TYPE", "cache")
+
+class ResponseCacheDAO(dao.ESDAO):
+    __type__ = app.config.get("CACHE_RESPONSE_ES_TYPE", "response_cache")
+
+    @classmethod
+    def mappings(cls):
+        return {
+            cls.__type__ : {
+                cls.__type__ : {
+                    "properties" : {
+                        "entry" : {"type" : "string", "index" : "no"}
+                    }
+                }
+            }
+        }
@@ -0,0 +1,22 @@
+from octopus.lib import httpcache
+from octopus.modules.cache import dao
+
+class ESTier(httpcache.CacheTier):
+    """
+    Response cache tier which keeps the cached responses in the index, so they are shared by
+    every process using the index
+    """
+    def get(self, key):
+        obj = dao.ResponseCacheDAO.pull(key)
+        if obj is None:
+            return None
+        return httpcache.deserialise(obj.data.get("entry"))
+
+    def set(self, key, entry):
+        obj = dao.ResponseCacheDAO({"id" : key, "stale_until" : entry.get("stale_until"), "entry" : httpcache.serialise(entry)})
+        obj.save()
+
+    def delete(self, key):
+        obj = dao.ResponseCacheDAO.pull(key)
+        if obj is not None:
+            obj.delete()
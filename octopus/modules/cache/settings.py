@@ -2,7 +2,8 @@ import os
 
 # To use the cache, you'll need to add this to your ES mappings config
 #ELASTIC_SEARCH_MAPPINGS = [
-#   "octopus.modules.cache.dao.CachedFileDAO"
+#   "octopus.modules.cache.dao.CachedFileDAO",
+#   "octopus.modules.cache.dao.ResponseCacheDAO"    # if you use octopus.modules.cache.responses.ESTier
 #]
 
 # list of classes which can generate cache files
@@ -18,4 +19,7 @@ CACHE_GENERATORS = {
 CACHE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "..", "..", "..", "cache")
 
 # index type to use for the cache
-CACHE_ES_TYPE = "cache"
\ No newline at end of file
+CACHE_ES_TYPE = "cache"
+
+# index type to use for cached http responses (see octopus.modules.cache.responses.ESTier)
+CACHE_RESPONSE_ES_TYPE = "response_cache"
@@ -1,5 +1,7 @@
 from octopus.core import app
 from octopus.lib import http, dataobj
+from octopus.modules import identifiers
+from octopus.modules.identifiers import doi as doiutil
 import urllib
 
 def quote(s, **kwargs):
@@ -31,13 +33,11 @@ class Core(object):
             page_size = 10
 
         # construct the URL that we'll search with
-        url = self.api_base_url + "search/"
-        quoted = quote(search_string, safe="/")
-        url += quoted + "?page=" + quote(str(page)) + "&pageSize=" + quote(str(page_size)) + "&apiKey=" + quote(self.api_key)
+        url = self._search_url(search_string, page_size, page)
         app.logger.info("Searching CORE with URL {x}".format(x=url))
 
         # make the request (this will handle re-tries if a 429 is received)
-        resp = http.get(url, retry_codes=[429])
+        resp = http.get(url, retry_codes=[429], cache="CORE")
 
         # if we didn't get a response, raise an error
         if resp is None:
@@ -64,6 +64,62 @@ class Core(object):
 
         return sr
 
+    def by_dois(self, dois, batch_size=None, concurrency=None, min_interval=None):
+        """
+        Search for many DOIs.  The DOIs are normalised and de-duplicated, and then combined into
+        queries of the form doi:("a" OR "b" ...) which are made concurrently.
+
+        :return: generator of (doi, SearchResult or exception), in the order the results arrive
+        """
+        if batch_size is None:
+            batch_size = app.config.get("CORE_BATCH_SIZE", 20)
+        if concurrency is None:
+            concurrency = app.config.get("CORE_BATCH_CONCURRENCY", 2)
+        if min_interval is None:
+            min_interval = app.config.get("CORE_BATCH_MIN_INTERVAL", 0)
+
+        # CORE won't return more than 100 records per page
+        page_size = min(max(batch_size * 5, 10), 100)
+
+        def request(batch):
+            query = "doi:(" + " OR ".join(['"' + d + '"' for d in batch]) + ")"
+            return {"url" : self._search_url(query, page_size, 1), "retry_codes" : [429]}
+
+        def parse(batch, resp):
+            if resp is None:
+                raise CoreClientException("Was unable to communicate with CORE")
+            if resp.status_code != 200:
+                raise CoreClientException("Got status code {x} from CORE".format(x=resp.status_code))
+
+            # DOIs are case insensitive, so match the records to the DOIs asked for ignoring case
+            j = resp.json()
+            found = dict([(d.lower(), []) for d in batch])
+            for record in j.get("data", []):
+                try:
+                    d = doiutil.normalise(SearchRecord(record).doi).lower()
+                except (ValueError, AttributeError):
+                    continue
+                if d in found:
+                    found[d].append(record)
+
+            # if we didn't get every result back, we only know about the DOIs we found
+            complete = j.get("totalHits", 0) <= len(j.get("data", []))
+            results = {}
+            for d in batch:
+                records = found[d.lower()]
+                if complete or len(records) > 0:
+                    results[d] = SearchResult({"status" : j.get("status"), "totalHits" : len(records), "data" : records})
+            return results
+
+        return identifiers.batch_lookup(dois, doiutil.normalise, request, parse,
+                                        batch_size=batch_size, concurrency=concurrency, min_interval=min_interval)
+
+    def _search_url(self, search_string, page_size, page):
+        url = self.api_base_url + "search/"
+        quoted = quote(search_string, safe="/")
+        url += quoted + "?page=" + quote(str(page)) + "&pageSize=" + quote(str(page_size)) + "&apiKey=" + quote(self.api_key)
+        return url
+
 class SearchResult(dataobj.DataObj):
 
     @property
@@ -82,4 +138,11 @@ class SearchRecord(dataobj.DataObj):
 
     @property
     def id(self):
-        return self._get_single("id", coerce=self._utf8_unicode())
\ No newline at end of file
+        return self._get_single("id", coerce=self._utf8_unicode())
+
+    @property
+    def doi(self):
+        doi = self._get_single("_source.doi", coerce=self._utf8_unicode())
+        if doi is None:
+            doi = self._get_single("doi", coerce=self._utf8_unicode())
+        return doi
\ No newline at end of file
@@ -1,4 +1,13 @@
 
 CORE_API_KEY = ""
 
-CORE_API_BASE_URL = "http://core.ac.uk:80/api-v2/"
\ No newline at end of file
+CORE_API_BASE_URL = "http://core.ac.uk:80/api-v2/"
+
+# number of seconds to cache CORE search responses for (see octopus.lib.httpcache).  None to disable
+CORE_CACHE_TTL = 86400
+
+# number of DOIs to combine into each query, maximum number of concurrent requests, and minimum number of
+# seconds between starting requests, when looking up many DOIs with Core.by_dois
+CORE_BATCH_SIZE = 20
+CORE_BATCH_CONCURRENCY = 2
+CORE_BATCH_MIN_INTERVAL = 1
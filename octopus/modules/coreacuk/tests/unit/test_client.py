@@ -0,0 +1,30 @@
+from unittest import TestCase
+from octopus.lib import http
+from octopus.modules.coreacuk import client
+import json
+
+class TestClient(TestCase):
+    def setUp(self):
+        super(TestClient, self).setUp()
+        self.old_fetch_many = http.fetch_many
+
+    def tearDown(self):
+        super(TestClient, self).tearDown()
+        http.fetch_many = self.old_fetch_many
+
+    def test_01_by_dois(self):
+        # CORE gives the DOI back in a different case from the one asked for
+        body = json.dumps({"status" : "OK", "totalHits" : 1, "data" : [{"_source" : {"doi" : "10.1234/ABC"}, "title" : "Found"}]})
+        def fetch_many(reqs, **kwargs):
+            for i, req in enumerate(reqs):
+                yield i, http.MockResponse(200, body)
+        http.fetch_many = fetch_many
+
+        core = client.Core(api_key="key", api_base_url="http://core/")
+        results = dict(core.by_dois(["10.1234/abc", "10.1234/def"], batch_size=2))
+
+        assert len(results["10.1234/abc"].records) == 1
+        assert results["10.1234/abc"].records[0].doi == "10.1234/ABC"
+
+        # the response was complete, so the other DOI is known not to be there
+        assert results["10.1234/def"].records == []
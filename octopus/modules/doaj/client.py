@@ -2,6 +2,8 @@ from octopus.core import app
 from octopus.lib import http
 import esprit, json
 from octopus.modules.doaj import models
+from octopus.modules import identifiers
+from octopus.modules.identifiers import issn as issnutil
 
 DOAJ_RETRY_CODES = [
     408,    # request timeout
@@ -97,7 +99,7 @@ class DOAJv1API(object):
         url = self.doaj_url("search", type, additional_path=http.quote(query_string), params=params)
         print url
 
-        resp = http.get(url, retry_codes=DOAJ_RETRY_CODES)
+        resp = http.get(url, retry_codes=DOAJ_RETRY_CODES, cache="DOAJ")
         j = resp.json()
 
         klazz = self.CLASSMAP.get(type)
@@ -107,6 +109,54 @@ class DOAJv1API(object):
         obs = [klazz(r) for r in j.get("results", [])]
         return obs
 
+    def journals_by_issns(self, issns, batch_size=None, concurrency=None, min_interval=None):
+        """
+        Look up the journals for many ISSNs.  The ISSNs are normalised and de-duplicated, and
+        then combined into queries of the form issn:("a" OR "b" ...) which are made concurrently.
+
+        :return: generator of (issn, list of Journals or exception), in the order the results arrive
+        """
+        if batch_size is None:
+            batch_size = app.config.get("DOAJ_BATCH_SIZE", 50)
+        if concurrency is None:
+            concurrency = app.config.get("DOAJ_BATCH_CONCURRENCY", 4)
+        if min_interval is None:
+            min_interval = app.config.get("DOAJ_BATCH_MIN_INTERVAL", 0)
+
+        # each ISSN usually belongs to one journal, so a page of twice the batch size should get them all
+        page_size = min(batch_size * 2, 100)
+
+        def request(batch):
+            query = "issn:(" + " OR ".join(['"' + i + '"' for i in batch]) + ")"
+            url = self.doaj_url("search", "journals", additional_path=http.quote(query), params={"page" : 1, "pageSize" : page_size})
+            return {"url" : url, "retry_codes" : DOAJ_RETRY_CODES}
+
+        def parse(batch, resp):
+            if resp is None:
+                raise DOAJException("Unable to communicate with DOAJ")
+            if resp.status_code != 200:
+                raise DOAJException("DOAJ search returned status code {x}".format(x=resp.status_code))
+
+            j = resp.json()
+            journals = [models.Journal(r) for r in j.get("results", [])]
+            found = dict([(i, []) for i in batch])
+            for journal in journals:
+                for issn in set(journal.all_issns()):
+                    try:
+                        issn = issnutil.normalise(issn)
+                    except ValueError:
+                        continue
+                    if issn in found:
+                        found[issn].append(journal)
+
+            # if we didn't get every result back, we only know about the ISSNs we found
+            if j.get("total", 0) > len(journals):
+                return dict([(k, v) for k, v in found.iteritems() if len(v) > 0])
+            return found
+
+        return identifiers.batch_lookup(issns, issnutil.normalise, request, parse,
+                                        batch_size=batch_size, concurrency=concurrency, min_interval=min_interval)
+
     def field_search_iterator(self, type, field, value, quoted=True, page_size=100, sort_by=None, sort_dir=None):
         qb = ANDQueryBuilder()
         qb.add_string_field(field, value, quoted)
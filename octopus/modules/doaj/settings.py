@@ -5,3 +5,12 @@ DOAJ_SEARCH_PORT = 80
 DOAJ_QUERY_ENDPOINT = "query"
 
 DOAJ_SEARCH_TYPE = "journal,article"
+
+# number of seconds to cache DOAJ search responses for (see octopus.lib.httpcache).  None to disable
+DOAJ_CACHE_TTL = 86400
+
+# number of ISSNs to combine into each query, maximum number of concurrent requests, and minimum number of
+# seconds between starting requests, when looking up many ISSNs with DOAJv1API.journals_by_issns
+DOAJ_BATCH_SIZE = 50
+DOAJ_BATCH_CONCURRENCY = 4
+DOAJ_BATCH_MIN_INTERVAL = 0.2
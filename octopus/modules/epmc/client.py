@@ -1,6 +1,6 @@
 from octopus.core import app
-from octopus.lib import http
-import urllib, string
+from octopus.lib import http, dates
+import urllib, string, threading, Queue, sys
 from octopus.modules.epmc import models
 from octopus.modules.epmc.queries import QueryBuilder
 from datetime import datetime
@@ -106,27 +106,134 @@ class EuropePMC(object):
         return cls.iterate(query_builder.to_url_query_param(), page_size=page_size, throttle=throttle)
 
     @classmethod
-    def iterate(cls, query_string, page_size=1000, throttle=None):
+    def iterate(cls, query_string, page_size=1000, throttle=None, prefetch=None):
+        """
+        Iterate over all the results of a query.  Up to prefetch pages are fetched in the background
+        while the current one is being consumed, and requests are started no less than throttle
+        seconds apart.
+        """
+        if prefetch is None:
+            prefetch = app.config.get("EPMC_PREFETCH_PAGES", 2)
+        pages = cls._pages(query_string, page_size, http.RateLimiter(throttle))
+        if prefetch > 0:
+            pages = prefetched(pages, prefetch)
+        for results in pages:
+            for r in results:
+                yield r
+
+    @classmethod
+    def harvest(cls, query_builder, date_field, fro, to, partition_days=1, page_size=1000, concurrency=None, throttle=None):
+        """
+        Harvest all the results of a query between two dates, by splitting the date range into disjoint
+        partitions of partition_days days, each of which is iterated over separately, up to concurrency
+        at a time.  Requests from all the partitions are started no less than throttle seconds apart.
+
+        Results are yielded in no particular order.
+
+        :param query_builder: QueryBuilder for the query, without the date restriction
+        :param date_field: the date field to partition on, e.g. "UPDATE_DATE" or "FIRST_PDATE"
+        :param fro: earliest date (datetime, or a string dates.parse can read)
+        :param to: latest date (datetime, or a string dates.parse can read)
+        """
+        if concurrency is None:
+            concurrency = app.config.get("EPMC_HARVEST_CONCURRENCY", 4)
+        if throttle is None:
+            throttle = app.config.get("EPMC_HARVEST_THROTTLE", 0)
+
+        queries = [q.to_url_query_param() for q in cls.partition(query_builder, date_field, fro, to, partition_days)]
+        limiter = http.RateLimiter(throttle)
+        out = Queue.Queue(maxsize=app.config.get("EPMC_PREFETCH_PAGES", 2) * concurrency)
+        work = Queue.Queue()
+        for q in queries:
+            work.put(q)
+        stop = threading.Event()
+        done = object()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    out.put(item, timeout=1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    try:
+                        q = work.get_nowait()
+                    except Queue.Empty:
+                        return
+                    for results in cls._pages(q, page_size, limiter):
+                        if not put(results):
+                            return
+            except Exception:
+                put(sys.exc_info())
+            finally:
+                put(done)
+
+        threads = [threading.Thread(target=worker) for i in range(min(concurrency, len(queries)))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        try:
+            remaining = len(threads)
+            while remaining > 0:
+                item = out.get()
+                if item is done:
+                    remaining -= 1
+                elif isinstance(item, tuple):
+                    raise item[0], item[1], item[2]
+                else:
+                    for r in item:
+                        yield r
+        finally:
+            # if the caller stops early (or we raised), stop making requests nobody is waiting for
+            stop.set()
+
+    @classmethod
+    def partition(cls, query_builder, date_field, fro, to, partition_days=1):
+        """
+        Split a query into one query per partition_days days between fro and to (inclusive)
+        """
+        if not isinstance(fro, datetime):
+            fro = dates.parse(fro)
+        if not isinstance(to, datetime):
+            to = dates.parse(to)
+
+        days = []
+        for start, end in dates.day_ranges(fro, to):
+            day = dates.reformat(start, out_format="%Y-%m-%d")
+            if len(days) == 0 or days[-1] != day:
+                days.append(day)
+
+        partitions = []
+        for i in range(0, len(days), partition_days):
+            chunk = days[i:i + partition_days]
+            qb = query_builder.copy()
+            qb.add_date_field(date_field, chunk[0], chunk[-1])
+            partitions.append(qb)
+        return partitions
+
+    @classmethod
+    def _pages(cls, query_string, page_size, limiter):
         cursor = ""
-        last = None
         while True:
-            if last is not None and throttle is not None:
-                diff = (datetime.utcnow() - last).total_seconds()
-                app.logger.debug(u"Last request at {x}, {y}s ago; throttle {z}s".format(x=last, y=diff, z=throttle))
-                if diff < throttle:
-                    waitfor = throttle - diff
-                    app.logger.debug(u"Throttling EPMC requests for {x}s".format(x=waitfor))
-                    time.sleep(waitfor)
-            results, cursor = cls.query(query_string, cursor=cursor, page_size=page_size)
-            last = datetime.utcnow()
+            limiter.wait()
+            results, cursor = cls.query(query_string, cursor=cursor, page_size=page_size, paged=True)
             if len(results) == 0:
                 break
-            for r in results:
-                yield r
+            yield results
 
     @classmethod
-    def query(cls, query_string, cursor="", page_size=25):
+    def query(cls, query_string, cursor="", page_size=25, paged=False):
         """
+        Pages of a cursor-paged search (any with a cursor, and every page when paged is set, as when
+        iterating or harvesting) are cached as the "EPMC_CURSOR" service rather than "EPMC", so that they
+        can be given their own (by default no) lifetime.
+
         :return: (results, next_cursor)
         """
         quoted = quote(query_string, safe="/")
@@ -142,7 +249,8 @@ class EuropePMC(object):
             url += "&cursorMark=" + qcursor
         app.logger.debug("Requesting EPMC metadata from " + url)
 
-        resp = http.get(url)
+        service = "EPMC_CURSOR" if paged or cursor != "" else "EPMC"
+        resp = http.get(url, cache=service)
         if resp is None:
             raise EuropePMCException(message="could not get a response from EPMC")
         if resp.status_code != 200:
@@ -159,15 +267,83 @@ class EuropePMC(object):
         return results, next_cursor_mark                      # NOTE: previous versions just returned results, not tuple
 
     @classmethod
-    def fulltext(cls, pmcid):
+    def fulltext(cls, pmcid, stream=None):
+        """
+        Get the fulltext XML for the pmcid.
+
+        If stream is True, the XML is parsed as it downloads, and only its front matter is kept (see
+        models.JATS.from_stream), which is much cheaper when working through large numbers of articles for
+        their metadata or licences.  Streamed responses are not cached.  Defaults to EPMC_FULLTEXT_STREAM.
+        """
+        if stream is None:
+            stream = app.config.get("EPMC_FULLTEXT_STREAM", False)
+
         url = app.config.get("EPMC_REST_API") + pmcid + "/fullTextXML"
         app.logger.debug("Searching for Fulltext at " + url)
-        resp = http.get(url)
+
+        if stream:
+            resp, _, _ = http.get_stream(url, read_stream=False)
+        else:
+            service = "EPMC_CURSOR" if paged or cursor != "" else "EPMC"
+        resp = http.get(url, cache=service)
         if resp is None:
             raise EuropePMCException(message="could not get a response for fulltext from EPMC")
         if resp.status_code != 200:
+            if stream:
+                resp.close()
             raise EuropePMCException(resp)
-        return EPMCFullText(resp.text)
+
+        if not stream:
+            return EPMCFullText(resp.text)
+
+        body = http.ResponseStream(resp)
+        try:
+            return EPMCFullText.from_stream(body)
+        finally:
+            body.close()
+
+
+def prefetched(iterable, size):
+    """
+    Iterate over iterable in a background thread, keeping up to size items ready in advance of the consumer
+    """
+    buffer = Queue.Queue(maxsize=size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def fill():
+        try:
+            for item in iterable:
+                if not put((None, item)):
+                    return
+        except Exception:
+            put((sys.exc_info(), None))
+        finally:
+            put((None, done))
+
+    t = threading.Thread(target=fill)
+    t.daemon = True
+    t.start()
+
+    try:
+        while True:
+            error, item = buffer.get()
+            if error is not None:
+                raise error[0], error[1], error[2]
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
 
 
 class EPMCFullText(models.JATS):
@@ -263,31 +263,129 @@ class EPMCMetadata(dataobj.DataObj):
         return self._get_list("authorList.author")
 
 
+# XPaths used by the JATS accessors, compiled once rather than on every call
+_XP = {
+    "title" : etree.XPath("//title-group/article-title"),
+    "manuscript" : etree.XPath("//article-id[@pub-id-type='manuscript']"),
+    "license" : etree.XPath("//license"),
+    "license_p" : etree.XPath("//license/license-p"),
+    "copyright" : etree.XPath("//copyright-statement"),
+    "categories" : etree.XPath("//article-categories/subj-group/subject"),
+    "authors" : etree.XPath("//contrib-group/contrib[@contrib-type='author']"),
+    "contribs" : etree.XPath("//contrib-group/contrib"),
+    "emails" : etree.XPath("//email"),
+    "keywords" : etree.XPath("//kwd-group/kwd"),
+    "publisher" : etree.XPath("//publisher/publisher-name"),
+    "pub_date_pub" : etree.XPath("//article-meta/pub-date[@date-type='pub']"),
+    "pub_date" : etree.XPath("//article-meta/pub-date"),
+    "accepted" : etree.XPath("//history/date[@date-type='accepted']"),
+    "received" : etree.XPath("//history/date[@date-type='received']"),
+    "issn" : etree.XPath("//journal-meta/issn"),
+    "pmcid" : etree.XPath("//article-meta/article-id[@pub-id-type='pmcid']"),
+    "doi" : etree.XPath("//article-meta/article-id[@pub-id-type='doi']"),
+    "affs" : etree.XPath("//aff[@id]"),
+    "string" : etree.XPath("string()")
+}
+
+def _cached(fn):
+    """
+    Keep the result of a JATS accessor, so that each is only worked out once per document
+    """
+    name = fn.__name__
+    def wrapper(self):
+        if name not in self._cache:
+            self._cache[name] = fn(self)
+        return self._cache[name]
+    wrapper.__name__ = name
+    wrapper.__doc__ = fn.__doc__
+    return wrapper
+
 class JATS(object):
+    # the accessors populated by extract()
+    FIELDS = ["title", "is_aam", "licence", "copyright_statement", "categories", "authors", "contribs", "emails",
+              "keywords", "publisher", "publication_date", "date_accepted", "date_submitted", "issn", "pmcid", "doi"]
+
+    # top level sections of the article which are thrown away as they are read by from_stream
+    STREAM_DISCARD = ["body", "back", "floats-group", "sub-article", "response"]
+
     def __init__(self, raw=None, xml=None):
         self.raw = None
         self.xml = None
+        self._cache = {}
         if raw is not None:
             self.raw = raw
             try:
-                self.xml = etree.fromstring(self.raw)
+                self.xml = xutil.fromstring(self.raw)
             except:
                 raise JATSException("Unable to parse XML", self.raw)
         elif xml is not None:
             self.xml = xml
 
+    @classmethod
+    def from_stream(cls, stream, discard=None):
+        """
+        Parse the JATS from a file-like object (such as an http.ResponseStream) as it is read, rather than
+        loading the whole document into memory first.  The body, back matter and any other top level sections
+        named in discard (STREAM_DISCARD by default) are freed as they are parsed, so only the front matter of
+        the article is kept, which is where all of the accessors look.
+
+        tostring() on the resulting object only returns what was kept.
+        """
+        if discard is None:
+            discard = cls.STREAM_DISCARD
+
+        root = None
+        section = None
+        try:
+            for event, el in etree.iterparse(stream, events=("start", "end")):
+                if event == "start":
+                    if root is None:
+                        root = el
+                    elif section is None and el.tag in discard and el.getparent() is root:
+                        section = el
+                    continue
+
+                if section is None:
+                    continue
+
+                # free everything inside the discarded section as soon as it has been read, leaving the
+                # (empty) section element itself in place
+                el.clear()
+                if el is section:
+                    section = None
+                else:
+                    parent = el.getparent()
+                    while el.getprevious() is not None:
+                        del parent[0]
+        except etree.XMLSyntaxError as e:
+            raise JATSException("Unable to parse XML: {x}".format(x=e), None)
+
+        if root is None:
+            raise JATSException("Unable to parse XML: no document", None)
+        return cls(xml=root)
+
+    def extract(self):
+        """
+        Get all of the commonly used fields (see FIELDS) at once, as a dict
+        """
+        return dict([(f, getattr(self, f)) for f in self.FIELDS])
+
     @property
+    @_cached
     def title(self):
-        return xutil.xp_first_text(self.xml, "//title-group/article-title")
+        return xutil.xp_first_text(self.xml, _XP["title"])
 
     @property
+    @_cached
     def is_aam(self):
-        manuscripts = self.xml.xpath("//article-id[@pub-id-type='manuscript']")
+        manuscripts = _XP["manuscript"](self.xml)
         return len(manuscripts) > 0
 
-    def get_licence_details(self):
+    @property
+    @_cached
+    def licence(self):
         # get the licence type
-        l = self.xml.xpath("//license")
+        l = _XP["license"](self.xml)
         if len(l) > 0:
             l = l[0]
         else:
@@ -296,52 +394,63 @@ class JATS(object):
         url = l.get("{http://www.w3.org/1999/xlink}href")
 
         # get the paragraph(s) describing the licence
-        para = self.xml.xpath("//license/license-p")
+        para = _XP["license_p"](self.xml)
         out = ""
         for p in para:
             out += etree.tostring(p)
 
         return type, url, out
 
+    def get_licence_details(self):
+        return self.licence
+
     @property
+    @_cached
     def copyright_statement(self):
-        return xutil.xp_first_text(self.xml, "//copyright-statement")
+        return xutil.xp_first_text(self.xml, _XP["copyright"])
 
     @property
+    @_cached
     def categories(self):
-        return xutil.xp_texts(self.xml, "//article-categories/subj-group/subject")
+        return xutil.xp_texts(self.xml, _XP["categories"])
 
     @property
+    @_cached
     def authors(self):
-        aels = self.xml.xpath("//contrib-group/contrib[@contrib-type='author']")
+        aels = _XP["authors"](self.xml)
         return self._make_contribs(aels)
 
     @property
+    @_cached
     def contribs(self):
-        cs = self.xml.xpath("//contrib-group/contrib")
+        cs = _XP["contribs"](self.xml)
         return self._make_contribs(cs)
 
     @property
+    @_cached
     def emails(self):
-        return xutil.xp_texts(self.xml, "//email")
+        return xutil.xp_texts(self.xml, _XP["emails"])
 
     @property
+    @_cached
     def keywords(self):
-        return xutil.xp_texts(self.xml, "//kwd-group/kwd")
+        return xutil.xp_texts(self.xml, _XP["keywords"])
 
     @property
+    @_cached
     def publisher(self):
-        return xutil.xp_first_text(self.xml, "//publisher/publisher-name")
+        return xutil.xp_first_text(self.xml, _XP["publisher"])
 
     @property
+    @_cached
     def publication_date(self):
         # first look for an explicit publication date
-        pds = self.xml.xpath("//article-meta/pub-date[@date-type='pub']")
+        pds = _XP["pub_date_pub"](self.xml)
         if len(pds) > 0:
             return self._make_date(pds[0])
 
         # if not, look for exactly one pub-date and use that
-        pds = self.xml.xpath("//article-meta/pub-date")
+        pds = _XP["pub_date"](self.xml)
         if len(pds) == 1:
             return self._make_date(pds[0])
 
@@ -349,31 +458,36 @@ class JATS(object):
         return None
 
     @property
+    @_cached
     def date_accepted(self):
-        das = self.xml.xpath("//history/date[@date-type='accepted']")
+        das = _XP["accepted"](self.xml)
         if len(das) > 0:
             return self._make_date(das[0])
 
     @property
+    @_cached
     def date_submitted(self):
-        rcs = self.xml.xpath("//history/date[@date-type='received']")
+        rcs = _XP["received"](self.xml)
         if len(rcs) > 0:
             return self._make_date(rcs[0])
 
     @property
+    @_cached
     def issn(self):
-        return xutil.xp_texts(self.xml, "//journal-meta/issn")
+        return xutil.xp_texts(self.xml, _XP["issn"])
 
     @property
+    @_cached
     def pmcid(self):
-        id = xutil.xp_first_text(self.xml, "//article-meta/article-id[@pub-id-type='pmcid']")
+        id = xutil.xp_first_text(self.xml, _XP["pmcid"])
         if id is not None and not id.startswith("PMC"):
             id = "PMC" + id
         return id
 
     @property
+    @_cached
     def doi(self):
-        return xutil.xp_first_text(self.xml, "//article-meta/article-id[@pub-id-type='doi']")
+        return xutil.xp_first_text(self.xml, _XP["doi"])
 
     def _make_date(self, element):
         ob = xutil.objectify(element)
@@ -388,6 +502,18 @@ class JATS(object):
             return None
         return year + "-" + month + "-" + day
 
+    @property
+    @_cached
+    def _affiliations(self):
+        # the normalised text of every affiliation with an id, so that contribs can look up their
+        # xrefs without searching the whole document each time
+        affs = {}
+        for ae in _XP["affs"](self.xml):
+            contents = _XP["string"](ae)
+            norm = " ".join(contents.split())
+            affs.setdefault(ae.get("id"), []).append(norm)
+        return affs
+
     def _make_contribs(self, elements):
         obs = []
 
@@ -415,7 +541,7 @@ class JATS(object):
 
             aff = c.find("aff")
             if aff is not None:
-                contents = aff.xpath("string()")
+                contents = _XP["string"](aff)
                 norm = " ".join(contents.split())
                 affs.append(norm)
 
@@ -423,12 +549,7 @@ class JATS(object):
             for x in xrefs:
                 if x.get("ref-type") == "aff":
                     affid = x.get("rid")
-                    xp = "//aff[@id='" + affid + "']"
-                    aff_elements = self.xml.xpath(xp)
-                    for ae in aff_elements:
-                        contents = ae.xpath("string()")
-                        norm = " ".join(contents.split())
-                        affs.append(norm)
+                    affs += self._affiliations.get(affid, [])
 
             if len(affs) > 0:
                 con["affiliations"] = affs
@@ -442,4 +563,4 @@ class JATS(object):
         if self.raw is not None:
             return self.raw
         elif self.xml is not None:
-            return etree.tostring(self.xml)
\ No newline at end of file
+            return etree.tostring(self.xml)
@@ -4,6 +4,11 @@ class QueryBuilder(object):
     def __init__(self):
         self.fields = []
 
+    def copy(self):
+        qb = QueryBuilder()
+        qb.fields = list(self.fields)
+        return qb
+
     def add_string_field(self, field, value, fuzzy=False):
         self.fields.append((field, value, fuzzy))
 
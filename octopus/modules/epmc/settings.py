@@ -1,3 +1,24 @@
 
 EPMC_REST_API = "http://www.ebi.ac.uk/europepmc/webservices/rest/"
 EPMC_TARGET_VERSION = "5.2.1"
+
+# number of seconds to cache one-off EPMC search and fulltext responses for (see octopus.lib.httpcache).  None to disable.
+# Cursor-paged searches (iterate, harvest, or any query given a cursor) are not cached by this; see EPMC_CURSOR_CACHE_TTL
+EPMC_CACHE_TTL = 86400
+
+# number of seconds to cache the pages of cursor-paged EPMC searches for.  None (the default) never caches them, so that
+# repeated iterations and harvests always see newly indexed records.  Before this setting they shared EPMC_CACHE_TTL
+EPMC_CURSOR_CACHE_TTL = None
+
+# number of pages of results to fetch in the background, ahead of the consumer, when iterating over
+# or harvesting a query
+EPMC_PREFETCH_PAGES = 2
+
+# number of date partitions to harvest at once with EuropePMC.harvest, and the minimum number of seconds
+# between starting requests across all of them
+EPMC_HARVEST_CONCURRENCY = 4
+EPMC_HARVEST_THROTTLE = 0.2
+
+# parse fulltext XML as it downloads, keeping only the front matter of the article, by default (see
+# EuropePMC.fulltext).  Streamed fulltext is not cached
+EPMC_FULLTEXT_STREAM = False
@@ -0,0 +1,85 @@
+from unittest import TestCase
+from octopus.modules.epmc import client
+from octopus.modules.epmc.queries import QueryBuilder
+from octopus.lib import httpcache
+import threading
+
+class TestClient(TestCase):
+    def setUp(self):
+        super(TestClient, self).setUp()
+        self.old_query = client.EuropePMC.query
+        self.requests = []
+        lock = threading.Lock()
+
+        # each query has 3 pages of 2 results, with the page number as the cursor
+        def query(cls, query_string, cursor="", page_size=25, paged=False):
+            with lock:
+                self.requests.append((query_string, cursor))
+            page = 0 if cursor == "" else int(cursor)
+            if page >= 3:
+                return [], str(page)
+            return [query_string + "/" + str(page) + "/" + str(i) for i in range(2)], str(page + 1)
+        client.EuropePMC.query = classmethod(query)
+
+    def tearDown(self):
+        super(TestClient, self).tearDown()
+        client.EuropePMC.query = self.old_query
+
+    def test_01_prefetched_iterate(self):
+        results = list(client.EuropePMC.iterate("q", prefetch=1))
+        assert results == ["q/0/0", "q/0/1", "q/1/0", "q/1/1", "q/2/0", "q/2/1"]
+        assert self.requests == [("q", ""), ("q", "1"), ("q", "2"), ("q", "3")]
+
+        # errors in the background are raised to the consumer
+        def broken():
+            yield 1
+            raise ValueError("broken")
+        it = client.prefetched(broken(), 2)
+        assert it.next() == 1
+        self.assertRaises(ValueError, it.next)
+
+    def test_02_partition(self):
+        qb = QueryBuilder()
+        qb.add_string_field("ISSN", "1234-5678")
+        parts = client.EuropePMC.partition(qb, "UPDATE_DATE", "2015-01-01", "2015-01-05", partition_days=2)
+        assert [p.to_url_query_param() for p in parts] == [
+            'ISSN:"1234-5678" UPDATE_DATE:[2015-01-01 TO 2015-01-02]',
+            'ISSN:"1234-5678" UPDATE_DATE:[2015-01-03 TO 2015-01-04]',
+            'ISSN:"1234-5678" UPDATE_DATE:[2015-01-05 TO 2015-01-05]'
+        ]
+        # the original query is untouched
+        assert qb.to_url_query_param() == 'ISSN:"1234-5678"'
+
+    def test_03_harvest(self):
+        qb = QueryBuilder()
+        qb.add_string_field("ISSN", "1234-5678")
+        results = list(client.EuropePMC.harvest(qb, "UPDATE_DATE", "2015-01-01", "2015-01-03", concurrency=2, throttle=0))
+        assert len(results) == 18
+        assert len(set(results)) == 18
+        assert len(self.requests) == 12
+
+    def test_04_cursor_cache(self):
+        client.EuropePMC.query = self.old_query
+        old_get = client.http.get
+        services = []
+
+        class Response(object):
+            status_code = 200
+            def json(self):
+                return {"version" : client.app.config.get("EPMC_TARGET_VERSION"), "resultList" : {"result" : []}, "nextCursorMark" : "AoE"}
+
+        def get(url, cache=None, **kwargs):
+            services.append((cache, "cursorMark=" in url))
+            return Response()
+        client.http.get = get
+        try:
+            # one-off searches use the EPMC cache, but cursor pages, including the first page of an iteration, do not
+            client.EuropePMC.query("q")
+            client.EuropePMC.query("q", cursor="AoE")
+            list(client.EuropePMC.iterate("q", prefetch=0))
+            assert services == [("EPMC", False), ("EPMC_CURSOR", True), ("EPMC_CURSOR", False)]
+        finally:
+            client.http.get = old_get
+
+        # which by default is not cached at all
+        assert httpcache.cache_for("EPMC_CURSOR") is None
@@ -0,0 +1,57 @@
+from unittest import TestCase
+from octopus.modules.epmc import models
+from StringIO import StringIO
+
+JATS_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<article xmlns:xlink="http://www.w3.org/1999/xlink">
+<front>
+<journal-meta><issn pub-type="ppub">1234-5678</issn><publisher><publisher-name>Pub</publisher-name></publisher></journal-meta>
+<article-meta>
+<article-id pub-id-type="pmcid">12345</article-id>
+<article-id pub-id-type="doi">10.1234/abc</article-id>
+<title-group><article-title>The Title</article-title></title-group>
+<contrib-group>
+<contrib contrib-type="author"><name><surname>One</surname><given-names>A</given-names></name><xref ref-type="aff" rid="aff1"/></contrib>
+<contrib contrib-type="editor"><name><surname>Two</surname></name><email>two@example.com</email></contrib>
+<aff id="aff1">The   University</aff>
+</contrib-group>
+<pub-date pub-type="epub"><day>2</day><month>3</month><year>2015</year></pub-date>
+<permissions><license license-type="open-access" xlink:href="http://creativecommons.org/licenses/by/4.0/"><license-p>CC BY</license-p></license></permissions>
+</article-meta>
+</front>
+<body><sec><p>Some text</p><p>More text with <email>body@example.com</email></p></sec><sec><p>Even more</p></sec></body>
+<back><ref-list><ref><mixed-citation>A reference</mixed-citation></ref></ref-list></back>
+</article>"""
+
+class TestModels(TestCase):
+    def test_01_jats(self):
+        j = models.JATS(raw=JATS_XML.decode("utf-8"))
+        assert j.title == "The Title"
+        assert j.pmcid == "PMC12345"
+        assert j.doi == "10.1234/abc"
+        assert j.issn == ["1234-5678"]
+        assert j.publisher == "Pub"
+        assert j.publication_date == "2015-03-02"
+        assert j.authors == [{"surname" : "One", "given-names" : "A", "affiliations" : ["The University"]}]
+        assert len(j.contribs) == 2
+        assert j.emails == ["two@example.com", "body@example.com"]
+        assert j.get_licence_details() == ("open-access", "http://creativecommons.org/licenses/by/4.0/", "<license-p xmlns:xlink=\"http://www.w3.org/1999/xlink\">CC BY</license-p>")
+
+        # accessor results are kept
+        assert j.authors is j.authors
+
+    def test_02_from_stream(self):
+        j = models.JATS.from_stream(StringIO(JATS_XML))
+
+        # the front matter is all there, but the body and back have been thrown away
+        fields = j.extract()
+        assert fields["title"] == "The Title"
+        assert fields["pmcid"] == "PMC12345"
+        assert fields["licence"][0] == "open-access"
+        assert fields["authors"][0]["affiliations"] == ["The University"]
+        assert fields["emails"] == ["two@example.com"]
+        assert len(j.xml.find("body")) == 0
+        assert len(j.xml.find("back")) == 0
+
+        with self.assertRaises(models.JATSException):
+            models.JATS.from_stream(StringIO("<article><front>"))
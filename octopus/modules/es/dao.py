@@ -4,13 +4,54 @@ from octopus.core import app
 import json as jsonlib
 from datetime import datetime
 import dateutil.relativedelta as relativedelta
-import os, threading
+import os, threading, time, uuid, Queue, fcntl
+from contextlib import contextmanager
+from copy import deepcopy
 from octopus.lib import plugin
 from octopus.modules.es.initialise import put_mappings, put_example
 
+##############################################################
+# Shared connections
+
+_connections = {}
+_connections_pid = None
+_connections_lock = threading.Lock()
+
+def connection(host=None, index=None):
+    """
+    Get the shared connection to the index on the host (by default ELASTIC_SEARCH_HOST and ELASTIC_SEARCH_INDEX),
+    so that DAO instances don't each make their own.
+
+    Connections are held per process, so a process forked after they have been made (e.g. a gunicorn
+    worker) starts with none of its parent's, and makes its own.
+    """
+    global _connections, _connections_pid, _connections_lock
+
+    if host is None:
+        host = app.config.get('ELASTIC_SEARCH_HOST')
+    if index is None:
+        index = app.config.get('ELASTIC_SEARCH_INDEX')
+
+    pid = os.getpid()
+    if _connections_pid != pid:
+        # the lock may have been held by another thread at the moment of the fork, so don't trust it
+        _connections_lock = threading.Lock()
+        _connections = {}
+        _connections_pid = pid
+
+    key = (host, index)
+    conn = _connections.get(key)
+    if conn is None:
+        with _connections_lock:
+            conn = _connections.get(key)
+            if conn is None:
+                conn = esprit.raw.Connection(host, index)
+                _connections[key] = conn
+    return conn
+
 class ESInstanceDAO(esprit.dao.DAO):
-    def __init__(self, type=None, raw=None, *args, **kwargs):
-        self._conn = esprit.raw.Connection(app.config.get('ELASTIC_SEARCH_HOST'), app.config.get('ELASTIC_SEARCH_INDEX'))
+    def __init__(self, type=None, raw=None, conn=None, *args, **kwargs):
+        self._conn = conn if conn is not None else connection()
         self._es_version = app.config.get("ELASTIC_SEARCH_VERSION")
         self._type = type if type is not None else "index"
         super(ESInstanceDAO, self).__init__(raw=raw)
@@ -46,7 +87,7 @@ class ESInstanceDAO(esprit.dao.DAO):
 
 class ESDAO(esprit.dao.DomainObject):
     __type__ = 'index'
-    __conn__ = esprit.raw.Connection(app.config.get('ELASTIC_SEARCH_HOST'), app.config.get('ELASTIC_SEARCH_INDEX'))
+    __conn__ = connection()
     __es_version__ = app.config.get("ELASTIC_SEARCH_VERSION")
 
     def __init__(self, *args, **kwargs):
@@ -66,6 +107,146 @@ class ESDAO(esprit.dao.DomainObject):
         self.prep()
         super(ESDAO, self).save(**kwargs)
 
+    @classmethod
+    def bulk_save(cls, objects, chunk_size=None, refresh=False, max_bytes=None, conn=None, type=None):
+        """
+        Save an iterable of objects of this class using the _bulk API, rather than
+        one request per object.  prep() is run on each object, and ids and timestamps
+        are set as they would be by save().
+
+        Returns a list of the per-item failures, each of which is a dict of the form
+        {"id" : <id>, "status" : <http status>, "error" : <es error>}
+        """
+        with cls.bulk_writer(chunk_size=chunk_size, refresh=refresh, max_bytes=max_bytes, conn=conn, type=type) as writer:
+            for obj in objects:
+                writer.add(obj)
+        return writer.failures
+
+    @classmethod
+    def bulk_writer(cls, chunk_size=None, max_bytes=None, flush_interval=None, refresh=False, conn=None, type=None):
+        return BulkWriter(cls, chunk_size=chunk_size, max_bytes=max_bytes, flush_interval=flush_interval,
+                          refresh=refresh, conn=conn, type=type)
+
+    @classmethod
+    def stream(cls, q=None, page_size=None, keepalive=None, limit=None, wrap=True, conn=None, types=None, raise_on_scroll_error=True):
+        """
+        Iterate over every record matching the query using the scroll API.  The full
+        _source of each record is returned, so there is no need to pull() the records
+        individually, and the cost of each page does not grow with the depth of the
+        iteration as it does with from/size paging.
+        """
+        if page_size is None:
+            page_size = app.config.get("ESDAO_STREAM_PAGE_SIZE", 1000)
+        if keepalive is None:
+            keepalive = app.config.get("ESDAO_STREAM_KEEPALIVE", "5m")
+        return cls.scroll(q=q, page_size=page_size, limit=limit, keepalive=keepalive, conn=conn,
+                          raise_on_scroll_error=raise_on_scroll_error, types=types, wrap=wrap)
+
+    @classmethod
+    def export_jsonl(cls, out, q=None, slices=None, page_size=None, keepalive=None, conn=None, types=None):
+        """
+        Write every record matching the query to the file path or file-like object
+        "out", one JSON document per line.
+
+        On versions of ES which support sliced scroll (5.0 and up) the scroll is split
+        into "slices" parts which are read in parallel by one worker thread each.  On
+        older versions a single scroll is used.
+
+        Returns the number of records written.
+        """
+        if slices is None:
+            slices = app.config.get("ESDAO_EXPORT_SLICES", 4)
+        if q is None:
+            q = {"query" : {"match_all" : {}}}
+
+        if slices > 1 and cls._supports_sliced_scroll():
+            queries = []
+            for i in range(slices):
+                sq = deepcopy(q)
+                sq["slice"] = {"id" : i, "max" : slices}
+                queries.append(sq)
+        else:
+            queries = [q]
+
+        close = False
+        if isinstance(out, basestring):
+            out = open(out, "wb")
+            close = True
+
+        try:
+            return cls._export(out, queries, page_size, keepalive, conn, types)
+        finally:
+            if close:
+                out.close()
+
+    @classmethod
+    def _supports_sliced_scroll(cls):
+        esv = cls.__es_version__ if cls.__es_version__ is not None else "0.90.13"
+        try:
+            return int(esv.split(".")[0]) >= 5
+        except ValueError:
+            return False
+
+    @classmethod
+    def _export(cls, out, queries, page_size, keepalive, conn, types):
+        # a single scroll needs no workers, just write as we go
+        if len(queries) == 1:
+            count = 0
+            for rec in cls.stream(q=queries[0], page_size=page_size, keepalive=keepalive, wrap=False, conn=conn, types=types):
+                out.write(jsonlib.dumps(rec) + "\n")
+                count += 1
+            return count
+
+        # otherwise each slice gets a worker which feeds a bounded queue, and this thread
+        # does all the writing, so the output is never interleaved mid-line
+        done = object()
+        records = Queue.Queue(maxsize=app.config.get("ESDAO_EXPORT_QUEUE_SIZE", 10000))
+        stop = threading.Event()
+        errors = []
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    records.put(item, timeout=1)
+                    return True
+                except Queue.Full:
+                    pass
+            return False
+
+        def worker(sq):
+            try:
+                for rec in cls.stream(q=sq, page_size=page_size, keepalive=keepalive, wrap=False, conn=conn, types=types):
+                    if not put(jsonlib.dumps(rec)):
+                        return
+            except Exception as e:
+                errors.append(e)
+            finally:
+                put(done)
+
+        threads = [threading.Thread(target=worker, args=(sq,)) for sq in queries]
+        for t in threads:
+            t.daemon = True
+            t.start()
+
+        count = 0
+        remaining = len(threads)
+        try:
+            while remaining > 0:
+                item = records.get()
+                if item is done:
+                    remaining -= 1
+                    continue
+                out.write(item + "\n")
+                count += 1
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+
+        if len(errors) > 0:
+            raise errors[0]
+        return count
+
     ######################################################
     ## Octopus specific functions
 
@@ -91,6 +272,128 @@ class ESDAO(esprit.dao.DomainObject):
     def prep(self):
         pass
 
+class BulkWriter(object):
+    """
+    Context manager which buffers ESDAO objects and writes them to the index with the
+    _bulk API.  The buffer is flushed when it reaches chunk_size documents, when it
+    reaches max_bytes of request body, when an add() happens more than flush_interval
+    seconds after the last flush, and on leaving the context.
+
+    with MyDAO.bulk_writer(chunk_size=1000) as writer:
+        for obj in objects:
+            writer.add(obj)
+    print writer.failures
+    """
+    def __init__(self, klazz, chunk_size=None, max_bytes=None, flush_interval=None, refresh=False, conn=None, type=None):
+        self.klazz = klazz
+        self.chunk_size = chunk_size if chunk_size is not None else app.config.get("ESDAO_BULK_CHUNK_SIZE", 500)
+        self.max_bytes = max_bytes if max_bytes is not None else app.config.get("ESDAO_BULK_MAX_BYTES", 5242880)
+        self.flush_interval = flush_interval if flush_interval is not None else app.config.get("ESDAO_BULK_FLUSH_INTERVAL", 0)
+        self.refresh = refresh
+        self.conn = conn if conn is not None else klazz.__conn__
+        self.type = type
+
+        self.failures = []
+        self.saved = 0
+        self.requests = 0
+
+        self._lines = []
+        self._ids = []
+        self._bytes = 0
+        self._last_flush = time.time()
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        # only write out what is left if the block completed cleanly
+        if exc_type is None:
+            self.close()
+        return False
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, obj, makeid=True, created=True, updated=True):
+        obj.prep()
+
+        now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
+        if makeid and obj.data.get("id") is None:
+            obj.data["id"] = uuid.uuid4().hex
+        if created and "created_date" not in obj.data:
+            obj.data["created_date"] = now
+        if updated:
+            obj.data["last_updated"] = now
+
+        action = {"index" : {}}
+        if obj.data.get("id") is not None:
+            action["index"]["_id"] = obj.data["id"]
+        line = jsonlib.dumps(action) + "\n" + jsonlib.dumps(obj.data) + "\n"
+
+        with self._lock:
+            # don't let a single large document push an existing buffer over the byte limit
+            if len(self._ids) > 0 and self._bytes + len(line) > self.max_bytes:
+                self.flush()
+
+            self._lines.append(line)
+            self._ids.append(obj.data.get("id"))
+            self._bytes += len(line)
+
+            if len(self._ids) >= self.chunk_size or self._bytes >= self.max_bytes or self._interval_elapsed():
+                self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._last_flush = time.time()
+            if len(self._ids) == 0:
+                return []
+
+            data = "".join(self._lines)
+            ids = self._ids
+            self._lines = []
+            self._ids = []
+            self._bytes = 0
+
+            type = self.type if self.type is not None else self.klazz.dynamic_write_type()
+            resp = esprit.raw.raw_bulk(self.conn, data, type)
+            self.requests += 1
+
+            failures = self._failures(resp, ids)
+            self.failures += failures
+            self.saved += len(ids) - len(failures)
+            return failures
+
+    def close(self):
+        self.flush()
+        if self.refresh:
+            esprit.raw.refresh(self.conn)
+
+    def _interval_elapsed(self):
+        if not self.flush_interval:
+            return False
+        return time.time() - self._last_flush >= self.flush_interval
+
+    def _failures(self, resp, ids):
+        # if the whole request failed, every item in it has failed
+        if resp.status_code >= 400:
+            return [{"id" : id, "status" : resp.status_code, "error" : resp.text} for id in ids]
+
+        j = resp.json()
+        if not j.get("errors", True):
+            return []
+
+        failures = []
+        for i, item in enumerate(j.get("items", [])):
+            # each item is keyed by its action type, which for us is always "index"
+            result = item.values()[0] if len(item) > 0 else {}
+            # older versions of ES do not report a status per item, only an error
+            status = result.get("status")
+            if "error" in result or (status is not None and status >= 300):
+                id = result.get("_id", ids[i] if i < len(ids) else None)
+                failures.append({"id" : id, "status" : status, "error" : result.get("error")})
+        return failures
+
 class RollingTypeESDAO(ESDAO):
     # should the dynamic type be checked for existance, and initialised
     # with a mapping or an example document
@@ -106,9 +409,13 @@ class RollingTypeESDAO(ESDAO):
     __read_preference__ = ["next", "curr", "prev"]
 
     # create a lock for this DAO to use so that the modifications to the files can
-    # be synchronised
+    # be synchronised between threads.  Between processes, the modifications are
+    # synchronised with an exclusive lock on a file in the rolling directory
     _lock = threading.RLock()
 
+    # the in-process cache of the rolling state for each DAO class, keyed by class
+    _rolling_cache = {}
+
     @classmethod
     def _mint_next_type(cls):
         return cls.__type__ + datetime.utcnow().strftime("%Y%m%d%H%M%S")
@@ -117,43 +424,132 @@ class RollingTypeESDAO(ESDAO):
     def _roll_dir(cls):
         return os.path.join(app.config.get("ESDAO_ROLLING_DIR"), cls.__type__)
 
-    # FIXME: these methods are not thread-safe.  We need to migrate to ES's index alias
-    # feature instead
+    @classmethod
+    def _state_path(cls):
+        return os.path.join(cls._roll_dir(), "state.json")
+
+    @classmethod
+    @contextmanager
+    def _rolling_lock(cls):
+        with cls._lock:
+            # the thread lock is re-entrant, but flock on a fresh file handle is not,
+            # so only take the file lock at the outermost level
+            if getattr(cls, "_lock_holder", None) is not None:
+                yield
+                return
+
+            dir = cls._roll_dir()
+            if not os.path.exists(dir):
+                os.makedirs(dir)
+            lf = open(os.path.join(dir, ".lock"), "a")
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            cls._lock_holder = lf
+            try:
+                yield
+            finally:
+                cls._lock_holder = None
+                fcntl.flock(lf, fcntl.LOCK_UN)
+                lf.close()
+
+    @classmethod
+    def _state_signature(cls):
+        # the state file is only ever replaced by rename, so a change of inode or
+        # mtime means another thread or process has changed it
+        try:
+            st = os.stat(cls._state_path())
+            return (st.st_ino, st.st_mtime, st.st_size)
+        except OSError:
+            return None
+
+    @classmethod
+    def _read_state(cls):
+        f = cls._state_path()
+        if os.path.exists(f):
+            with open(f) as o:
+                state = jsonlib.loads(o.read())
+            return {"prev" : state.get("prev"), "curr" : state.get("curr"), "next" : state.get("next")}
+
+        # fall back to the one-file-per-position layout used by earlier versions
+        state = {}
+        dir = cls._roll_dir()
+        for pos in ["prev", "curr", "next"]:
+            lf = os.path.join(dir, pos)
+            state[pos] = None
+            if os.path.exists(lf) and os.path.isfile(lf):
+                with open(lf) as o:
+                    state[pos] = o.read()
+        return state
+
+    @classmethod
+    def _write_state(cls, state):
+        with cls._rolling_lock():
+            dir = cls._roll_dir()
+            f = cls._state_path()
+            tmp = f + "." + uuid.uuid4().hex
+            with open(tmp, "wb") as o:
+                o.write(jsonlib.dumps(state))
+            os.rename(tmp, f)
+
+            # remove any files left over from the old layout, so they can't be read back
+            for pos in ["prev", "curr", "next"]:
+                lf = os.path.join(dir, pos)
+                if os.path.exists(lf) and os.path.isfile(lf):
+                    os.remove(lf)
+
+            cls._set_state_cache(state)
+
+    @classmethod
+    def _set_state_cache(cls, state, signature=None):
+        if signature is None:
+            signature = cls._state_signature()
+        cls._rolling_cache[cls] = {"state" : dict(state), "signature" : signature, "checked" : time.time()}
+
+    @classmethod
+    def _rolling_state(cls, force=False):
+        """
+        Get the rolling state from the in-process cache.  The state file is checked for
+        changes made by other processes at most every ESDAO_ROLLING_CHECK_INTERVAL seconds,
+        and is only re-read if it has actually changed.
+        """
+        cached = cls._rolling_cache.get(cls)
+        now = time.time()
+        if not force and cached is not None:
+            if now - cached["checked"] < app.config.get("ESDAO_ROLLING_CHECK_INTERVAL", 1):
+                return cached["state"]
+
+        sig = cls._state_signature()
+        if not force and cached is not None and sig is not None and sig == cached["signature"]:
+            cached["checked"] = now
+            return cached["state"]
+
+        state = cls._read_state()
+        cls._set_state_cache(state, sig)
+        return state
+
     @classmethod
     def _get_cfg(cls, pos):
-        # return app.config.get("ESDAO_ROLLING_{x}_{y}".format(x=pos.upper(), y=cls.__type__.upper()))
-        return None
+        return cls._rolling_state().get(pos)
 
     @classmethod
     def _set_cfg(cls, pos, val):
-        # app.config["ESDAO_ROLLING_{x}_{y}".format(x=pos.upper(), y=cls.__type__.upper())] = val
-        pass
+        cached = cls._rolling_cache.get(cls)
+        if cached is not None:
+            cached["state"][pos] = val
 
     @classmethod
     def _get_file(cls, pos):
-        dir = cls._roll_dir()
-        f = os.path.join(dir, pos)
-        if os.path.exists(f) and os.path.isfile(f):
-            with open(f) as o:
-                return o.read()
-        return None
+        return cls._rolling_state(force=True).get(pos)
 
     @classmethod
     def _set_file(cls, pos, val):
-        if val is None:
-            cls._drop_file(pos)
-            return
-        dir = cls._roll_dir()
-        f = os.path.join(dir, pos)
-        with open(f, "wb") as o:
-            o.write(val)
+        with cls._rolling_lock():
+            state = cls._rolling_state(force=True)
+            state[pos] = val
+            cls._write_state(state)
 
     @classmethod
     def _drop_file(cls, pos):
-        dir = cls._roll_dir()
-        f = os.path.join(dir, pos)
-        if os.path.exists(f) and os.path.isfile(f):
-            os.remove(f)
+        cls._set_file(pos, None)
 
     @classmethod
     def _init_type(cls, tname):
@@ -210,13 +606,11 @@ class RollingTypeESDAO(ESDAO):
 
     @classmethod
     def rolling_refresh(cls):
-        cls._set_cfg("prev", cls._get_file("prev"))
-        cls._set_cfg("curr", cls._get_file("curr"))
-        cls._set_cfg("next", cls._get_file("next"))
+        cls._rolling_state(force=True)
 
     @classmethod
     def drop_next(cls, conn=None):
-        with cls._lock:
+        with cls._rolling_lock():
             if conn is None:
                 conn = cls.__conn__
 
@@ -245,8 +639,7 @@ class RollingTypeESDAO(ESDAO):
         rollover = tname is not None
         esv = app.config.get("ELASTIC_SEARCH_VERSION")
 
-        # FIXME: put the lock in here
-        with cls._lock:
+        with cls._rolling_lock():
             # now determine the route we're going to go down
             if rollover:
                 # check whether the type to write already exists
@@ -318,28 +711,21 @@ class RollingTypeESDAO(ESDAO):
     @classmethod
     def publish(cls, conn=None):
         # synchronise access
-        with cls._lock:
+        with cls._rolling_lock():
             if conn is None:
                 conn = cls.__conn__
 
-            prev = cls._get_file("prev")
-            curr = cls._get_file("curr")
-            next = cls._get_file("next")
+            state = cls._rolling_state(force=True)
+            prev = state.get("prev")
+            curr = state.get("curr")
+            next = state.get("next")
 
             if next is None:
                 return
 
-            # write current to previous
-            cls._set_file("prev", curr)
-
-            # write next to current
-            cls._set_file("curr", next)
-
-            # get rid of the next file
-            cls._drop_file("next")
-
-            # refresh the configuration
-            cls.rolling_refresh()
+            # move current to previous and next to current, and get rid of next,
+            # in a single write so no reader ever sees a partial publish
+            cls._write_state({"prev" : curr, "curr" : next, "next" : None})
 
             # drop the previous index, if it existed
             if prev is not None:
@@ -348,29 +734,22 @@ class RollingTypeESDAO(ESDAO):
     @classmethod
     def rollback(cls, conn=None):
          # synchronise access
-        with cls._lock:
+        with cls._rolling_lock():
             if conn is None:
                 conn = cls.__conn__
 
-            prev = cls._get_file("prev")
-            curr = cls._get_file("curr")
-            next = cls._get_file("next")
+            state = cls._rolling_state(force=True)
+            prev = state.get("prev")
+            curr = state.get("curr")
+            next = state.get("next")
 
             # only continue if prev exists
             if prev is None:
                 return
 
-            # write current to next
-            cls._set_file("next", curr)
-
-            # write previous to current
-            cls._set_file("curr", prev)
-
-            # get rid of the previous file
-            cls._drop_file("prev")
-
-            # refresh the configuration
-            cls.rolling_refresh()
+            # move current to next and previous to current, and get rid of previous,
+            # in a single write
+            cls._write_state({"prev" : None, "curr" : prev, "next" : curr})
 
             # delete the old next index type
             if next is not None:
@@ -378,16 +757,10 @@ class RollingTypeESDAO(ESDAO):
 
     @classmethod
     def dynamic_read_types(cls):
+        state = cls._rolling_state()
         for pref in cls.__read_preference__:
-            # first look to see if it is set in the config
-            t = cls._get_cfg(pref)
-            if t is not None:
-                return t
-
-            # if not next check to see if there's a file
-            t = cls._get_file(pref)
+            t = state.get(pref)
             if t is not None:
-                cls._set_cfg(pref, t)
                 return t
 
         # if we don't get anything, return the base type
@@ -403,11 +776,10 @@ class RollingTypeESDAO(ESDAO):
 
         # since there could be several threads trying to do the same thing, lock
         # this thread until the file/index has been sorted out
-        with cls._lock:
-            # if not read it from the directory
+        with cls._rolling_lock():
+            # if not, another thread or process may have just made it
             next = cls._get_file("next")
             if next is not None:
-                cls._set_cfg("next", next)
                 return next
 
             # if it wasn't in the directory we need to make it
@@ -420,11 +792,7 @@ class RollingTypeESDAO(ESDAO):
                         cls.self_init(type_name=tname, write_to="next")
 
             # now write the file
-            dir = cls._roll_dir()
-            if not os.path.exists(dir):
-                os.mkdir(dir)
             cls._set_file("next", tname)
-            cls._set_cfg("next", tname)
 
             return tname
 
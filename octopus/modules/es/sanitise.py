@@ -45,7 +45,7 @@ def sanitise(raw_query, struct, coerce_map=None, source_includes=None, aggs_type
     if coerce_map is None:
         coerce_map = dataobj.DataObj.DEFAULT_COERCE
     try:
-        clean_query = dataobj.construct(raw_query, struct, coerce_map, silent_prune=True)
+        clean_query = dataobj.compiled_struct(struct, coerce_map).construct(raw_query, silent_prune=True)
     except dataobj.DataStructureException as e:
         raise QuerySanitisationException(e)
 
@@ -115,7 +115,7 @@ ESDAO_DEFAULT_TIME_BOX_LOOKBACK = 0
 # You can also set the look back on a per-type basis with
 # ESDAO_TIME_BOX_LOOKBACK_<UPPER CASE TYPE NAME> = <number of boxes>
 
-# path to directory where the "next", "prev" and "curr" files for routing
+# path to directory where the "next", "prev" and "curr" state for routing
 # requests to the correct type are placed
 from octopus.lib import paths
 ESDAO_ROLLING_DIR = paths.rel2abs(__file__, "..", "..", "..", "..", "indexdir")
@@ -125,6 +125,30 @@ ESDAO_ROLLING_DIR = paths.rel2abs(__file__, "..", "..", "..", "..", "indexdir")
 # {"mytype" : "service.dao.MyDAO"}
 ESDAO_ROLLING_PLUGINS = {}
 
+# the prev/curr/next state for each rolling type is cached in-process.  This is how
+# often (in seconds) the state file is checked for changes made by other processes
+ESDAO_ROLLING_CHECK_INTERVAL = 1
+
+# bulk writes via ESDAO.bulk_save/ESDAO.bulk_writer are sent to the _bulk API in chunks
+# which are flushed when they reach this many documents ...
+ESDAO_BULK_CHUNK_SIZE = 500
+
+# ... or this many bytes of request body ...
+ESDAO_BULK_MAX_BYTES = 5242880
+
+# ... or when this many seconds have passed since the last flush (0 to disable)
+ESDAO_BULK_FLUSH_INTERVAL = 0
+
+# the page size and scroll keep-alive used by ESDAO.stream.  The keep-alive only needs to
+# cover the time taken to consume one page
+ESDAO_STREAM_PAGE_SIZE = 1000
+ESDAO_STREAM_KEEPALIVE = "5m"
+
+# the number of parallel slices ESDAO.export_jsonl will split its scroll into (ES 5.0
+# and up only), and the number of records which may be buffered waiting to be written
+ESDAO_EXPORT_SLICES = 4
+ESDAO_EXPORT_QUEUE_SIZE = 10000
+
 ##############################################################
 # Query Endpoint Configuration
 ##############################################################
@@ -0,0 +1,119 @@
+"""
+A stand-in for the parts of esprit which octopus.modules.es uses, so that the DAO layer can be unit tested without
+esprit or an index.  If esprit is installed it is used instead; either way, tests patch the esprit.raw calls they
+expect to be made, and the stubbed ones raise if they are called unexpectedly.
+
+The stub is installed for the duration of each EspritStubTestCase class, which should import the modules under test
+in its setUpClass, and it is removed afterwards, so that tests collected later never see the stub (or modules which
+were imported against it):
+
+    class TestThing(EspritStubTestCase):
+        @classmethod
+        def setUpClass(cls):
+            super(TestThing, cls).setUpClass()
+            from octopus.modules.es import dao
+            cls.dao = dao
+"""
+from unittest import TestCase
+import sys, types
+
+class EspritStubTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(EspritStubTestCase, cls).setUpClass()
+        cls._esprit_stub = install()
+
+    @classmethod
+    def tearDownClass(cls):
+        super(EspritStubTestCase, cls).tearDownClass()
+        uninstall(cls._esprit_stub)
+
+def install():
+    """
+    Make "import esprit" work, with the stub if esprit is not installed
+
+    :return: the state to pass to uninstall(), or None if the real esprit is being used
+    """
+    try:
+        import esprit
+        return None
+    except ImportError:
+        pass
+    saved = dict(sys.modules)
+
+    esprit = types.ModuleType("esprit")
+    raw = types.ModuleType("esprit.raw")
+    dao = types.ModuleType("esprit.dao")
+    mappings = types.ModuleType("esprit.mappings")
+    models = types.ModuleType("esprit.models")
+
+    class Connection(object):
+        def __init__(self, host, index, port=9200, verify_ssl=True):
+            self.host = host
+            self.index = index
+            self.port = port
+
+    def _not_stubbed(name):
+        def fn(*args, **kwargs):
+            raise NotImplementedError("esprit.raw." + name + " is not available in the esprit stub; patch it in the test")
+        return fn
+
+    raw.Connection = Connection
+    for name in ["raw_bulk", "refresh", "type_exists", "delete", "put_mapping", "index_exists", "create_index"]:
+        setattr(raw, name, _not_stubbed(name))
+
+    class DAO(object):
+        def __init__(self, raw=None):
+            if raw is not None:
+                self.data = raw
+
+    class DomainObject(DAO):
+        __type__ = None
+        __conn__ = None
+
+        def __init__(self, raw=None):
+            self.data = raw if raw is not None else {}
+
+        @classmethod
+        def dynamic_read_types(cls):
+            return [cls.__type__]
+
+        @classmethod
+        def dynamic_write_type(cls):
+            return cls.__type__
+
+        @classmethod
+        def scroll(cls, *args, **kwargs):
+            raise NotImplementedError("scroll is not available in the esprit stub; patch it in the test")
+
+    dao.DAO = DAO
+    dao.DomainObject = DomainObject
+
+    class Query(object):
+        def __init__(self, raw=None):
+            self.q = raw if raw is not None else {}
+
+    models.Query = Query
+
+    esprit.raw = raw
+    esprit.dao = dao
+    esprit.mappings = mappings
+    esprit.models = models
+    for module in [esprit, raw, dao, mappings, models]:
+        sys.modules[module.__name__] = module
+    return saved
+
+def uninstall(saved):
+    """
+    Remove the stub, and every module imported since it was installed, so that they are imported afresh (against
+    the real esprit, if it is there) by anything which needs them later
+    """
+    if saved is None:
+        return
+    for name in sys.modules.keys():
+        if name in saved:
+            continue
+        module = sys.modules.pop(name)
+        parent, _, child = name.rpartition(".")
+        if module is not None and parent in sys.modules and getattr(sys.modules[parent], child, None) is module:
+            delattr(sys.modules[parent], child)
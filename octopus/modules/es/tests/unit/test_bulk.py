@@ -0,0 +1,122 @@
+import json, time, requests
+
+from octopus.modules.es.tests.esprit_stub import EspritStubTestCase
+
+def response(status, body):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = body
+    resp.encoding = "utf-8"
+    return resp
+
+class TestBulk(EspritStubTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TestBulk, cls).setUpClass()
+        from octopus.modules.es import dao
+
+        class Thing(dao.ESDAO):
+            __type__ = "thing"
+
+            def prep(self):
+                self.data["prepped"] = True
+
+        cls.dao = dao
+        cls.Thing = Thing
+
+    def setUp(self):
+        super(TestBulk, self).setUp()
+        self.old_raw_bulk = self.dao.esprit.raw.raw_bulk
+        self.old_refresh = self.dao.esprit.raw.refresh
+        self.requests = []
+        self.refreshed = []
+        self.responses = []
+
+        def raw_bulk(conn, data, type):
+            self.requests.append((type, data))
+            if len(self.responses) > 0:
+                return self.responses.pop(0)
+            return response(200, json.dumps({"errors" : False, "items" : []}))
+        self.dao.esprit.raw.raw_bulk = raw_bulk
+        self.dao.esprit.raw.refresh = lambda conn: self.refreshed.append(conn)
+
+    def tearDown(self):
+        super(TestBulk, self).tearDown()
+        self.dao.esprit.raw.raw_bulk = self.old_raw_bulk
+        self.dao.esprit.raw.refresh = self.old_refresh
+
+    def _docs(self, data):
+        lines = data.strip().split("\n")
+        return [(json.loads(lines[i]), json.loads(lines[i + 1])) for i in range(0, len(lines), 2)]
+
+    def test_01_flush_by_count(self):
+        with self.Thing.bulk_writer(chunk_size=2, refresh=True) as writer:
+            for i in range(5):
+                writer.add(self.Thing({"id" : str(i)}))
+            assert len(self.requests) == 2
+            assert len(writer) == 1
+
+        # the rest is written on leaving the context, and the index refreshed
+        assert len(self.requests) == 3
+        assert writer.saved == 5
+        assert writer.failures == []
+        assert len(self.refreshed) == 1
+
+        type, data = self.requests[0]
+        assert type == "thing"
+        docs = self._docs(data)
+        assert [action for action, doc in docs] == [{"index" : {"_id" : "0"}}, {"index" : {"_id" : "1"}}]
+        assert docs[0][1]["prepped"] is True
+        assert "created_date" in docs[0][1] and "last_updated" in docs[0][1]
+
+    def test_02_flush_by_bytes(self):
+        big = "x" * 100     # each document is about 230 bytes in the request
+        with self.Thing.bulk_writer(chunk_size=100, max_bytes=600) as writer:
+            writer.add(self.Thing({"id" : "1", "text" : big}))
+            writer.add(self.Thing({"id" : "2", "text" : big}))
+            assert len(self.requests) == 0
+
+            # this one would take the buffer over the limit, so what is already there goes first
+            writer.add(self.Thing({"id" : "3", "text" : big}))
+            assert len(self.requests) == 1
+            assert [doc["id"] for action, doc in self._docs(self.requests[0][1])] == ["1", "2"]
+
+            # and a single document over the limit goes on its own
+            writer.add(self.Thing({"id" : "4", "text" : big * 5}))
+            assert len(self.requests) == 3
+            assert [doc["id"] for action, doc in self._docs(self.requests[2][1])] == ["4"]
+        assert writer.saved == 4
+
+    def test_03_flush_by_interval(self):
+        with self.Thing.bulk_writer(chunk_size=100, flush_interval=0.05) as writer:
+            writer.add(self.Thing({"id" : "1"}))
+            assert len(self.requests) == 0
+            time.sleep(0.06)
+            writer.add(self.Thing({"id" : "2"}))
+            assert len(self.requests) == 1
+            assert len(writer) == 0
+
+    def test_04_failures(self):
+        self.responses.append(response(200, json.dumps({"errors" : True, "items" : [
+            {"index" : {"_id" : "1", "status" : 201}},
+            {"index" : {"_id" : "2", "status" : 400, "error" : "MapperParsingException"}},
+            {"index" : {"error" : "no status in older versions"}}
+        ]})))
+        self.responses.append(response(500, "broken"))
+
+        failures = self.Thing.bulk_save([self.Thing({"id" : str(i)}) for i in range(1, 6)], chunk_size=3)
+        assert failures == [
+            {"id" : "2", "status" : 400, "error" : "MapperParsingException"},
+            {"id" : "3", "status" : None, "error" : "no status in older versions"},
+            {"id" : "4", "status" : 500, "error" : "broken"},
+            {"id" : "5", "status" : 500, "error" : "broken"}
+        ]
+
+    def test_05_exit_with_error(self):
+        # nothing more is written if the block fails
+        with self.assertRaises(ValueError):
+            with self.Thing.bulk_writer(chunk_size=100) as writer:
+                writer.add(self.Thing({"id" : "1"}))
+                raise ValueError()
+        assert self.requests == []
+        assert len(writer) == 1
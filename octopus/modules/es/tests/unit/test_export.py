@@ -0,0 +1,101 @@
+from StringIO import StringIO
+import json, threading
+
+from octopus.core import app
+from octopus.modules.es.tests.esprit_stub import EspritStubTestCase
+
+class FailingOut(object):
+    def __init__(self, after):
+        self.after = after
+        self.lines = 0
+
+    def write(self, s):
+        self.lines += 1
+        if self.lines > self.after:
+            raise IOError("disk full")
+
+class TestExport(EspritStubTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TestExport, cls).setUpClass()
+        from octopus.modules.es import dao
+
+        class Thing(dao.ESDAO):
+            __type__ = "thing"
+            __es_version__ = "5.6.0"
+
+            # the slice whose scroll should fail part way through, if any
+            fail_slice = None
+            calls = []
+
+            @classmethod
+            def scroll(cls, q=None, page_size=None, limit=None, keepalive=None, conn=None, raise_on_scroll_error=True, types=None, wrap=True):
+                cls.calls.append({"q" : q, "page_size" : page_size, "keepalive" : keepalive, "types" : types, "wrap" : wrap})
+                slice = q.get("slice", {"id" : 0, "max" : 1})
+                for i in range(slice["id"], 100, slice["max"]):
+                    if cls.fail_slice == slice["id"] and i >= 50:
+                        raise ValueError("scroll failed")
+                    yield {"id" : i, "slice" : slice["id"]}
+
+        cls.Thing = Thing
+
+    def setUp(self):
+        super(TestExport, self).setUp()
+        self.Thing.calls = []
+        self.Thing.fail_slice = None
+        self.Thing.__es_version__ = "5.6.0"
+        self.old_queue_size = app.config.get("ESDAO_EXPORT_QUEUE_SIZE")
+
+    def tearDown(self):
+        super(TestExport, self).tearDown()
+        app.config["ESDAO_EXPORT_QUEUE_SIZE"] = self.old_queue_size
+
+    def _lines(self, out):
+        return [json.loads(l) for l in out.getvalue().splitlines()]
+
+    def test_01_stream(self):
+        recs = list(self.Thing.stream(q={"query" : {"match_all" : {}}}, types=["thing"]))
+        assert [r["id"] for r in recs] == range(100)
+        assert self.Thing.calls[0]["page_size"] == app.config.get("ESDAO_STREAM_PAGE_SIZE", 1000)
+        assert self.Thing.calls[0]["keepalive"] == app.config.get("ESDAO_STREAM_KEEPALIVE", "5m")
+        assert self.Thing.calls[0]["types"] == ["thing"]
+        assert self.Thing.calls[0]["wrap"] is True
+
+    def test_02_single_scroll(self):
+        # versions of ES without sliced scroll are read in one, in order
+        self.Thing.__es_version__ = "1.7.5"
+        out = StringIO()
+        assert self.Thing.export_jsonl(out, slices=4) == 100
+        assert len(self.Thing.calls) == 1
+        assert "slice" not in self.Thing.calls[0]["q"]
+        assert self.Thing.calls[0]["wrap"] is False
+        assert [r["id"] for r in self._lines(out)] == range(100)
+
+    def test_03_sliced(self):
+        out = StringIO()
+        assert self.Thing.export_jsonl(out, q={"query" : {"term" : {"a" : "b"}}}, slices=4) == 100
+        assert sorted(c["q"]["slice"]["id"] for c in self.Thing.calls) == [0, 1, 2, 3]
+        assert all(c["q"]["query"] == {"term" : {"a" : "b"}} for c in self.Thing.calls)
+
+        # every record is written exactly once, on a line of its own, and each slice is in its own order
+        lines = self._lines(out)
+        assert sorted(r["id"] for r in lines) == range(100)
+        for s in range(4):
+            ids = [r["id"] for r in lines if r["slice"] == s]
+            assert ids == range(s, 100, 4)
+
+    def test_04_slice_error(self):
+        app.config["ESDAO_EXPORT_QUEUE_SIZE"] = 5
+        self.Thing.fail_slice = 2
+        threads = threading.active_count()
+        with self.assertRaises(ValueError):
+            self.Thing.export_jsonl(StringIO(), slices=4)
+        assert threading.active_count() == threads
+
+    def test_05_write_error(self):
+        # if the output fails, the workers blocked on the full queue are stopped
+        app.config["ESDAO_EXPORT_QUEUE_SIZE"] = 5
+        threads = threading.active_count()
+        with self.assertRaises(IOError):
+            self.Thing.export_jsonl(FailingOut(10), slices=4)
+        assert threading.active_count() == threads
@@ -0,0 +1,102 @@
+import os, json, shutil, tempfile, threading
+
+from octopus.core import app
+from octopus.modules.es.tests.esprit_stub import EspritStubTestCase
+
+class TestRolling(EspritStubTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TestRolling, cls).setUpClass()
+        from octopus.modules.es import dao
+
+        class Rolling(dao.RollingTypeESDAO):
+            __type__ = "rolling"
+
+        cls.dao = dao
+        cls.Rolling = Rolling
+
+    def setUp(self):
+        super(TestRolling, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.old_dir = app.config.get("ESDAO_ROLLING_DIR")
+        self.old_interval = app.config.get("ESDAO_ROLLING_CHECK_INTERVAL")
+        app.config["ESDAO_ROLLING_DIR"] = self.dir
+        app.config["ESDAO_ROLLING_CHECK_INTERVAL"] = 0
+        self.dao.RollingTypeESDAO._rolling_cache.pop(self.Rolling, None)
+        self.roll_dir = os.path.join(self.dir, "rolling")
+
+    def tearDown(self):
+        super(TestRolling, self).tearDown()
+        app.config["ESDAO_ROLLING_DIR"] = self.old_dir
+        app.config["ESDAO_ROLLING_CHECK_INTERVAL"] = self.old_interval
+        self.dao.RollingTypeESDAO._rolling_cache.pop(self.Rolling, None)
+        shutil.rmtree(self.dir)
+
+    def test_01_migrate(self):
+        # state written one file per position by earlier versions is read
+        os.makedirs(self.roll_dir)
+        for pos, val in [("prev", "rolling1"), ("curr", "rolling2")]:
+            with open(os.path.join(self.roll_dir, pos), "w") as f:
+                f.write(val)
+        assert self.Rolling._get_cfg("curr") == "rolling2"
+        assert self.Rolling._read_state() == {"prev" : "rolling1", "curr" : "rolling2", "next" : None}
+
+        # and the first write moves it to the single state file, removing the old ones
+        self.Rolling._set_file("next", "rolling3")
+        assert sorted(os.listdir(self.roll_dir)) == [".lock", "state.json"]
+        with open(self.Rolling._state_path()) as f:
+            assert json.loads(f.read()) == {"prev" : "rolling1", "curr" : "rolling2", "next" : "rolling3"}
+
+    def test_02_atomic_replace(self):
+        self.Rolling._set_file("curr", "rolling1")
+        sig = self.Rolling._state_signature()
+        assert sig is not None
+        assert self.Rolling._get_cfg("curr") == "rolling1"
+
+        # the state file is replaced, not rewritten, and no temporary files are left behind
+        self.Rolling._set_file("next", "rolling2")
+        assert self.Rolling._state_signature() != sig
+        assert sorted(os.listdir(self.roll_dir)) == [".lock", "state.json"]
+
+        # a change by another process is picked up by its signature
+        other = {"prev" : None, "curr" : "rolling9", "next" : None}
+        tmp = self.Rolling._state_path() + ".other"
+        with open(tmp, "w") as f:
+            f.write(json.dumps(other))
+        os.rename(tmp, self.Rolling._state_path())
+        assert self.Rolling._get_cfg("curr") == "rolling9"
+
+        # but the file is not re-read while its signature is unchanged
+        def fail(cls):
+            raise AssertionError("state read again")
+        self.Rolling._read_state = classmethod(fail)
+        try:
+            assert self.Rolling._get_cfg("curr") == "rolling9"
+        finally:
+            del self.Rolling._read_state
+
+    def test_03_nested_lock(self):
+        # the lock can be taken again by the thread which holds it, as _set_file does within _write_state
+        with self.Rolling._rolling_lock():
+            lock_file = self.Rolling._lock_holder
+            with self.Rolling._rolling_lock():
+                assert self.Rolling._lock_holder is lock_file
+                self.Rolling._set_file("curr", "rolling1")
+            assert self.Rolling._lock_holder is lock_file
+        assert self.Rolling._lock_holder is None
+        assert self.Rolling._get_file("curr") == "rolling1"
+
+        # and other threads wait for it
+        entered = []
+        def other():
+            with self.Rolling._rolling_lock():
+                entered.append(self.Rolling._get_file("curr"))
+
+        with self.Rolling._rolling_lock():
+            t = threading.Thread(target=other)
+            t.start()
+            t.join(0.1)
+            assert entered == []
+            self.Rolling._set_file("curr", "rolling2")
+        t.join()
+        assert entered == ["rolling2"]
@@ -1 +1,82 @@
+from octopus.lib import http
 
+def normalise_all(identifiers, normalise):
+    """
+    Normalise and de-duplicate an iterable of identifiers
+
+    :param identifiers: iterable of identifiers
+    :param normalise: normalisation function, which raises a ValueError if the identifier is invalid
+    :return: (list of distinct normalised identifiers, in the order first seen, list of (identifier, exception) for the invalid ones)
+    """
+    valid = []
+    invalid = []
+    seen = set()
+    for ident in identifiers:
+        try:
+            n = normalise(ident)
+        except (ValueError, AttributeError) as e:
+            invalid.append((ident, e))
+            continue
+        if n not in seen:
+            seen.add(n)
+            valid.append(n)
+    return valid, invalid
+
+def batch_lookup(identifiers, normalise, request, parse, batch_size=1, concurrency=None, min_interval=None):
+    """
+    Look up many identifiers against an external service, batch_size identifiers per request, with the
+    requests made concurrently by octopus.lib.http.fetch_many
+
+    :param identifiers: iterable of identifiers, which will be normalised and de-duplicated
+    :param normalise: normalisation function for the identifiers
+    :param request: function which takes a list of identifiers and returns a url or request dict for fetch_many
+    :param parse: function which takes the list of identifiers and the response to its request, and returns a
+        dict of identifier to result for those identifiers whose result is known from the response.  It may raise
+        an exception, which will be the result for all of the identifiers in the batch.  Any identifier missing from
+        the dict is looked up again on its own.
+    :param batch_size: maximum number of identifiers in a single request
+    :param concurrency: maximum number of requests in flight at once
+    :param min_interval: minimum number of seconds between starting requests
+    :return: generator of (identifier, result or exception), in the order the results arrive
+    """
+    valid, invalid = normalise_all(identifiers, normalise)
+    for ident, e in invalid:
+        yield ident, e
+
+    batches = [valid[i:i + batch_size] for i in range(0, len(valid), batch_size)]
+    while len(batches) > 0:
+        retry = []
+
+        # a batch whose request can't be made, or fails outright, has the exception as the result for each identifier
+        reqs = []
+        requested = []
+        for batch in batches:
+            try:
+                reqs.append(request(batch))
+                requested.append(batch)
+            except Exception as e:
+                for ident in batch:
+                    yield ident, e
+
+        for i, resp in http.fetch_many(reqs, concurrency=concurrency, min_interval=min_interval, ordered=False, raise_errors=False):
+            batch = requested[i]
+            if isinstance(resp, Exception):
+                for ident in batch:
+                    yield ident, resp
+                continue
+
+            try:
+                results = parse(batch, resp)
+            except Exception as e:
+                for ident in batch:
+                    yield ident, e
+                continue
+
+            for ident in batch:
+                if ident in results:
+                    yield ident, results[ident]
+                elif len(batch) > 1:
+                    retry.append([ident])
+                else:
+                    yield ident, None
+        batches = retry
@@ -0,0 +1,20 @@
+import re
+
+def normalise(issn):
+
+    issn = issn.strip().upper()
+    rx = r"^(?P<first>[\d]{4})-?(?P<second>[\d]{3}[\dX])$"
+
+    if issn.startswith("ISSN"):
+        issn = issn.replace("ISSN", "", 1)
+
+    if issn.startswith(":"):
+        issn = issn.replace(":", "", 1)
+
+    issn = issn.strip()
+
+    result = re.match(rx, issn)
+    if result is None:
+        raise ValueError(issn + " does not seem to be a valid ISSN")
+
+    return result.group("first") + "-" + result.group("second")
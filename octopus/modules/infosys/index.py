@@ -4,11 +4,37 @@ in the indexing field.
 
 All functions will receive the raw python object as the first argument, and then the
 arguments and keyword arguments as specified by the caller
+
+Functions decorated with shares_tree can also be given an objectpath Tree of the document instead, which
+is how the IndexPipeline runs them, so that all the rules for a document share a single Tree.
 """
 
 from objectpath import Tree
-import types
-from octopus.lib import strings
+import types, threading, json
+from octopus.core import app
+from octopus.lib import strings, plugin
+
+class IndexException(Exception):
+    pass
+
+def shares_tree(exprs=None):
+    """
+    Decorator for index functions which are written against an objectpath Tree of the document, rather than
+    the raw document.  The decorated function still takes the raw document, as the undecorated functions do,
+    and the pipeline calls the function underneath (fn.on_tree) with a Tree it shares between the rules.
+
+    :param exprs: names of the keyword arguments which are objectpath expressions.  By default, all the
+        positional arguments are expressions
+    """
+    def decorator(fn):
+        def wrapper(*args, **kwargs):
+            return fn(Tree(args[0]), *args[1:], **kwargs)
+        wrapper.__name__ = fn.__name__
+        wrapper.__doc__ = fn.__doc__
+        wrapper.on_tree = fn
+        wrapper.exprs = exprs
+        return wrapper
+    return decorator
 
 def _execute(tree, expr):
     vals = None
@@ -22,9 +48,17 @@ def _execute(tree, expr):
             vals = [gen]
     return vals
 
+def _hashable(val):
+    # values from the document may be lists or objects, which can't go into a set as they are
+    try:
+        hash(val)
+        return val
+    except TypeError:
+        return json.dumps(val, sort_keys=True)
+
+@shares_tree()
 def add(*args, **kwargs):
-    data = args[0]
-    doc = Tree(data)
+    doc = args[0]
 
     summable = []
     for expr in args[1:]:
@@ -34,9 +68,9 @@ def add(*args, **kwargs):
 
     return sum(summable)
 
+@shares_tree()
 def opath(*args, **kwargs):
-    data = args[0]
-    doc = Tree(data)
+    doc = args[0]
 
     outputs = []
     for expr in args[1:]:
@@ -46,9 +80,9 @@ def opath(*args, **kwargs):
 
     return outputs
 
+@shares_tree()
 def ascii_unpunc(*args, **kwargs):
-    data = args[0]
-    doc = Tree(data)
+    doc = args[0]
 
     todo = []
     for expr in args[1:]:
@@ -58,9 +92,9 @@ def ascii_unpunc(*args, **kwargs):
 
     return [strings.normalise(s, ascii=True, unpunc=True, lower=True, spacing=True, strip=True, space_replace=False) for s in todo]
 
+@shares_tree(exprs=["list_field"])
 def count(*args, **kwargs):
-    data = args[0]
-    doc = Tree(data)
+    doc = args[0]
 
     list_field = kwargs.get("list_field")
     vals = _execute(doc, list_field)
@@ -69,9 +103,9 @@ def count(*args, **kwargs):
         return len(vals)
     return 0
 
+@shares_tree(exprs=["list_field", "unique_field"])
 def unique_count(*args, **kwargs):
-    data = args[0]
-    doc = Tree(data)
+    doc = args[0]
 
     list_field = kwargs.get("list_field")
     unique_field = kwargs.get("unique_field")
@@ -81,19 +115,110 @@ def unique_count(*args, **kwargs):
         return 0
 
     count = 0
-    found = []
+    found = set()
     for v in vals:
         subdoc = Tree(v)
         uvals = _execute(subdoc, unique_field)
         if uvals is None:
             continue
-        unique = True
-        for u in uvals:
-            if u in found:
-                unique = False
-                break
-        if unique:
+        uvals = [_hashable(u) for u in uvals]
+        if found.isdisjoint(uvals):
             count += 1
-        found += uvals
-
-    return count
\ No newline at end of file
+        found.update(uvals)
+
+    return count
+
+class IndexPipeline(object):
+    """
+    A model's index rules, compiled once: the functions are loaded, and the objectpath expressions they use
+    are parsed, up front.  Running the pipeline over a document then applies all the rules with a single
+    Tree of that document.
+    """
+    def __init__(self, index_rules, functions_module=None):
+        self.rules = index_rules
+        if functions_module is None:
+            functions_module = app.config.get("INDEX_FUNCTIONS_MODULE")
+
+        self._steps = []
+        for r in index_rules:
+            fd = r.get("function", {})
+            func_path = functions_module + "." + fd.get("name")
+            fn = plugin.load_function(func_path)
+            if fn is None:
+                raise IndexException("Unable to load index function {x}".format(x=func_path))
+            args = fd.get("args", [])
+            kwargs = fd.get("kwargs", {})
+
+            on_tree = getattr(fn, "on_tree", None)
+            if on_tree is not None:
+                self._compile(fn, args, kwargs)
+                self._steps.append((r.get("index_field"), on_tree, True, args, kwargs))
+            else:
+                self._steps.append((r.get("index_field"), fn, False, args, kwargs))
+
+    def _compile(self, fn, args, kwargs):
+        # objectpath keeps the expressions it has parsed, so parsing them here means they are parsed once,
+        # and any that are broken are found now rather than when a document is saved
+        exprs = getattr(fn, "exprs", None)
+        if exprs is None:
+            exprs = [a for a in args if isinstance(a, basestring)]
+        else:
+            exprs = [kwargs.get(k) for k in exprs if isinstance(kwargs.get(k), basestring)]
+
+        tree = Tree({})
+        compile = getattr(tree, "compile", None)
+        if compile is None:
+            return
+        for expr in exprs:
+            try:
+                compile(expr)
+            except Exception as e:
+                raise IndexException("Unable to parse objectpath expression {x}: {y}".format(x=expr, y=e))
+
+    def run(self, data):
+        """
+        Apply the index rules to the document
+
+        :return: list of (index_field, value) tuples, for the rules which produced a value
+        """
+        tree = None
+        out = []
+        for field, fn, on_tree, args, kwargs in self._steps:
+            if on_tree:
+                if tree is None:
+                    tree = Tree(data)
+                idx = fn(tree, *args, **kwargs)
+            else:
+                idx = fn(data, *args, **kwargs)
+            if idx is not None:
+                out.append((field, idx))
+        return out
+
+    def run_many(self, datas):
+        """
+        Apply the index rules to each of the documents
+
+        :return: list of the results of run() for each document, in order
+        """
+        return [self.run(data) for data in datas]
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+def pipeline_for(type, index_rules):
+    """
+    Get the compiled pipeline for a model type's index rules, compiling them the first time they are
+    seen (or if they have changed)
+    """
+    if type is None:
+        return IndexPipeline(index_rules)
+
+    key = (type, app.config.get("INDEX_FUNCTIONS_MODULE"))
+    p = _pipelines.get(key)
+    if p is not None and p.rules == index_rules:
+        return p
+
+    p = IndexPipeline(index_rules)
+    with _pipelines_lock:
+        _pipelines[key] = p
+    return p
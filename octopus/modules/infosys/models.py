@@ -3,6 +3,7 @@ from octopus.modules.es import dao
 from copy import deepcopy
 from octopus.core import app
 from octopus.modules.crud.models import CRUDObject
+from octopus.modules.infosys import index
 
 from objectpath import Tree
 import types
@@ -44,7 +45,8 @@ class InfoSysModel(dataobj.DataObj, dao.ESInstanceDAO):
         self._add_struct(full_struct)
 
         # now determine if there is a raw record to pass up
-        nkwargs = deepcopy(kwargs)
+        # (a shallow copy, so that shared objects such as the connection stay shared)
+        nkwargs = dict(kwargs)
         if full is not None:
             raw = deepcopy(full)
             if "index" in raw:
@@ -86,7 +88,25 @@ class InfoSysModel(dataobj.DataObj, dao.ESInstanceDAO):
         return {"fields" : fields}
 
     def _make_instance(self, obj):
-        return self.__class__(type=type, full_struct=self._info_sys_properties.get("full_struct"), full=obj, *self._info_sys_properties.get("args", []), **self._info_sys_properties.get("kwargs"))
+        """
+        Wrap a record from the index as a frozen (read-only until modified) view, which shares this
+        object's struct, coercions and connection rather than making its own
+        """
+        raw = dict(obj)
+        if "index" in raw:
+            del raw["index"]
+
+        kwargs = dict(self._info_sys_properties.get("kwargs"))
+        kwargs["coerce_map"] = self._coerce_map
+        kwargs["conn"] = self._conn
+        inst = self.__class__.frozen(raw,
+                                     type=self._info_sys_properties.get("type"),
+                                     full_struct=self._info_sys_properties.get("full_struct"),
+                                     index_rules=self._info_sys_properties.get("index_rules"),
+                                     *self._info_sys_properties.get("args", []), **kwargs)
+        inst._accessor_plans = self._accessor_plans
+        inst._info_sys_properties["index_pipeline"] = self._info_sys_properties.get("index_pipeline")
+        return inst
 
     def _get_write_type(self, raise_if_not_set=False):
         type = self._info_sys_properties.get("type")
@@ -183,18 +203,31 @@ class InfoSysModel(dataobj.DataObj, dao.ESInstanceDAO):
     ############################################################
     ## overrides of instance methods
 
+    def _index_pipeline(self):
+        pipeline = self._info_sys_properties.get("index_pipeline")
+        if pipeline is None:
+            pipeline = index.pipeline_for(self._info_sys_properties.get("type"), self._info_sys_properties.get("index_rules", []))
+            self._info_sys_properties["index_pipeline"] = pipeline
+        return pipeline
+
     def prep(self):
-        for r in self._info_sys_properties.get("index_rules", []):
-            fd = r.get("function", {})
-            func_path = app.config.get("INDEX_FUNCTIONS_MODULE") + "." + fd.get("name")
-            fn = plugin.load_function(func_path)
-            idx = fn(self.data, *fd.get("args", []), **fd.get("kwargs", {}))
-            if idx is not None:
-                path = "index." + r.get("index_field")
-                if isinstance(idx, list):
-                    self._set_list(path, idx)
-                else:
-                    self._set_single(path, idx)
+        self._apply_index(self._index_pipeline().run(self.data))
+
+    def prep_many(self, objects):
+        """
+        Prep a batch of objects which have the same index rules as this one, compiling the rules only once
+        """
+        results = self._index_pipeline().run_many([o.data for o in objects])
+        for o, idx in zip(objects, results):
+            o._apply_index(idx)
+
+    def _apply_index(self, values):
+        for field, idx in values:
+            path = "index." + field
+            if isinstance(idx, list):
+                self._set_list(path, idx)
+            else:
+                self._set_single(path, idx)
 
     def delete(self, conn=None, type=None):
         if type is None:
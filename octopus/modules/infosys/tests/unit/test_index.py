@@ -0,0 +1,55 @@
+from unittest import TestCase
+from octopus.modules.infosys import index
+
+DOC = {
+    "record" : {
+        "title" : "The Title, of: Things!",
+        "numbers" : [1, 2, 3],
+        "authors" : [
+            {"name" : "One", "id" : "a"},
+            {"name" : "Two", "id" : "b"},
+            {"name" : "Three", "id" : "a"},
+            {"name" : "Four", "id" : "c"}
+        ]
+    }
+}
+
+INDEX_RULES = [
+    {"index_field" : "total", "function" : {"name" : "add", "args" : ["$.record.numbers"]}},
+    {"index_field" : "title", "function" : {"name" : "opath", "args" : ["$.record.title"]}},
+    {"index_field" : "title_exact", "function" : {"name" : "ascii_unpunc", "args" : ["$.record.title"]}},
+    {"index_field" : "authors", "function" : {"name" : "count", "kwargs" : {"list_field" : "$.record.authors"}}},
+    {"index_field" : "unique", "function" : {"name" : "unique_count", "kwargs" : {"list_field" : "$.record.authors", "unique_field" : "$.id"}}}
+]
+
+class TestIndex(TestCase):
+    def test_01_functions(self):
+        # the functions can still be called directly with the document
+        assert index.add(DOC, "$.record.numbers") == 6
+        assert index.opath(DOC, "$.record.title") == ["The Title, of: Things!"]
+        assert index.count(DOC, list_field="$.record.authors") == 4
+        assert index.unique_count(DOC, list_field="$.record.authors", unique_field="$.id") == 3
+
+    def test_02_pipeline(self):
+        p = index.IndexPipeline(INDEX_RULES)
+        out = dict(p.run(DOC))
+        assert out["total"] == 6
+        assert out["title"] == ["The Title, of: Things!"]
+        assert out["title_exact"] == ["the title of things"], out["title_exact"]
+        assert out["authors"] == 4
+        assert out["unique"] == 3
+
+        results = p.run_many([DOC, {"record" : {"numbers" : [5]}}])
+        assert len(results) == 2
+        assert dict(results[1])["total"] == 5
+        assert dict(results[1])["authors"] == 0
+
+    def test_03_compile(self):
+        # the pipeline is kept per type, until the rules change
+        p1 = index.pipeline_for("test_index", INDEX_RULES)
+        assert index.pipeline_for("test_index", INDEX_RULES) is p1
+        p2 = index.pipeline_for("test_index", INDEX_RULES[:1])
+        assert p2 is not p1
+
+        with self.assertRaises(index.IndexException):
+            index.IndexPipeline([{"index_field" : "x", "function" : {"name" : "no_such_function"}}])
@@ -0,0 +1,156 @@
+from copy import deepcopy
+import os
+
+from octopus.lib import dataobj
+from octopus.modules.es.tests.esprit_stub import EspritStubTestCase
+
+RECORD_STRUCT = {
+    "fields" : {
+        "one" : {"coerce" : "unicode"}
+    },
+    "objects" : ["three"],
+    "structs" : {
+        "three" : {
+            "fields" : {
+                "four" : {"coerce" : "unicode"}
+            }
+        }
+    }
+}
+
+ADMIN_STRUCT = {
+    "fields" : {
+        "alpha" : {"coerce" : "unicode"}
+    }
+}
+
+INDEX_RULES = [
+    {
+        "index_field" : "four",
+        "struct_args" : {"coerce" : "unicode"},
+        "function" : {"name" : "opath", "args" : ["$.record.three.four"], "kwargs" : {}}
+    }
+]
+
+HIT = {
+    "id" : "1234567890",
+    "created_date" : "2001-01-01T00:00:00Z",
+    "last_updated" : "2001-01-02T00:00:00Z",
+    "record" : {"one" : "hello", "three" : {"four" : "object"}},
+    "admin" : {"alpha" : "hello"},
+    "index" : {"four" : ["stale"]}
+}
+
+class TestViews(EspritStubTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TestViews, cls).setUpClass()
+        from octopus.modules.es import dao
+        from octopus.modules.infosys import models
+        cls.dao = dao
+        cls.models = models
+
+    def setUp(self):
+        super(TestViews, self).setUp()
+        dao = self.dao
+        # object_query normally comes from esprit's DomainObject
+        self.old_object_query = dao.ESDAO.__dict__.get("object_query")
+        self.calls = []
+        calls = self.calls
+        hits = self.hits = [deepcopy(HIT), deepcopy(HIT)]
+
+        def object_query(cls, **kwargs):
+            calls.append(kwargs)
+            return hits
+        dao.ESDAO.object_query = classmethod(object_query)
+
+        self.model = self.models.InfoSysModel(type="record1", record_struct=RECORD_STRUCT, admin_struct=ADMIN_STRUCT,
+                                         index_rules=INDEX_RULES, expose_data=True)
+
+    def tearDown(self):
+        super(TestViews, self).tearDown()
+        if self.old_object_query is None:
+            del self.dao.ESDAO.object_query
+        else:
+            self.dao.ESDAO.object_query = self.old_object_query
+
+    def test_01_shared(self):
+        self.model._index_pipeline()
+        views = self.model.object_query(q={"query" : {"match_all" : {}}})
+        assert len(views) == 2
+
+        # the right type is queried for, and given to the views
+        assert self.calls[0]["types"] == ["record1"]
+        assert self.calls[0]["wrap"] is False
+        for view in views:
+            assert isinstance(view, self.models.InfoSysModel)
+            assert view._get_write_type() == "record1"
+
+        # the views share the model's connection, coercions, accessors and index pipeline
+        for view in views:
+            assert view._conn is self.model._conn
+            assert view._coerce_map is self.model._coerce_map
+            assert view._accessor_plans is self.model._accessor_plans
+            assert view._index_pipeline() is self.model._index_pipeline()
+
+        # and read the hit without copying it
+        assert views[0].record["one"] == "hello"
+        assert views[0].data["record"] is self.hits[0]["record"]
+        assert "index" not in views[0].data
+
+    def test_02_prep(self):
+        view = self.model.object_query(q={"query" : {"match_all" : {}}})[0]
+        view.prep()
+
+        # the view is thawed into a copy, so the hit itself is untouched
+        assert view.data["index"]["four"] == [u"object"]
+        assert self.hits[0] == HIT
+        assert view.data["record"] is not self.hits[0]["record"]
+
+    def test_03_failed_edit(self):
+        self.hits[0]["admin"] = "not an object"
+        bad = deepcopy(self.hits[0])
+        view = self.model.object_query(q={"query" : {"match_all" : {}}})[0]
+
+        # the edit fails because the hit can't be constructed, and neither the hit nor the view is changed
+        with self.assertRaises(dataobj.DataStructureException):
+            view.record = {"one" : "changed"}
+        assert self.hits[0] == bad
+        assert view._frozen is not None
+        assert view.data["record"] is self.hits[0]["record"]
+        assert view.record["one"] == "hello"
+
+class TestConnection(EspritStubTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super(TestConnection, cls).setUpClass()
+        from octopus.modules.es import dao
+        cls.dao = dao
+
+    def setUp(self):
+        super(TestConnection, self).setUp()
+        dao = self.dao
+        self.old = (dao._connections, dao._connections_pid, dao._connections_lock)
+
+    def tearDown(self):
+        super(TestConnection, self).tearDown()
+        dao = self.dao
+        dao._connections, dao._connections_pid, dao._connections_lock = self.old
+
+    def test_01_registry(self):
+        dao = self.dao
+
+        # the same connection is shared for the same host and index
+        conn = dao.connection("http://localhost:9200", "test")
+        assert dao.connection("http://localhost:9200", "test") is conn
+        assert dao.connection("http://localhost:9200", "other") is not conn
+        assert dao.ESInstanceDAO(conn=None)._conn is dao.connection()
+
+        # and a forked process makes its own
+        dao._connections_pid = os.getpid() + 1
+        lock = dao._connections_lock
+        fresh = dao.connection("http://localhost:9200", "test")
+        assert fresh is not conn
+        assert dao._connections_pid == os.getpid()
+        assert dao._connections_lock is not lock
+        assert dao.connection("http://localhost:9200", "test") is fresh
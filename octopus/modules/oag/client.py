@@ -1,5 +1,5 @@
 from datetime import datetime, timedelta
-import json, requests, time, sys, uuid
+import json, requests, time, sys, uuid, heapq, threading, Queue
 from copy import deepcopy
 from octopus.core import app
 from octopus.lib import http
@@ -40,8 +40,16 @@ class RequestState(object):
             batch_size = app.config.get("OAG_STATE_BATCH_SIZE", 1000)
         self.batch_size = batch_size
 
+        # a heap of (due, id) for the pending identifiers, so that the due identifiers can
+        # be found without scanning everything that is pending.  Entries are not removed when
+        # an identifier's due time changes or it leaves pending; instead _queued records the
+        # due time of the one live entry for each identifier, and stale entries are skipped
+        self._due_heap = []
+        self._queued = {}
+
         for ident in identifiers:
             self.pending[ident] = {"init" : self.start, "due" : self.start, "requested" : 0}
+        self._rebuild_heap()
 
     def print_parameters(self):
         params = "Timeout: " + str(self.timeout) + "\n"
@@ -67,15 +75,64 @@ class RequestState(object):
         return False
 
     def get_due(self):
-        now = datetime.utcnow()
-        return [p for p in self.pending.keys() if self.pending[p].get("due") < now]
+        due = self.take_due()
+        self.release(due)
+        return due
+
+    def take_due(self, limit=None, now=None):
+        """
+        Remove up to limit due identifiers from the schedule and return them.  They stay
+        pending, but will not be returned again until they are rescheduled, which happens
+        when a result or a request is recorded against them, or they are release()d
+        """
+        if now is None:
+            now = datetime.utcnow()
+        due = []
+        while len(self._due_heap) > 0 and (limit is None or len(due) < limit):
+            when, id = self._due_heap[0]
+            if not self._is_live(when, id):
+                heapq.heappop(self._due_heap)
+                continue
+            if when >= now:
+                break
+            heapq.heappop(self._due_heap)
+            del self._queued[id]
+            due.append(id)
+        return due
+
+    def release(self, identifiers):
+        for id in identifiers:
+            self._schedule(id)
 
     def next_due(self):
-        earliest = None
-        for p, o in self.pending.iteritems():
-            if earliest is None or o.get("due") < earliest:
-                earliest = o.get("due")
-        return earliest
+        while len(self._due_heap) > 0:
+            when, id = self._due_heap[0]
+            if self._is_live(when, id):
+                return when
+            heapq.heappop(self._due_heap)
+        return None
+
+    def _is_live(self, when, id):
+        return self._queued.get(id) == when and id in self.pending and self.pending[id].get("due") == when
+
+    def _schedule(self, id):
+        if id not in self.pending:
+            return
+        when = self.pending[id].get("due")
+        if self._queued.get(id) == when:
+            return
+        self._queued[id] = when
+        heapq.heappush(self._due_heap, (when, id))
+
+        # don't let the stale entries grow without bound
+        if len(self._due_heap) > 2 * len(self._queued) + 1000:
+            self._due_heap = [(w, i) for i, w in self._queued.iteritems() if self._is_live(w, i)]
+            heapq.heapify(self._due_heap)
+
+    def _rebuild_heap(self):
+        self._queued = dict([(id, o.get("due")) for id, o in self.pending.iteritems()])
+        self._due_heap = [(w, i) for i, w in self._queued.iteritems()]
+        heapq.heapify(self._due_heap)
 
     def _record_maxed(self, id):
         self.maxed[id] = self.pending[id]
@@ -89,6 +146,8 @@ class RequestState(object):
                 self.pending[id]["requested"] += 1
                 if self.max_retries is not None and self.pending[id]["requested"] >= self.max_retries:
                     self._record_maxed(id)
+                else:
+                    self._schedule(id)
             else:
                 print "ERROR: id {id} is not in the pending list".format(id=id)
 
@@ -136,6 +195,8 @@ class RequestState(object):
             self.pending[id]["due"] = self._backoff(self.pending[id]["requested"])
             if self.max_retries is not None and self.pending[id]["requested"] >= self.max_retries:
                 self._record_maxed(id)
+            else:
+                self._schedule(id)
 
     def flush_success(self):
         buffer = self.success_buffer
@@ -178,6 +239,7 @@ class RequestState(object):
             obj["init"] = datetime.strptime(obj["init"], cls._timestamp_format)
             obj["due"] = datetime.strptime(obj["due"], cls._timestamp_format)
             state.pending[s.get("id")] = obj
+        state._rebuild_heap()
 
         for s in j.get("maxed", []):
             obj = deepcopy(s)
@@ -243,47 +305,87 @@ class OAGClient(object):
     def __init__(self, lookup_url=None):
         self.lookup_url = lookup_url if lookup_url is not None else app.config.get("OAG_LOOKUP_URL")
 
-    def cycle(self, state, throttle=0, verbose=False):
-        due = state.get_due()
+    def cycle(self, state, throttle=0, verbose=False, concurrency=None):
+        """
+        Request all of the identifiers which are currently due, in batches.  Up to
+        concurrency batches are in flight at once, and no two batches are started less
+        than throttle seconds apart
+        """
+        if concurrency is None:
+            concurrency = app.config.get("OAG_CLIENT_CONCURRENCY", 1)
+
+        due = state.take_due()
         batches = self._batch(due, state.batch_size)
         if verbose:
             print str(len(due)) + " due; requesting in " + str(len(batches)) + " batches"
-        first = True
-        i = 1
-        print "Processing batch ",
-        for batch in batches:
-            if first:
-                first = False
-            elif throttle > 0:
-                time.sleep(throttle)
+
+        limiter = http.RateLimiter(throttle)
+        lock = threading.Lock()
+        counter = [1]
+
+        def run(batch):
+            limiter.wait()
 
             # first try and get the result - this could result in an HTTP error, and we
-            # don't want that to kill the thread.  If it fails, record a request against the
-            # identifier but leave it pending
+            # don't want that to kill the thread.
             result = None
-            recorded = False
             try:
                 result = self._query(batch)
             except requests.exceptions.HTTPError as e:
-                # record the records in this batch as requested once more
-                state.record_requested(batch)
-                recorded = True
-
-            # if we get a result, then record it.  Otherwise, again record the batch as requested
-            # but leave it in pending.
-            if result is not None:
-                state.record_result(result)
-            else:
-                # record the records in this batch as requested once more
-                if not recorded:
+                pass
+
+            # if we get a result, then record it.  Otherwise, record a request against the
+            # identifiers in the batch but leave them in pending.
+            with lock:
+                if result is not None:
+                    state.record_result(result)
+                else:
                     state.record_requested(batch)
+                print counter[0],
+                sys.stdout.flush()
+                counter[0] += 1
 
-            print i,
-            sys.stdout.flush()
-            i += 1
+        print "Processing batch ",
+        try:
+            if concurrency <= 1 or len(batches) <= 1:
+                for batch in batches:
+                    run(batch)
+            else:
+                self._run_concurrently(run, batches, concurrency)
+        finally:
+            # anything we took but did not get an answer for goes back on the schedule
+            with lock:
+                state.release(due)
         print ""
         return state
 
+    def _run_concurrently(self, fn, batches, concurrency):
+        work = Queue.Queue()
+        for batch in batches:
+            work.put(batch)
+        errors = []
+
+        def worker():
+            while len(errors) == 0:
+                try:
+                    batch = work.get_nowait()
+                except Queue.Empty:
+                    return
+                try:
+                    fn(batch)
+                except Exception as e:
+                    errors.append(sys.exc_info())
+
+        threads = [threading.Thread(target=worker) for i in range(min(concurrency, len(batches)))]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        for t in threads:
+            t.join()
+
+        if len(errors) > 0:
+            raise errors[0][0], errors[0][1], errors[0][2]
+
     def _batch(self, ids, batch_size=1000):
         batches = []
         start = 0
@@ -305,10 +407,21 @@ class OAGClient(object):
         else:
             resp.raise_for_status()
 
+def sleep_until(when):
+    """
+    Sleep until the given (UTC) datetime
+    """
+    while True:
+        delta = when - datetime.utcnow()
+        seconds = delta.days * 86400 + delta.seconds + delta.microseconds / 1000000.0
+        if seconds <= 0:
+            return
+        time.sleep(seconds)
+
 def oag_it(lookup_url, identifiers,
            timeout=None, back_off_factor=1, max_back_off=120, max_retries=None, batch_size=1000,
             verbose=True, throttle=5,
-            callback=None, save_state=None):
+            callback=None, save_state=None, concurrency=None):
     state = RequestState(identifiers, timeout=timeout, back_off_factor=back_off_factor, max_back_off=max_back_off, max_retries=max_retries, batch_size=batch_size)
     client = OAGClient(lookup_url)
 
@@ -319,13 +432,12 @@ def oag_it(lookup_url, identifiers,
 
     next = state.next_due()
     while True:
-        # check whether we're supposed to do anything yet
-        now = datetime.utcnow()
-        if now < next:
-            continue
+        # wait until we're supposed to do something
+        if next is not None:
+            sleep_until(next)
 
         # if a cycle is due, issue it
-        client.cycle(state, throttle, verbose)
+        client.cycle(state, throttle, verbose, concurrency)
         if verbose:
             print state.print_status_report()
 
@@ -343,7 +455,6 @@ def oag_it(lookup_url, identifiers,
             print "FINISHED"
             break
 
-        # if we have done work here, update the next due time for the busy
-        # loop aboge
+        # if we have done work here, update the next due time for the loop above
         next = state.next_due()
         print "Next request is due at", datetime.strftime(next, "%Y-%m-%d %H:%M:%S")
@@ -11,9 +11,8 @@ class JobsDAO(dao.ESDAO):
         q = DueJobsQuery()
         counter = 0
         total = cls.count(q.query())
-        for res in cls.iterate(q.query()):
-            obj = cls.pull(res.id)
-            state = oag.RequestState.from_json(obj.data)
+        for obj in cls.stream(q.query(), wrap=False):
+            state = oag.RequestState.from_json(obj)
             counter += 1
             yield state, counter, total
 
@@ -51,13 +50,6 @@ class JobStatusQuery(object):
         }
 
 class DueJobsQuery(object):
-    def __init__(self):
-        esv = app.config.get("ELASTIC_SEARCH_VERSION", "0.90.13")
-        if esv.startswith("0"):
-            self.fields = "fields"
-        else:
-            self.fields = "_source"
-
     def query(self):
         now = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ")
         return {
@@ -82,8 +74,5 @@ class DueJobsQuery(object):
                 }
             },
             # FIXME: removed because of a bug in ES around date sorting
-            # "sort" : [{"pending.due" : {"order" : "asc", "mode" : "min"}}],
-            self.fields : [ "id" ],
-            # "fields" : ["id"],
-            "size" : 10000
+            # "sort" : [{"pending.due" : {"order" : "asc", "mode" : "min"}}]
         }
\ No newline at end of file
@@ -19,6 +19,10 @@ OAG_STATE_MAX_RETRIES = None
 # batch size to send to OAG in
 OAG_STATE_BATCH_SIZE = 100
 
+# number of batches which may be requested from OAG at the same time.  The throttle passed to the
+# client still applies across all of them, as the minimum interval between starting batches
+OAG_CLIENT_CONCURRENCY = 1
+
 # OAGR Job runner configuration
 #######################################
 
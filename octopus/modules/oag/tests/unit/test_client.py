@@ -0,0 +1,62 @@
+from unittest import TestCase
+from octopus.modules.oag import client
+from datetime import datetime, timedelta
+import time
+
+class TestClient(TestCase):
+    def setUp(self):
+        super(TestClient, self).setUp()
+
+    def tearDown(self):
+        super(TestClient, self).tearDown()
+
+    def test_01_due_schedule(self):
+        start = datetime.utcnow() - timedelta(seconds=10)
+        state = client.RequestState(["a", "b", "c", "d"], back_off_factor=100, max_back_off=1000, start=start)
+
+        # everything starts out due, and get_due leaves it all scheduled
+        assert sorted(state.get_due()) == ["a", "b", "c", "d"]
+        assert sorted(state.get_due()) == ["a", "b", "c", "d"]
+        assert state.next_due() == start
+
+        # taking identifiers removes them from the schedule until they are released
+        taken = state.take_due(limit=2)
+        assert len(taken) == 2
+        assert len(state.get_due()) == 2
+        state.release(taken)
+        assert len(state.get_due()) == 4
+
+        # results remove identifiers from pending, and "processing" ones are backed off
+        taken = state.take_due()
+        state.record_result({
+            "results" : [{"identifier" : [{"id" : "a"}]}],
+            "errors" : [{"identifier" : {"id" : "b"}}],
+            "processing" : [{"identifier" : {"id" : "c"}}]
+        })
+        state.release(taken)
+
+        assert state.get_due() == ["d"]
+        assert state.next_due() == start
+        assert "a" in state.success
+        assert "b" in state.error
+
+        state.record_requested(["d"])
+        state.record_result({"results" : [{"identifier" : [{"id" : "d"}]}]})
+        assert state.get_due() == []
+        assert state.next_due() == state.pending["c"]["due"]
+        assert state.next_due() > datetime.utcnow()
+
+    def test_02_due_schedule_from_json(self):
+        start = datetime.utcnow() - timedelta(seconds=10)
+        state = client.RequestState(["a", "b"], start=start)
+        state.record_result({"processing" : [{"identifier" : {"id" : "a"}}]})
+
+        state2 = client.RequestState.from_json(state.json())
+        assert state2.get_due() == ["b"]
+        assert state2.take_due() == ["b"]
+        assert state2.next_due() > datetime.utcnow()
+
+    def test_03_sleep_until(self):
+        when = datetime.utcnow() + timedelta(seconds=0.1)
+        client.sleep_until(when)
+        assert datetime.utcnow() >= when
@@ -1,6 +1,9 @@
 from octopus.core import app
 from octopus.lib import http
 from octopus.lib import xml as xmlutil
+from octopus.modules import identifiers
+from octopus.modules.identifiers import issn as issnutil
+from octopus.modules.romeo import index
 import requests, codecs
 
 class RomeoClientException(Exception):
@@ -19,15 +22,73 @@ class RomeoClient(object):
             f.write(resp.text)
 
     def get_by_issn(self, issn):
+        # if there is a local index, and it has the answer, there's no need to go to the API
+        idx = index.local_index()
+        if idx is not None:
+            xml = idx.policy(issn, max_age=app.config.get("ROMEO_INDEX_POLICY_MAX_AGE"))
+            if xml is not None:
+                return SearchResult(xml)
+
         url = self.base_url + "?issn=" + http.quote(issn)
         app.logger.info("Looking up ISSN in Romeo with URL {x}".format(x=url))
-        resp = http.get(url)
+        resp = http.get(url, cache="ROMEO")
         if resp is None or resp.status_code != 200:
             app.logger.info("Unable to retrieve {x} from Romeo".format(x=issn))
             raise RomeoClientException("Unable to get by issn")
         xml = xmlutil.fromstring(resp.text)
+
+        if idx is not None:
+            idx.set_policy(issn, resp.text)
         return SearchResult(xml)
 
+    def get_by_issns(self, issns, concurrency=None, min_interval=None):
+        """
+        Look up many ISSNs, with the requests made concurrently.  The ISSNs are normalised
+        and de-duplicated first.  RoMEO only takes one ISSN per request.
+
+        :return: generator of (issn, SearchResult or exception), in the order the results arrive
+        """
+        if concurrency is None:
+            concurrency = app.config.get("ROMEO_BATCH_CONCURRENCY", 4)
+        if min_interval is None:
+            min_interval = app.config.get("ROMEO_BATCH_MIN_INTERVAL", 0)
+
+        def request(batch):
+            return self.base_url + "?issn=" + http.quote(batch[0])
+
+        idx = index.local_index()
+        max_age = app.config.get("ROMEO_INDEX_POLICY_MAX_AGE")
+
+        def parse(batch, resp):
+            if resp is None or resp.status_code != 200:
+                app.logger.info("Unable to retrieve {x} from Romeo".format(x=batch[0]))
+                raise RomeoClientException("Unable to get by issn")
+            xml = xmlutil.fromstring(resp.text)
+            if idx is not None:
+                idx.set_policy(batch[0], resp.text)
+            return {batch[0] : SearchResult(xml)}
+
+        if idx is None:
+            return identifiers.batch_lookup(issns, issnutil.normalise, request, parse,
+                                            batch_size=1, concurrency=concurrency, min_interval=min_interval)
+
+        # answer what we can from the local index, and only go to the API for the rest
+        def lookup():
+            valid, invalid = identifiers.normalise_all(issns, issnutil.normalise)
+            for issn, e in invalid:
+                yield issn, e
+            misses = []
+            for issn in valid:
+                xml = idx.policy(issn, max_age=max_age)
+                if xml is not None:
+                    yield issn, SearchResult(xml)
+                else:
+                    misses.append(issn)
+            for result in identifiers.batch_lookup(misses, issnutil.normalise, request, parse,
+                                                   batch_size=1, concurrency=concurrency, min_interval=min_interval):
+                yield result
+        return lookup()
+
 
 class SearchResult(object):
     def __init__(self, xml):
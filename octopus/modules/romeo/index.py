@@ -0,0 +1,194 @@
+"""
+A local index of RoMEO journals, built from the bulk journal-title/ISSN download, which answers
+get_by_issn queries without going to the API.
+
+The download only lists the journals and their ISSNs, so the policy for each ISSN is fetched from
+the API once, when the journal first appears in (or changes in) the download, and is kept in the index
+alongside it.  Lookups for ISSNs the index knows nothing about go to the API, and the result is kept
+until the next download is ingested.
+"""
+from octopus.core import app
+from octopus.lib import xml as xmlutil
+from octopus.modules.identifiers import issn as issnutil
+import sqlite3, threading, os, csv, hashlib, time, tempfile
+
+class RomeoIndexException(Exception):
+    pass
+
+class RomeoIndex(object):
+    def __init__(self, path=None):
+        self.path = path if path is not None else app.config.get("ROMEO_INDEX_PATH")
+        if self.path is None:
+            raise RomeoIndexException("ROMEO_INDEX_PATH must be set to use the local RoMEO index")
+        dir = os.path.dirname(os.path.abspath(self.path))
+        if not os.path.exists(dir):
+            os.makedirs(dir)
+        self._local = threading.local()
+        self._init_db()
+
+    def _conn(self):
+        # sqlite connections can't be shared between threads, so each thread gets its own
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        with self._conn() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS journals (issn TEXT PRIMARY KEY, title TEXT, fingerprint TEXT)")
+            conn.execute("CREATE TABLE IF NOT EXISTS policies (issn TEXT PRIMARY KEY, xml TEXT, fetched REAL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    ##############################################
+    ## Queries
+
+    def journal(self, issn):
+        """
+        The title of the journal with this ISSN from the download, or None if it is not listed
+        """
+        row = self._conn().execute("SELECT title FROM journals WHERE issn = ?", (self._normalise(issn),)).fetchone()
+        return row[0] if row is not None else None
+
+    def policy(self, issn, max_age=None):
+        """
+        The RoMEO API response for this ISSN, as an lxml element, or None if we don't have it (or it is older
+        than max_age seconds)
+        """
+        row = self._conn().execute("SELECT xml, fetched FROM policies WHERE issn = ?", (self._normalise(issn),)).fetchone()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row[1] > max_age:
+            return None
+        return xmlutil.fromstring(row[0])
+
+    def set_policy(self, issn, xml):
+        """
+        Keep the RoMEO API response (as a unicode string) for this ISSN
+        """
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO policies (issn, xml, fetched) VALUES (?, ?, ?)",
+                         (self._normalise(issn), xml, time.time()))
+
+    def missing_policies(self):
+        """
+        ISSNs listed in the download which have no policy in the index
+        """
+        rows = self._conn().execute("SELECT journals.issn FROM journals LEFT JOIN policies ON journals.issn = policies.issn WHERE policies.issn IS NULL")
+        return [r[0] for r in rows]
+
+    def last_refreshed(self):
+        row = self._conn().execute("SELECT value FROM meta WHERE key = 'last_refreshed'").fetchone()
+        return float(row[0]) if row is not None else None
+
+    def _normalise(self, issn):
+        try:
+            return issnutil.normalise(issn)
+        except ValueError:
+            return issn
+
+    ##############################################
+    ## Ingest
+
+    def ingest(self, path):
+        """
+        Bring the index up to date with a downloaded journal-title/ISSN csv.  Journals which are new or have
+        changed since the last ingest are added, and their policies dropped so that they will be re-fetched.
+        Journals which are no longer listed are removed, along with any policy for an ISSN which is not in the
+        download (including those kept from lookups of unlisted ISSNs).
+
+        :return: the list of ISSNs which were added or changed
+        """
+        rows = {}
+        with open(path, "rb") as f:
+            reader = csv.reader(f)
+            header = reader.next()
+            title_col, issn_cols = self._columns(header)
+            for row in reader:
+                if len(row) == 0:
+                    continue
+                title = row[title_col].strip().decode("utf-8", "replace") if title_col < len(row) else u""
+                fingerprint = hashlib.sha1("\t".join(row)).hexdigest()
+                for col in issn_cols:
+                    if col >= len(row):
+                        continue
+                    try:
+                        issn = issnutil.normalise(row[col])
+                    except ValueError:
+                        continue
+                    rows[issn] = (title, fingerprint)
+
+        conn = self._conn()
+        existing = dict(conn.execute("SELECT issn, fingerprint FROM journals").fetchall())
+        changed = [issn for issn, (title, fp) in rows.iteritems() if existing.get(issn) != fp]
+        removed = [issn for issn in existing if issn not in rows]
+
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO journals (issn, title, fingerprint) VALUES (?, ?, ?)",
+                             [(issn, rows[issn][0], rows[issn][1]) for issn in changed])
+            conn.executemany("DELETE FROM journals WHERE issn = ?", [(issn,) for issn in removed])
+            conn.executemany("DELETE FROM policies WHERE issn = ?", [(issn,) for issn in changed])
+            conn.execute("DELETE FROM policies WHERE issn NOT IN (SELECT issn FROM journals)")
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('last_refreshed', ?)", (str(time.time()),))
+
+        return changed
+
+    def _columns(self, header):
+        title_col = None
+        issn_cols = []
+        for i, h in enumerate(header):
+            h = h.strip().lower()
+            if "issn" in h or "essn" in h:
+                issn_cols.append(i)
+            elif title_col is None and "title" in h:
+                title_col = i
+
+        # if the header is not recognisable, fall back to title, issn, essn
+        if title_col is None:
+            title_col = 0
+        if len(issn_cols) == 0:
+            issn_cols = [1, 2]
+        return title_col, issn_cols
+
+_index = None
+_index_lock = threading.Lock()
+
+def local_index():
+    """
+    The shared local index, or None if ROMEO_INDEX_PATH is not configured
+    """
+    global _index
+    if app.config.get("ROMEO_INDEX_PATH") is None:
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = RomeoIndex()
+    return _index
+
+def refresh():
+    """
+    Download the journal list, ingest it into the local index, and fetch the policies of any journals
+    which are new or have changed.  Suitable for running from octopus.modules.scheduler.
+    """
+    from octopus.modules.romeo import client
+
+    idx = local_index()
+    if idx is None:
+        raise RomeoIndexException("ROMEO_INDEX_PATH must be set to refresh the local RoMEO index")
+
+    c = client.RomeoClient()
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+    try:
+        c.download(path)
+        changed = idx.ingest(path)
+    finally:
+        os.remove(path)
+    app.logger.info("Local RoMEO index refreshed; {x} journals added or changed".format(x=len(changed)))
+
+    if app.config.get("ROMEO_INDEX_FETCH_POLICIES", True):
+        # this also picks up anything which failed to fetch last time
+        for issn, result in c.get_by_issns(idx.missing_policies()):
+            if isinstance(result, Exception):
+                app.logger.info("Unable to fetch RoMEO policy for {x}: {y}".format(x=issn, y=result))
@@ -4,4 +4,25 @@ ROMEO_API_KEY = ""
 
 ROMEO_API_BASE_URL = "http://www.sherpa.ac.uk/romeo/api29.php"
 
-ROMEO_DOWNLOAD_BASE_URL = "http://www.sherpa.ac.uk/downloads/"
\ No newline at end of file
+ROMEO_DOWNLOAD_BASE_URL = "http://www.sherpa.ac.uk/downloads/"
+
+# number of seconds to cache RoMEO ISSN lookups for (see octopus.lib.httpcache).  None to disable
+ROMEO_CACHE_TTL = 604800
+
+# maximum number of concurrent requests, and minimum number of seconds between starting requests,
+# when looking up many ISSNs with RomeoClient.get_by_issns
+ROMEO_BATCH_CONCURRENCY = 4
+ROMEO_BATCH_MIN_INTERVAL = 0.2
+
+# path to the SQLite database for the local index of RoMEO journals and their policies (see
+# octopus.modules.romeo.index).  None means no local index is used, and all lookups go to the API.
+# To keep the index up to date, schedule octopus.modules.romeo.index.refresh with octopus.modules.scheduler, e.g.
+# SCHEDULER_TASKS = [(None, "day", "02:00", "octopus.modules.romeo.index.refresh")]
+ROMEO_INDEX_PATH = None
+
+# when the local index is refreshed, should the policies for new and changed journals be fetched from the API
+ROMEO_INDEX_FETCH_POLICIES = True
+
+# maximum age in seconds of a policy in the local index before it is fetched from the API again.  None means
+# policies are only re-fetched when their journal changes in the download
+ROMEO_INDEX_POLICY_MAX_AGE = None
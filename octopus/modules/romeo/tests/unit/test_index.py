@@ -0,0 +1,59 @@
+from unittest import TestCase
+from octopus.modules.romeo import index, client
+import tempfile, shutil, os
+
+POLICY = u"""<?xml version="1.0" encoding="ISO-8859-1" ?>
+<romeoapi version="2.9.9">
+<publishers><publisher id="1"><name>Caf\u00e9 Press</name><preprints><prearchiving>can</prearchiving></preprints></publisher></publishers>
+</romeoapi>"""
+
+class TestIndex(TestCase):
+    def setUp(self):
+        super(TestIndex, self).setUp()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestIndex, self).tearDown()
+        shutil.rmtree(self.dir)
+
+    def _csv(self, rows):
+        path = os.path.join(self.dir, "romeo.csv")
+        with open(path, "wb") as f:
+            f.write("Journal Title,ISSN,ESSN\n")
+            for row in rows:
+                f.write(",".join(row) + "\n")
+        return path
+
+    def test_01_ingest(self):
+        idx = index.RomeoIndex(os.path.join(self.dir, "romeo.db"))
+
+        changed = idx.ingest(self._csv([["Journal One", "1234-5678", "2049-3630"], ["Journal Two", "11112222", ""]]))
+        assert sorted(changed) == ["1111-2222", "1234-5678", "2049-3630"]
+        assert idx.journal("12345678") == "Journal One"
+        assert idx.journal("2049-3630") == "Journal One"
+        assert idx.journal("9999-9999") is None
+        assert sorted(idx.missing_policies()) == ["1111-2222", "1234-5678", "2049-3630"]
+
+        # policies are kept until their journal changes
+        idx.set_policy("1234-5678", POLICY)
+        idx.set_policy("1111-2222", POLICY)
+        sr = client.SearchResult(idx.policy("1234-5678"))
+        assert sr.publishers[0].name == u"Caf\u00e9 Press"
+        assert sr.publishers[0].preprint_archiving == "can"
+        assert idx.policy("1234-5678", max_age=-1) is None
+
+        changed = idx.ingest(self._csv([["Journal One", "1234-5678", "2049-3630"], ["Journal Two (renamed)", "1111-2222", ""]]))
+        assert changed == ["1111-2222"]
+        assert idx.policy("1111-2222") is None
+        assert idx.policy("1234-5678") is not None
+
+        # journals no longer listed are removed, and so are policies kept for ISSNs the download doesn't list
+        idx.set_policy("1111-2222", POLICY)
+        idx.set_policy("9999-9999", POLICY)
+        changed = idx.ingest(self._csv([["Journal Two (renamed)", "1111-2222", ""]]))
+        assert changed == []
+        assert idx.journal("1234-5678") is None
+        assert idx.policy("1234-5678") is None
+        assert idx.policy("9999-9999") is None
+        assert idx.policy("1111-2222") is not None
+        assert idx.last_refreshed() is not None
@@ -1,4 +1,5 @@
 from octopus.core import app
+from octopus.lib import charsets
 from octopus.modules.sheets.core import BaseReader, BaseWriter, FileReadException, DataStructureException
 import csv, codecs, cStringIO
 
@@ -29,22 +30,22 @@ class CsvReader(BaseReader):
 
         self.rectangular = rectangular
 
+        # the encoding the file was read with
+        self.encoding = None
+
     def read(self):
         if self.path is not None:
             encodings = [self.input_encoding]
             if self.try_other_encodings:
                 encodings += self.fallback_encodings
-            for enc in encodings:
-                with codecs.open(self.path, 'r+b', encoding=enc) as f:
-                    try:
-                        self._read_from_file(f)
-                        return self.data
-                    except FileReadException as e:
-                        continue
-                    except DataStructureException as e:
-                        continue
-
-            raise FileReadException("Unable to find a character encoding which reads the file into a legitimate data structure")
+
+            # read the bytes once, work out the encoding from them (see octopus.lib.charsets), and decode them once
+            try:
+                text, self.encoding = charsets.decode_file(self.path, encodings)
+            except (charsets.EncodingException, UnicodeDecodeError):
+                raise FileReadException("Unable to find a character encoding which reads the file into a legitimate data structure")
+            self._read_from_file(iter(text.splitlines(True)))
+            return self.data
 
         elif self.file is not None:
             self._read_from_file(self.file)
@@ -56,7 +57,7 @@ class CsvReader(BaseReader):
         :return: Entire CSV contents, a list of rows (like the standard csv lib)
         """
         try:
-            if file_object.closed:
+            if getattr(file_object, "closed", False):
                 file_object = codecs.open(file_object.name, 'r+b', encoding=self.input_encoding)
 
             reader = UnicodeReader(file_object, dialect=self.input_dialect)
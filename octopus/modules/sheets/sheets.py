@@ -1,9 +1,15 @@
+from octopus.core import app
 from octopus.modules.sheets.core import StructuralSheet
 from octopus.lib import strings
 from octopus.lib.coerce import CoerceFactory
 from copy import deepcopy
+from itertools import izip, izip_longest
+from datetime import date, datetime
 import types
 
+# the types of coerced value which can be safely shared between all the cells with the same raw value
+_SHAREABLE = (basestring, int, long, float, bool, date, datetime, type(None))
+
 class NoReaderException(Exception):
     pass
 
@@ -54,6 +60,11 @@ class ObjectByRow(StructuralSheet):
         self.data = None
         self.off_spec_data = None
 
+        # the sheet as read, as lists of values by normalised name (or header, for off-spec columns), from
+        # which the row dicts are built when they are first asked for
+        self._columns = None
+        self._off_spec_columns = None
+
         self._is_read = False
 
         if "from_row" not in self.spec:
@@ -87,41 +98,64 @@ class ObjectByRow(StructuralSheet):
         # read the data out of the reader
         raw = self.reader.read()
 
-        # create our internal dataset that we'll read from the raw layer
-        self.data = []
-        self.off_spec_data = []
-
         # take the first row as the header row
         headers = raw.pop(0)
 
-        # go through the rows, translating them to a dictionary with the appropriate
-        # data conversions
-        for row in raw:
-            if self._is_empty(row) and self.spec.get("ignore_empty_rows") is True:
-                continue
+        # drop the initially empty rows, and turn the rest of the sheet into columns
+        if self.spec.get("ignore_empty_rows") is True:
+            raw = [row for row in raw if not self._is_empty(row)]
+        # (columns beyond the end of the longest row are padded out, so that they still get their defaults)
+        cols = list(izip_longest(*raw, fillvalue=u""))[:len(headers)] if len(raw) > 0 else []
+        cols += [(u"",) * len(raw)] * (len(headers) - len(cols))
+
+        # apply the spec to each column as a whole
+        on_spec = []
+        off_spec = []
+        for h, col in zip(headers, cols):
+            sh = self.name_map.get(h)
+            if sh is not None:
+                on_spec.append((sh, self._apply_spec_column(col, self.compiled_col_spec.get(sh))))
+            else:
+                off_spec.append((h, list(col)))
+
+        # the above code catches initially empty rows, but once we've applied the spec a row may be empty too,
+        # so we need to drop those
+        keep = [False] * len(raw)
+        for _, col in on_spec + off_spec:
+            for i, val in enumerate(col):
+                if not keep[i] and val is not None and val != "":
+                    keep[i] = True
+        if not all(keep):
+            on_spec = [(n, [v for v, k in izip(col, keep) if k]) for n, col in on_spec]
+            off_spec = [(n, [v for v, k in izip(col, keep) if k]) for n, col in off_spec]
+
+        self._data = None
+        self._off_spec_data = None
+        self._columns = on_spec
+        self._off_spec_columns = off_spec
+        self._is_read = True
 
-            empty_row = True    # the above code catches initially empty rows, but once we've applied the spec a row may be empty too, so we need to catch that below
-            on_spec = {}
-            off_spec = {}
-            for i in range(len(headers)):
-                h = headers[i]
-                val = row[i]
-                sh = self.name_map.get(h)
-                if sh is not None:
-                    spec = self.compiled_col_spec.get(sh)
-                    on_spec[sh] = self._apply_spec(val, spec)
-                    if on_spec[sh] is not None and on_spec[sh] != "":
-                        empty_row = False
-                else:
-                    off_spec[h] = val
-                    if off_spec[h] is not None and off_spec[h] != "":
-                        empty_row = False
+    @property
+    def data(self):
+        if self._data is None and self._columns is not None:
+            self._data = self._make_rows(self._columns)
+        return self._data
 
-            if not empty_row:
-                self.data.append(on_spec)
-                self.off_spec_data.append(off_spec)
+    @data.setter
+    def data(self, val):
+        self._data = val
+        self._columns = None
 
-        self._is_read = True
+    @property
+    def off_spec_data(self):
+        if self._off_spec_data is None and self._off_spec_columns is not None:
+            self._off_spec_data = self._make_rows(self._off_spec_columns)
+        return self._off_spec_data
+
+    @off_spec_data.setter
+    def off_spec_data(self, val):
+        self._off_spec_data = val
+        self._off_spec_columns = None
 
     def write(self, close=True):
         """
@@ -246,7 +280,7 @@ class ObjectByRow(StructuralSheet):
 
         # now compile the spec
         comp = deepcopy(raw)
-        funcs = [f if type(f) == types.FunctionType else CoerceFactory.get(f) for f in coerce if CoerceFactory.get(f) is not None]
+        funcs = [f if type(f) == types.FunctionType else CoerceFactory.get(f) for f in coerce if type(f) == types.FunctionType or CoerceFactory.get(f) is not None]
         comp["coerce"] = funcs
         comp["to_unicode"] = raw["to_unicode"] if type(raw["to_unicode"]) == types.FunctionType else CoerceFactory.get(raw["to_unicode"])
 
@@ -259,6 +293,19 @@ class ObjectByRow(StructuralSheet):
     def off_spec_dicts(self):
         return self.off_spec_data
 
+    def column(self, normalised_name):
+        """
+        The values in the column, in row order, without building the row dicts if they haven't already been built
+        """
+        if self._data is None and self._columns is not None:
+            for name, col in reversed(self._columns):
+                if name == normalised_name:
+                    return col
+            return None
+        if self.data is None or normalised_name not in self.compiled_col_spec:
+            return None
+        return [d.get(normalised_name) for d in self.data]
+
     ###################################################
     ## Internal methods
 
@@ -268,27 +315,53 @@ class ObjectByRow(StructuralSheet):
     def _normalise(self, col_name):
         return strings.normalise(col_name, ascii=True, unpunc=True, lower=True, spacing=True, strip=True, space_replace="_")
 
-    def _apply_spec(self, val, spec):
-        # first apply any transformations that may make the value become the empty string
-        if val is not None:
-            if spec.get("trim", True):
-                val = val.strip()
-
-            if val in spec.get("ignore_values", []):
-                val = ""
+    def _make_rows(self, columns):
+        # where columns share a name, the later one wins, as it would when setting the keys one at a time
+        names = [n for n, _ in columns]
+        if len(names) == 0:
+            return []
+        return [dict(izip(names, vals)) for vals in izip(*[col for _, col in columns])]
 
-        # now if the value is none or the empty string, return the default value
-        if val is None or val == "":
-            return spec.get("default")
+    def _apply_spec_column(self, vals, spec):
+        """
+        Apply the spec to a whole column of values: trim them, blank out the ignored values, replace empty values
+        with the default, and coerce the rest.  The coerce functions are run once for each distinct value in the column.
+        """
+        default = spec.get("default")
+        if spec.get("trim", True):
+            vals = [v.strip() if v is not None else None for v in vals]
 
-        # apply the coerce functions in order
-        for c in spec.get("coerce", []):
+        ignore = spec.get("ignore_values", [])
+        if len(ignore) > 0:
             try:
-                val = c(val)
-            except:
-                if spec.get("on_coerce_failure", "raise") == "raise":
-                    print spec.get("normalised_name")
-                    raise
-                val = spec.get("default")
-
-        return val
+                ignore = frozenset(ignore)
+            except TypeError:
+                pass
+            vals = [u"" if v is not None and v in ignore else v for v in vals]
+
+        coerce = spec.get("coerce", [])
+        raise_on_failure = spec.get("on_coerce_failure", "raise") == "raise"
+        coerced = {}
+        out = []
+        for val in vals:
+            if val is None or val == "":
+                out.append(default)
+                continue
+            if val in coerced:
+                out.append(coerced[val])
+                continue
+
+            cval = val
+            for c in coerce:
+                try:
+                    cval = c(cval)
+                except:
+                    if raise_on_failure:
+                        app.logger.info(u"Unable to coerce value in column {x}".format(x=spec.get("normalised_name")))
+                        raise
+                    cval = default
+
+            if isinstance(cval, _SHAREABLE):
+                coerced[val] = cval
+            out.append(cval)
+        return out
@@ -170,4 +170,61 @@ class TestModels(TestCase):
                 assert values == ["Value D4"]
                 four = True
         assert two
-        assert four
\ No newline at end of file
+        assert four
+
+    def test_06_columnar_read(self):
+        class ListReader(object):
+            def read(self):
+                return [
+                    [u"Funder", u"APC", u"Notes"],
+                    [u" Wellcome ", u"1,000", u""],
+                    [u"", u"n/a", u""],
+                    [u"RCUK", u"250", u"check"],
+                    [u"Wellcome", u"1000", u""]
+                ]
+
+        calls = []
+        def counted(val):
+            calls.append(val)
+            return int(val.replace(",", ""))
+
+        spec = {"columns" : [
+            {"col_name" : "Funder", "normalised_name" : "funder", "coerce" : ["unicode"]},
+            {"col_name" : "APC", "normalised_name" : "apc", "coerce" : [counted], "ignore_values" : ["n/a"]}
+        ]}
+        obr = sheets.ObjectByRow(reader=ListReader(), spec=spec)
+
+        # the row which is empty once the spec has been applied is dropped, and each distinct value is coerced once
+        assert obr.column("apc") == [1000, 250, 1000]
+        assert sorted(calls) == [u"1,000", u"1000", u"250"]
+        assert obr.column("funder") == [u"Wellcome", u"RCUK", u"Wellcome"]
+        assert obr._data is None
+
+        assert obr.dicts() == [
+            {"funder" : u"Wellcome", "apc" : 1000},
+            {"funder" : u"RCUK", "apc" : 250},
+            {"funder" : u"Wellcome", "apc" : 1000}
+        ]
+        assert obr.off_spec_dicts() == [{u"Notes" : u""}, {u"Notes" : u"check"}, {u"Notes" : u""}]
+
+    def test_07_short_rows(self):
+        class ListReader(object):
+            def read(self):
+                return [
+                    [u"Funder", u"APC", u"Currency"],
+                    [u"Wellcome", u"1000"],
+                    [u"RCUK"]
+                ]
+
+        spec = {"columns" : [
+            {"col_name" : "Funder", "normalised_name" : "funder"},
+            {"col_name" : "APC", "normalised_name" : "apc", "default" : 0},
+            {"col_name" : "Currency", "normalised_name" : "currency", "default" : u"GBP"}
+        ]}
+        obr = sheets.ObjectByRow(reader=ListReader(), spec=spec)
+
+        # columns which none of the rows reach still get their defaults
+        assert obr.dicts() == [
+            {"funder" : u"Wellcome", "apc" : u"1000", "currency" : u"GBP"},
+            {"funder" : u"RCUK", "apc" : 0, "currency" : u"GBP"}
+        ]
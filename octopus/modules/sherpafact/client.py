@@ -1,6 +1,7 @@
 import urllib, requests, simplejson
 from octopus.core import app
 from octopus.lib.dataobj import DataObj
+from octopus.lib import httpcache
 
 class FactClientException(Exception):
     pass
@@ -58,7 +59,7 @@ class FactClient(object):
         juliet_ids = self._normalise_juliet(juliet_ids)
         url = self.get_query_url(juliet_ids, journal_title, query_type, issn, output, trail)
         app.logger.info("Making request to Sherpa FACT on url {url}".format(url=url))
-        resp = requests.get(url)
+        resp = httpcache.fetch("FACT", url, lambda: requests.get(url))
         return resp, url
 
     def query(self, juliet_ids, journal_title=None, query_type=None, issn=None, output="json", trail=False):
@@ -7,3 +7,6 @@ FACT_BASE_URL = "http://www.sherpa.ac.uk/fact/api-beta"
 
 CLIENTJS_FACT_PROXY_ENDPOINT = "/fact"
 
+
+# number of seconds to cache FACT responses for (see octopus.lib.httpcache).  None to disable
+FACT_CACHE_TTL = 604800
@@ -64,8 +64,9 @@ class StoreLocal(Store):
         if source_path:
             shutil.copyfile(source_path, tpath)
         elif source_stream:
+            # copy in chunks, so that large streams are never held in memory all at once
             with codecs.open(tpath, "wb") as f:
-                f.write(source_stream.read())
+                shutil.copyfileobj(source_stream, f)
 
     def exists(self, container_id):
         cpath = os.path.join(self.dir, container_id)
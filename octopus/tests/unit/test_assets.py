@@ -0,0 +1,108 @@
+from unittest import TestCase
+from octopus.lib import assets
+import os, shutil, tempfile, sys, re, json, glob
+
+# stands in for uglifyjs: called as <python> <this script> -o <out> <source>, it copies the source to
+# the output and records that it ran
+MINIFIER = """import sys, shutil
+shutil.copy(sys.argv[3], sys.argv[2])
+with open(sys.argv[0] + ".log", "a") as f:
+    f.write(sys.argv[3] + "\\n")
+"""
+
+class TestAssets(TestCase):
+    def setUp(self):
+        super(TestAssets, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, "src")
+        os.mkdir(self.src)
+        for name in ["a.js", "b.js"]:
+            with open(os.path.join(self.src, name), "w") as f:
+                f.write("var " + name[0] + " = 1;")
+
+        self.minifier = os.path.join(self.dir, "minify.py")
+        with open(self.minifier, "w") as f:
+            f.write(MINIFIER)
+
+        self.config = {
+            "parameters" : {
+                "tmp_dir" : os.path.join(self.dir, "tmp"),
+                "node" : sys.executable,
+                "uglify" : self.minifier,
+                "processes" : 2
+            },
+            "base_paths" : {"src" : self.src, "out" : os.path.join(self.dir, "out")},
+            "assets" : {"a" : ["src", "a.js"], "b" : ["src", "b.js"]},
+            "dependencies" : {"b" : ["a"]},
+            "outputs" : {
+                "main" : {
+                    "assets" : ["b"],
+                    "pipelines" : {
+                        "js-src" : {"out" : ["out", "main.js"], "fingerprint" : True},
+                        "js-includes" : {"out" : ["out", "includes.html"], "fingerprint" : True,
+                                         "path_prefix_substitutions" : {self.src : "/static"}}
+                    }
+                }
+            }
+        }
+
+    def tearDown(self):
+        super(TestAssets, self).tearDown()
+        shutil.rmtree(self.dir)
+
+    def _runs(self):
+        with open(self.minifier + ".log") as f:
+            return [os.path.basename(l.strip()) for l in f.readlines()]
+
+    def _outputs(self):
+        return [fn for fn in os.listdir(os.path.join(self.dir, "out")) if fn.startswith("main")]
+
+    def test_01_incremental_fingerprinted_build(self):
+        assets.build_assets(self.config)
+        assert sorted(self._runs()) == ["a.js", "b.js"]
+        outs = self._outputs()
+        assert len(outs) == 1
+        assert re.match(r"^main\.[0-9a-f]{10}\.js$", outs[0])
+        with open(os.path.join(self.dir, "out", outs[0])) as f:
+            assert f.read() == "var a = 1;\nvar b = 1;\n"
+        with open(os.path.join(self.dir, "out", "includes.html")) as f:
+            assert re.search(r'src="/static/a\.js\?v=[0-9a-f]{10}"', f.read())
+
+        # nothing has changed, so nothing is minified again, and the output is the same
+        assets.build_assets(self.config)
+        assert len(self._runs()) == 2
+        assert self._outputs() == outs
+
+        # only the changed source is minified, and the output gets a new name
+        with open(os.path.join(self.src, "b.js"), "w") as f:
+            f.write("var b = 22;")
+        assets.build_assets(self.config)
+        assert self._runs()[2:] == ["b.js"]
+        new_outs = self._outputs()
+        assert len(new_outs) == 1
+        assert new_outs != outs
+
+    def test_02_asset_map(self):
+        asset_map = os.path.join(self.dir, "asset_map.json")
+        self.config["parameters"]["asset_map"] = asset_map
+        assets.build_assets(self.config)
+
+        # the fingerprinted name is recorded against the name of the output
+        with open(asset_map) as f:
+            names = json.loads(f.read())
+        assert names == {"main.js" : self._outputs()[0]}
+
+    def test_03_cleanup(self):
+        tmpdir = self.config["parameters"]["tmp_dir"]
+
+        # building incrementally keeps the minified files and the manifest for next time
+        assets.build_assets(self.config)
+        assert os.path.exists(os.path.join(tmpdir, assets.MANIFEST_FILE))
+        assert len(os.listdir(os.path.join(tmpdir, "js"))) == 2
+        assert glob.glob(os.path.join(tmpdir, "*_assets.json")) == []
+
+        # otherwise, the whole tmp dir is thrown away
+        self.config["parameters"]["incremental"] = False
+        assets.build_assets(self.config)
+        assert not os.path.exists(tmpdir)
+        assert len(self._outputs()) == 1
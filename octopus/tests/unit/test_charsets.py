@@ -0,0 +1,94 @@
+from unittest import TestCase
+from octopus.lib import charsets, clcsv
+from octopus.modules.sheets import commasep
+import os, shutil, tempfile, codecs
+
+CANDIDATES = ["utf-8", "cp1252", "cp1251", "iso-8859-1", "iso-8859-2", "windows-1252", "windows-1251", "mac_roman"]
+
+WESTERN = u"Caf\u00e9 au lait, na\u00efve r\u00e9sum\u00e9, Stra\u00dfe"
+RUSSIAN = u"\u041f\u0440\u0438\u0432\u0435\u0442 \u043c\u0438\u0440, \u043a\u0430\u043a \u0434\u0435\u043b\u0430"
+POLISH = u"\u0141\u00f3d\u017a Krak\u00f3w \u017c\u00f3\u0142\u0107"
+PRICES = u"Foo,\u00a31500\nBar,\u20ac2000\n"
+QUOTES = u"\u201cx\u201d \u2013 y, don\u2019t\n"
+
+class TestCharsets(TestCase):
+    def setUp(self):
+        super(TestCharsets, self).setUp()
+        charsets.clear_cache()
+        self.dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        super(TestCharsets, self).tearDown()
+        charsets.clear_cache()
+        shutil.rmtree(self.dir)
+
+    def test_01_detect(self):
+        assert charsets.detect("plain", CANDIDATES) == "utf-8"
+        assert charsets.detect(codecs.BOM_UTF8 + WESTERN.encode("utf-8"), CANDIDATES) == "utf-8-sig"
+        assert charsets.detect(WESTERN.encode("utf-16"), CANDIDATES) == "utf-16"
+        assert charsets.detect(WESTERN.encode("utf-8"), CANDIDATES) == "utf-8"
+        assert charsets.detect(WESTERN.encode("cp1252"), CANDIDATES) == "cp1252"
+        assert charsets.detect(WESTERN.encode("mac_roman"), CANDIDATES) == "mac_roman"
+        assert charsets.detect(RUSSIAN.encode("cp1251"), CANDIDATES) == "cp1251"
+        assert charsets.detect(POLISH.encode("iso-8859-2"), CANDIDATES) == "iso-8859-2"
+
+        # currency symbols, dashes and quotes are no reason to pass over the preferred encoding
+        assert charsets.detect(PRICES.encode("cp1252"), CANDIDATES) == "cp1252"
+        assert charsets.detect((PRICES + QUOTES).encode("cp1252"), CANDIDATES) == "cp1252"
+        assert charsets.detect((PRICES + QUOTES).encode("cp1252"), ["cp1251", "cp1252"]) == "cp1251"
+        assert charsets.decode((WESTERN + u"\n" + PRICES + QUOTES).encode("cp1252"), CANDIDATES)[0] == WESTERN + u"\n" + PRICES + QUOTES
+
+        # nothing can read it
+        assert charsets.detect(WESTERN.encode("cp1252"), ["utf-8"]) is None
+        with self.assertRaises(charsets.EncodingException):
+            charsets.decode(WESTERN.encode("cp1252"), ["utf-8"])
+
+    def test_02_detect_file(self):
+        path = os.path.join(self.dir, "big.csv")
+        with open(path, "wb") as f:
+            # the non-utf-8 byte is well beyond the first block
+            f.write("a,b\n" * 50000)
+            f.write(RUSSIAN.encode("cp1251"))
+        assert charsets.detect_file(path, CANDIDATES) == "cp1251"
+
+        # the second time round, the answer comes from the cache, without the file being examined again
+        old = charsets._Detector.feed
+        def fail(*args, **kwargs):
+            raise AssertionError("detected again")
+        charsets._Detector.feed = fail
+        try:
+            assert charsets.detect_file(path, CANDIDATES) == "cp1251"
+            text, enc = charsets.decode_file(path, CANDIDATES)
+            assert enc == "cp1251"
+            assert text.endswith(RUSSIAN)
+        finally:
+            charsets._Detector.feed = old
+
+    def test_03_clcsv(self):
+        path = os.path.join(self.dir, "legacy.csv")
+        with codecs.open(path, "wb", "cp1251") as f:
+            f.write(u"Name,Greeting\r\nIvan," + RUSSIAN.replace(u",", u"") + u"\r\n")
+
+        sheet = clcsv.ClCsv(path)
+        assert sheet.input_encoding == "cp1251"
+        assert sheet.get_column("Greeting") == (u"Greeting", [RUSSIAN.replace(u",", u"")])
+
+        stream = clcsv.ClCsv(path, streaming=True)
+        assert list(stream.objects()) == [{u"Name" : u"Ivan", u"Greeting" : RUSSIAN.replace(u",", u"")}]
+
+        with self.assertRaises(clcsv.CsvReadException):
+            clcsv.ClCsv(path, try_encodings_hard=False)
+
+    def test_04_prices(self):
+        path = os.path.join(self.dir, "apc.csv")
+        with codecs.open(path, "wb", "cp1252") as f:
+            f.write(u"Name,APC\r\nFoo,\u00a31500\r\nBar,\u20ac2000\r\nBaz,\u201cx\u201d \u2013 y\r\n")
+
+        sheet = clcsv.ClCsv(path)
+        assert sheet.input_encoding == "cp1252"
+        assert sheet.get_column("APC") == (u"APC", [u"\u00a31500", u"\u20ac2000", u"\u201cx\u201d \u2013 y"])
+
+        reader = commasep.CsvReader(path=path)
+        rows = reader.read()
+        assert reader.encoding == "cp1252"
+        assert rows[2] == [u"Bar", u"\u20ac2000"]
@@ -0,0 +1,81 @@
+from unittest import TestCase
+from octopus.lib import clcsv
+import os, shutil, tempfile, codecs
+from StringIO import StringIO
+
+SHEET = u"""Title,ISSN,Price
+First,1234-5678,10
+,,
+Second,8765-4321,
+Caf\u00e9,1111-2222,30
+"""
+
+class Journals(clcsv.SheetWrapper):
+    HEADERS = {"Title" : "title", "ISSN" : "issn", "Price" : "price"}
+    OUTPUT_ORDER = ["title", "issn", "price"]
+    EMPTY_STRING_AS_NONE = True
+
+class TestClCsv(TestCase):
+    def setUp(self):
+        super(TestClCsv, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "sheet.csv")
+        with codecs.open(self.path, "wb", "utf-8") as f:
+            f.write(SHEET)
+
+    def tearDown(self):
+        super(TestClCsv, self).tearDown()
+        shutil.rmtree(self.dir)
+
+    def test_01_streaming_read(self):
+        # the streaming and in-memory readers agree
+        mem = clcsv.ClCsv(self.path, ignore_blank_rows=True)
+        stream = clcsv.ClCsv(self.path, ignore_blank_rows=True, streaming=True)
+        assert stream.headers() == mem.headers() == [u"Title", u"ISSN", u"Price"]
+        assert list(stream.objects()) == list(mem.objects())
+        assert list(stream.triples()) == list(mem.triples())
+
+        objs = list(Journals(self.path, streaming=True).objects())
+        assert len(objs) == 3
+        assert objs[1] == {"title" : u"Second", "issn" : u"8765-4321", "price" : None}
+        assert objs[2]["title"] == u"Caf\u00e9"
+
+        with self.assertRaises(clcsv.CsvStructureException):
+            stream.get_column(0)
+
+    def test_02_streaming_write(self):
+        out = StringIO()
+        sheet = Journals(writer=out, streaming=True)
+        sheet.add_object({"title" : u"Caf\u00e9", "issn" : "1234-5678"})
+        sheet.add_object({"price" : 10, "title" : "Second"})
+
+        # rows are written out as they are added
+        assert out.getvalue() == u"Title,ISSN,Price\r\nCaf\u00e9,1234-5678,\r\nSecond,,10\r\n"
+        sheet.save()
+
+    def test_03_save(self):
+        sheet = clcsv.ClCsv(self.path)
+        sheet.set_column("Extra", [u"a"])
+        out = os.path.join(self.dir, "out.csv")
+        sheet.file_object = codecs.open(out, "w+b", "utf-8")
+        sheet.save()
+        with codecs.open(out, "rb", "utf-8") as f:
+            lines = f.read().split(u"\r\n")
+        assert lines[0] == u"Title,ISSN,Price,Extra"
+        assert lines[1] == u"First,1234-5678,10,a"
+        assert lines[2] == u",,,"
+        assert lines[4] == u"Caf\u00e9,1111-2222,30,"
+        assert sheet.get_rownumber(u"Second") == 3
+
+    def test_04_duplicate_headers(self):
+        path = os.path.join(self.dir, "dupes.csv")
+        with open(path, "wb") as f:
+            f.write("a,b,a\r\n1,2,3\r\n")
+
+        # the first column with the header is used, in both modes
+        sheet = clcsv.ClCsv(path)
+        assert sheet.get_column("a") == (u"a", [u"1"])
+        assert list(sheet.objects()) == [{u"a" : u"1", u"b" : u"2"}]
+        stream = clcsv.ClCsv(path, streaming=True)
+        assert list(stream.objects()) == [{u"a" : u"1", u"b" : u"2"}]
+
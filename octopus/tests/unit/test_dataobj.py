@@ -777,3 +777,174 @@ class TestImport(TestCase):
                 super(A, self).__init__()
 
         a = A()
+
+    def test_11_accessor_plans(self):
+        class B(dataobj.DataObj):
+            def __init__(self, raw=None):
+                struct = {
+                    "fields" : {
+                        "one" : {"coerce" : "unicode"},
+                        "num" : {"coerce" : "integer", "get__default" : 0}
+                    }
+                }
+                self._add_struct(struct)
+                super(B, self).__init__(raw, expose_data=True)
+
+        # equivalent structs on different instances share the compiled plans
+        b1 = B({"one" : "first"})
+        b2 = B({"one" : "second", "num" : "2"})
+        assert b1.one == u"first"
+        assert b2.one == u"second"
+        assert b1.num == 0
+        assert b2.num == 2
+        assert b1._get_accessor_plans() is b2._get_accessor_plans()
+
+        # setting through the compiled plan still coerces
+        b1.num = "5"
+        assert b1.data["num"] == 5
+
+        # adding to the struct invalidates the plans
+        with self.assertRaises(AttributeError):
+            b1.two
+        b1._add_struct({"fields" : {"two" : {"coerce" : "unicode"}}})
+        assert b1._accessor_plans is None
+        b1.two = 2
+        assert b1.two == u"2"
+        assert b1._get_accessor_plans() is not b2._get_accessor_plans()
+
+    def test_12_compile_struct(self):
+        struct = {
+            "fields" : {
+                "one" : {"coerce" : "unicode"},
+                "two" : {"coerce" : "integer", "allowed_values" : [1, 2]}
+            },
+            "objects" : ["three", "four"],
+            "lists" : {
+                "five" : {"contains" : "field", "coerce" : "integer", "unique" : "true"},
+                "six" : {"contains" : "object"},
+                "seven" : {"contains" : "object"}
+            },
+            "required" : ["one"],
+            "structs" : {
+                "four" : {
+                    "fields" : {
+                        "alpha" : {"coerce" : "integer"}
+                    }
+                },
+                "seven" : {
+                    "fields" : {
+                        "beta" : {"coerce" : "integer"}
+                    }
+                }
+            }
+        }
+
+        coerce = {
+            "unicode" : dataobj.to_unicode(),
+            "integer" : dataobj.to_int()
+        }
+
+        compiled = dataobj.compile_struct(struct, coerce)
+
+        obj = {
+            "one" : "hello",
+            "two" : "2",
+            "three" : {"anything" : "goes"},
+            "four" : {"alpha" : "4"},
+            "five" : ["1", "1", "2"],
+            "six" : [{"an" : "object"}],
+            "seven" : [{"beta" : "7"}, {"beta" : 8}]
+        }
+
+        # the compiled struct behaves the same as construct, and can be re-used
+        new = compiled.construct(obj)
+        assert new == dataobj.construct(obj, struct, coerce)
+        assert new == compiled.construct(obj)
+        assert new["five"] == [1, 2]
+        assert new["seven"] == [{"beta" : 7}, {"beta" : 8}]
+
+        # unstructured objects are not shared with the source
+        assert new["three"] is not obj["three"]
+
+        # empty lists are dropped
+        obj["six"] = []
+        assert "six" not in compiled.construct(obj)
+
+        # and the failures are the same
+        for bad in [{}, {"one" : "hello", "eight" : "8"}, {"one" : "hello", "two" : 3},
+                    {"one" : "hello", "seven" : [{"beta" : "beta"}]}, {"one" : "hello", "four" : "four"}]:
+            with self.assertRaises(dataobj.DataStructureException):
+                compiled.construct(bad)
+
+        # but we can choose to prune instead of rejecting unknown fields
+        new = compiled.construct({"one" : "hello", "eight" : "8"}, silent_prune=True)
+        assert new == {"one" : u"hello"}
+
+    def test_13_frozen(self):
+        raw = {
+            "title" : "Test Title",
+            "name" : "Test Name",
+            "objy" : {
+                "one" : "first",
+                "two" : "second"
+            },
+            "listy" : [
+                {
+                    "three" : "third",
+                    "four" : "fourth"
+                }
+            ]
+        }
+
+        # reading from a frozen object uses the raw data directly
+        do = TestDataObj.frozen(raw)
+        assert do.data is raw
+        assert do.my_title == "Test Title"
+        assert do.the_name == "Test Name"
+        assert do.raw_obj is raw["objy"]
+        assert do.wrap_list[0].data is raw["listy"][0]
+        assert do.clone().data is raw
+
+        # objects wrapped from the frozen object can't be modified independently
+        with self.assertRaises(dataobj.DataSchemaException):
+            do.wrap_obj._set_single("one", "changed")
+        assert raw["objy"]["one"] == "first"
+
+        # the first modification copies the data, leaving the raw data alone
+        do.the_name = "Other Name"
+        assert do.the_name == "Other Name"
+        assert do.data is not raw
+        assert raw["name"] == "Test Name"
+        assert do.wrap_obj.data.get("one") == "first"
+
+        # list reads don't bind anything into the raw data
+        do = TestDataObj.frozen(raw)
+        assert do.my_list == []
+        assert "my_list" not in raw
+
+        # invalid data is only found when it is read
+        raw = {"name" : "Test Name", "objy" : "not an object"}
+        do = TestDataObj.frozen(raw)
+        assert do.the_name == "Test Name"
+        with self.assertRaises(dataobj.DataStructureException):
+            do.raw_obj
+
+        # a modification which fails to construct the data leaves the object frozen, and the raw data alone
+        with self.assertRaises(dataobj.DataStructureException):
+            do.the_name = "Other Name"
+        with self.assertRaises(dataobj.DataStructureException):
+            do.the_name = "Other Name"
+        assert do.data is raw
+        assert raw == {"name" : "Test Name", "objy" : "not an object"}
+
+        # objects wrapped before the thaw stay read-only, but can be got again from the thawed object
+        raw = {"objy" : {"one" : "first"}}
+        do = TestDataObj.frozen(raw)
+        before = do.wrap_obj
+        do.thaw()
+        with self.assertRaises(dataobj.DataSchemaException):
+            before._set_single("one", "changed")
+        after = do.wrap_obj
+        after._set_single("one", "changed")
+        assert do.data["objy"]["one"] == "changed"
+        assert raw["objy"]["one"] == "first"
@@ -0,0 +1,46 @@
+from unittest import TestCase
+from octopus.lib import dates
+from datetime import datetime
+
+class TestDates(TestCase):
+    def setUp(self):
+        super(TestDates, self).setUp()
+        dates.clear_cache()
+
+    def tearDown(self):
+        super(TestDates, self).tearDown()
+        dates.clear_cache()
+
+    def test_01_parse(self):
+        # the hand-written ISO parser agrees with strptime
+        for s, f in [("2014-09-23T11:30:45Z", dates.ISO_DATETIME), ("2013-08-05 16:15:07", dates.ISO_SPACED), ("2014-09-23", dates.ISO_DATE)]:
+            assert dates.parse(s) == datetime.strptime(s, f)
+            assert dates.parse(s, format=f, guess=False) == datetime.strptime(s, f)
+        with self.assertRaises(ValueError):
+            dates.parse("2014-09-23", format=dates.ISO_DATETIME, guess=False)
+
+        # the RFC 3339 forms which none of the formats read
+        assert dates.parse("2014-09-23T11:30:45.5+01:00") == datetime(2014, 9, 23, 10, 30, 45, 500000)
+        assert dates.parse("2014-09-23T11:30Z") == datetime(2014, 9, 23, 11, 30)
+
+        # everything else still goes through the formats
+        assert dates.parse(" 2014-9-3 ") == datetime(2014, 9, 3)
+        assert dates.parse("29/02/80") == datetime(1980, 2, 29)
+        assert dates.parse("31-Jul-13") == datetime(2013, 7, 31)
+        with self.assertRaises(ValueError):
+            dates.parse("2014-13-01")
+
+        assert dates.reformat("23/09/2014", out_format="%Y-%m-%d") == u"2014-09-23"
+
+    def test_02_parse_many(self):
+        parsed = dates.parse_many(["01/02/03", "01/02/1980", "nonsense", "01/02/03", "2014-09-23"], ignore_errors=True)
+        assert parsed == [datetime(2003, 2, 1), datetime(1980, 2, 1), None, datetime(2003, 2, 1), datetime(2014, 9, 23)]
+
+        with self.assertRaises(ValueError):
+            dates.parse_many(["2014-09-23", "nonsense"])
+
+        # the format which last worked is tried first
+        parser = dates.DateParser()
+        parser.parse("21 June 2014")
+        assert parser.last == "%d %B %Y"
+        assert parser.parse("22 June 2014") == datetime(2014, 6, 22)
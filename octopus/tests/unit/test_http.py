@@ -0,0 +1,281 @@
+from unittest import TestCase
+from octopus.lib import http, httpcache
+from requests.cookies import MockRequest
+import time, requests, cookielib, tempfile, shutil, os
+
+class TestHttp(TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_01_session_per_host(self):
+        sm = http.SessionManager(idle_expiry=0)
+
+        s1 = sm.session("https://www.ebi.ac.uk/europepmc/webservices/rest/search")
+        s2 = sm.session("HTTPS://WWW.EBI.AC.UK/europepmc/webservices/rest/PMC1234/fullTextXML")
+        s3 = sm.session("http://www.ebi.ac.uk/")
+        s4 = sm.session("https://doaj.org/api/v1/search/articles/issn:1234-5678")
+
+        assert s1 is s2
+        assert s1 is not s3
+        assert s1 is not s4
+
+        sm.close()
+        assert sm.session("https://www.ebi.ac.uk/") is not s1
+
+    def test_02_idle_expiry(self):
+        sm = http.SessionManager(idle_expiry=0.01)
+        s1 = sm.session("https://doaj.org/")
+        time.sleep(0.02)
+        s2 = sm.session("https://doaj.org/")
+        assert s1 is not s2
+        assert sm.session("https://doaj.org/") is s2
+
+    def test_03_no_cookies(self):
+        sm = http.SessionManager()
+        s = sm.session("https://doaj.org/")
+
+        # cookies set by responses are refused, so they can't leak between callers sharing the session
+        request = MockRequest(requests.Request("GET", "https://doaj.org/").prepare())
+        cookie = cookielib.Cookie(0, "name", "value", None, False, "doaj.org", True, False, "/", True,
+                                  False, None, False, None, None, {})
+        assert not s.cookies._policy.set_ok(cookie, request)
+
+    def test_04_response_stream(self):
+        body = "abcdefghij" * 100
+
+        # read all of it, in pieces of any size
+        stream = http.ResponseStream(http.MockResponse(200, body), chunk_size=64)
+        assert stream.read(5) == "abcde"
+        assert stream.read(100) == body[5:105]
+        assert stream.read() == body[105:]
+        assert stream.read() == ""
+        assert stream.downloaded_bytes == 1000
+
+        # small reads walk through each chunk, and iterating picks up where reading left off
+        stream = http.ResponseStream(http.MockResponse(200, body), chunk_size=64)
+        assert "".join(stream.read(3) for i in range(30)) == body[:90]
+        assert stream.read(0) == ""
+        assert "".join(stream) == body[90:]
+
+        # cut off part way through, at the end of the chunk which crosses the cut off
+        stream = http.ResponseStream(http.MockResponse(200, body), chunk_size=64, cut_off=100)
+        assert stream.read() == body[:128]
+
+        # size limits are enforced as we go
+        stream = http.ResponseStream(http.MockResponse(200, body), chunk_size=64, size_limit=500)
+        with self.assertRaises(http.SizeExceededException):
+            stream.read()
+
+        # and up front if the headers tell us
+        with self.assertRaises(http.SizeExceededException):
+            http.ResponseStream(http.MockResponse(200, body, headers={"content-length" : "1000"}), size_limit=500)
+
+    def test_05_fetch_many(self):
+        import BaseHTTPServer, threading
+
+        hits = {}
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                hits[self.path] = hits.get(self.path, 0) + 1
+                # the "flaky" resources fail the first time they are requested
+                if self.path.startswith("/flaky") and hits[self.path] == 1:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(self.path)))
+                self.end_headers()
+                self.wfile.write(self.path)
+
+            def log_message(self, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer(("localhost", 0), Handler)
+        t = threading.Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        try:
+            base = "http://localhost:{x}".format(x=server.server_port)
+            reqs = [base + "/one", {"url" : base + "/flaky/two"}, base + "/three", base + "/flaky/four"]
+
+            # in order, retrying the flaky ones
+            results = list(http.fetch_many(reqs, concurrency=3, per_host_limit=2, retries=2, retry_codes=[503], back_off_factor=0.01))
+            assert [i for i, r in results] == [0, 1, 2, 3]
+            assert [r.text for i, r in results] == ["/one", "/flaky/two", "/three", "/flaky/four"]
+            assert hits["/flaky/two"] == 2
+
+            # as they complete, and with the retries switched off for one request
+            reqs[3] = {"url" : base + "/flaky/five", "retries" : 0}
+            results = dict(http.fetch_many(reqs, ordered=False, retry_codes=[503], back_off_factor=0.01))
+            assert sorted(results.keys()) == [0, 1, 2, 3]
+            assert results[3].status_code == 503
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_06_response_cache(self):
+        def response(status, content):
+            resp = requests.Response()
+            resp.status_code = status
+            resp._content = content
+            resp.encoding = "utf-8"
+            resp.headers["Content-Type"] = "application/json"
+            return resp
+
+        calls = []
+        def fetch(status, content):
+            def fn():
+                calls.append(content)
+                return response(status, content)
+            return fn
+
+        dir = tempfile.mkdtemp()
+        try:
+            sqlite = httpcache.SQLiteTier(os.path.join(dir, "cache.db"))
+            cache = httpcache.ResponseCache([httpcache.MemoryTier(2), sqlite], ttl=60, negative_ttl=60)
+
+            # the first request is fetched, and repeats come from the cache
+            r1 = cache.get("http://example.com/1?apiKey=secret", fetch(200, '{"a" : 1}'))
+            r2 = cache.get("http://example.com/1?apiKey=secret", fetch(200, '{"a" : 2}'))
+            assert calls == ['{"a" : 1}']
+            assert r2.from_cache
+            assert r2.json() == {"a" : 1}
+            assert r2.headers["content-type"] == "application/json"
+
+            # 404s are cached, other errors are not
+            cache.get("http://example.com/missing", fetch(404, "gone"))
+            assert cache.get("http://example.com/missing", fetch(200, "found")).status_code == 404
+            cache.get("http://example.com/broken", fetch(500, "broken"))
+            assert cache.get("http://example.com/broken", fetch(200, "fixed")).status_code == 200
+
+            # things which fall out of the LRU are found on disk, without the url stored in the clear
+            r = cache.get("http://example.com/1?apiKey=secret", fetch(200, "refetched"))
+            assert r.json() == {"a" : 1}
+            with open(os.path.join(dir, "cache.db"), "rb") as f:
+                assert "secret" not in f.read()
+
+            # stale responses are served while they are refreshed in the background
+            stale = httpcache.ResponseCache([httpcache.MemoryTier()], ttl=0.01, stale_ttl=60)
+            stale.get("http://example.com/s", fetch(200, "old"))
+            time.sleep(0.02)
+            assert stale.get("http://example.com/s", fetch(200, "new")).content == "old"
+            for i in range(100):
+                if stale.lookup(httpcache.cache_key("http://example.com/s"))["content"] == "new":
+                    break
+                time.sleep(0.01)
+            assert stale.get("http://example.com/s", fetch(200, "newer")).content == "new"
+        finally:
+            shutil.rmtree(dir)
+
+    def test_07_fetch_many_min_interval(self):
+        import BaseHTTPServer, threading
+
+        starts = []
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                starts.append(time.time())
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer(("localhost", 0), Handler)
+        t = threading.Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        try:
+            base = "http://localhost:{x}".format(x=server.server_port)
+            reqs = [base + "/" + str(i) for i in range(4)]
+            results = list(http.fetch_many(reqs, concurrency=4, per_host_limit=0, min_interval=0.05))
+            assert len(results) == 4
+            starts.sort()
+            for a, b in zip(starts, starts[1:]):
+                assert b - a >= 0.04
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_08_rate_limiter(self):
+        limiter = http.RateLimiter(0.05)
+        started = time.time()
+        for i in range(4):
+            limiter.wait()
+        elapsed = time.time() - started
+        assert elapsed >= 0.15
+        assert elapsed < 1
+
+    def test_09_response_cache_limits(self):
+        def fetch(content):
+            def fn():
+                resp = requests.Response()
+                resp.status_code = 200
+                resp._content = content
+                return resp
+            return fn
+
+        # the memory tier is capped by size, and never holds oversized responses
+        memory = httpcache.MemoryTier(10, max_bytes=10, max_entry_bytes=6)
+        cache = httpcache.ResponseCache([memory], ttl=60)
+        cache.get("http://example.com/1", fetch("aaaaa"))
+        cache.get("http://example.com/2", fetch("bbbbb"))
+        cache.get("http://example.com/3", fetch("ccccc"))
+        assert memory.get(httpcache.cache_key("http://example.com/1")) is None
+        assert memory.get(httpcache.cache_key("http://example.com/3")) is not None
+        assert memory._bytes == 10
+        cache.get("http://example.com/full", fetch("x" * 100))
+        assert memory.get(httpcache.cache_key("http://example.com/full")) is None
+        assert memory._bytes == 10
+
+        # responses to the same url with different request options are cached separately
+        assert cache.get("http://example.com/q", fetch("a"), request_args={"params" : {"q" : "a"}}).content == "a"
+        assert cache.get("http://example.com/q", fetch("b"), request_args={"params" : {"q" : "b"}}).content == "b"
+        assert cache.get("http://example.com/q", fetch("c"), request_args={"params" : {"q" : "a"}}).content == "a"
+        assert cache.get("http://example.com/q", fetch("d"), request_args={"headers" : {"Accept" : "text/xml"}}).content == "d"
+
+        # and ones whose options can't be keyed are not cached at all
+        assert cache.get("http://example.com/q", fetch("e"), request_args={"auth" : object()}).content == "e"
+        assert cache.get("http://example.com/q", fetch("f"), request_args={"auth" : object()}).content == "f"
+        assert cache.get("http://example.com/q", fetch("g"), request_args={"stream" : True}).content == "g"
+
+    def test_10_get_spooled(self):
+        body = "abcdefghij" * 100
+        requested = []
+        def make_request(method, url, **kwargs):
+            requested.append((method, url, kwargs.get("stream")))
+            return http.MockResponse(200, body)
+
+        old = http._make_request
+        http._make_request = make_request
+        try:
+            # small downloads stay in memory
+            resp, spool, size = http.get_spooled("http://example.com/small", chunk_size=64, spool_threshold=2000)
+            assert requested == [("GET", "http://example.com/small", True)]
+            assert resp.status_code == 200
+            assert size == 1000
+            assert not spool._rolled
+            assert spool.read() == body
+            spool.close()
+
+            # larger ones are moved to disk once they pass the threshold, and read back from the start
+            resp, spool, size = http.get_spooled("http://example.com/large", chunk_size=64, spool_threshold=100)
+            assert size == 1000
+            assert spool._rolled
+            assert spool.read() == body
+            spool.close()
+
+            # the size limit still applies
+            with self.assertRaises(http.SizeExceededException):
+                http.get_spooled("http://example.com/large", chunk_size=64, size_limit=500)
+
+            # and failed requests come back empty
+            http._make_request = lambda method, url, **kwargs: None
+            assert http.get_spooled("http://example.com/missing") == (None, None, 0)
+        finally:
+            http._make_request = old
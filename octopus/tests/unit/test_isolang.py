@@ -0,0 +1,24 @@
+from unittest import TestCase
+from octopus.lib import isolang
+
+class TestIsolang(TestCase):
+    def test_01_find(self):
+        assert isolang.find("EN")["alpha3"] == "eng"
+        assert isolang.find("deu")["alpha2"] == "de"
+        assert isolang.find("french")["alt3"] == "fra"
+        assert isolang.find(u"fran\u00e7ais")["alpha3"] == "fre"
+        assert isolang.find("Elvish") is None
+
+        # the index gives the same answers as scanning the table
+        for row in isolang.ISO_639_2:
+            for cell in row:
+                expected = None
+                for r in isolang.ISO_639_2:
+                    if cell.lower() in [c.lower() for c in r]:
+                        expected = r
+                        break
+                assert isolang.find(cell) == isolang.as_dict(expected)
+
+    def test_02_find_many(self):
+        found = isolang.find_many(["en", None, "nonsense", "ger"])
+        assert [f["alpha3"] if f is not None else None for f in found] == ["eng", None, None, "ger"]
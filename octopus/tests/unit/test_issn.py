@@ -0,0 +1,100 @@
+import unittest
+from octopus.modules import identifiers
+from octopus.modules.identifiers import issn
+
+class TestISSN(unittest.TestCase):
+    def setUp(self):
+        pass
+
+    def tearDown(self):
+        pass
+
+    def test_01_normalise_ISSN(self):
+        assert issn.normalise("ISSN: 1234-567x") == "1234-567X"
+        assert issn.normalise(" 12345678 ") == "1234-5678"
+
+    def test_02_valid_ISSN(self):
+        identifier = "1234-5678"
+        identifier = issn.normalise(identifier)
+        assert identifier == "1234-5678"
+
+    def test_03_invalid_ISSN(self):
+        identifier = "ImnotanISSN"
+        self.assertRaises(ValueError, issn.normalise, identifier)
+
+    def test_04_normalise_all(self):
+        valid, invalid = identifiers.normalise_all(["1234-5678", "issn:12345678", "nope", "2049-3630"], issn.normalise)
+        assert valid == ["1234-5678", "2049-3630"]
+        assert len(invalid) == 1
+        assert invalid[0][0] == "nope"
+        assert isinstance(invalid[0][1], ValueError)
+
+    def test_05_batch_lookup(self):
+        import BaseHTTPServer, threading, urllib
+
+        requests = []
+        class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+            def do_GET(self):
+                # answers with all the ISSNs in the query, except 0000-0000 which it never finds
+                ids = urllib.unquote(self.path[1:]).split(",")
+                requests.append(ids)
+                body = ",".join([i for i in ids if i != "0000-0000"])
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = BaseHTTPServer.HTTPServer(("localhost", 0), Handler)
+        t = threading.Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        try:
+            base = "http://localhost:{x}/".format(x=server.server_port)
+
+            def request(batch):
+                return base + ",".join(batch)
+
+            def parse(batch, resp):
+                if "9999-9999" in batch:
+                    raise ValueError("bad batch")
+                return dict([(i, "found " + i) for i in resp.text.split(",") if i != ""])
+
+            source = ["1234-5678", "12345678", "0000-0000", "2049-3630", "nope"]
+            results = dict(identifiers.batch_lookup(source, issn.normalise, request, parse, batch_size=2, concurrency=2))
+
+            assert results["1234-5678"] == "found 1234-5678"
+            assert results["2049-3630"] == "found 2049-3630"
+            assert results["0000-0000"] is None
+            assert isinstance(results["nope"], ValueError)
+            assert len(results) == 4
+
+            # the duplicate was never requested, and the missing ISSN was tried again on its own
+            assert sorted([sorted(r) for r in requests]) == [["0000-0000"], ["0000-0000", "1234-5678"], ["2049-3630"]]
+
+            # exceptions from parsing are the result for the whole batch
+            results = dict(identifiers.batch_lookup(["9999-9999", "1234-5678", "2049-3630"], issn.normalise, request, parse, batch_size=2))
+            assert isinstance(results["9999-9999"], ValueError)
+            assert isinstance(results["1234-5678"], ValueError)
+            assert results["2049-3630"] == "found 2049-3630"
+
+            # requests which can't be made, or which fail, are the result for the whole batch, and the others carry on
+            def bad_request(batch):
+                if "9999-9999" in batch:
+                    raise ValueError("bad request")
+                if "1234-5678" in batch:
+                    return "notaurl"
+                return request(batch)
+            results = dict(identifiers.batch_lookup(["9999-9999", "1234-5678", "2049-3630"], issn.normalise, bad_request, parse, batch_size=1))
+            assert isinstance(results["9999-9999"], ValueError)
+            assert isinstance(results["1234-5678"], Exception)
+            assert results["2049-3630"] == "found 2049-3630"
+        finally:
+            server.shutdown()
+            server.server_close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+from unittest import TestCase
+from octopus.lib import locality, coerce
+
+class TestLocality(TestCase):
+    def test_01_currency_codes(self):
+        assert locality.currency_code_for("Euro") == "EUR"
+        assert locality.currency_code_for("gbp") == "GBP"
+        assert locality.currency_code_for("Pound Sterling") == "GBP"
+        assert locality.currency_code_for("doubloons") is None
+        assert locality.currency_codes_for(["usd", None, "doubloons"]) == ["USD", None, None]
+
+        assert coerce.to_currency_code("euro") == "EUR"
+        with self.assertRaises(ValueError):
+            coerce.to_currency_code("doubloons")
+
+    def test_02_custom_data(self):
+        l = locality.Locality({"XX" : {"currency_alphabetic_code" : "XXX", "currency_name" : "Test Dollar"}})
+        assert l.currency_codes() == ["XXX"]
+        assert l.currency_code_for("test dollar") == "XXX"
+        assert l.currency_code_for("Euro") is None
@@ -0,0 +1,91 @@
+from unittest import TestCase
+from octopus.core import app
+from octopus.lib import plugin
+
+class TestPlugin(TestCase):
+    def setUp(self):
+        super(TestPlugin, self).setUp()
+        plugin.reset()
+        self.old_paths = app.config.get("PLUGIN_CONFIG_PATHS")
+        self.old_test_cfg = app.config.get("TEST_PLUGIN_CFG")
+        self.old_class_refs = app.config.get("PLUGIN_CLASS_REFS")
+
+    def tearDown(self):
+        super(TestPlugin, self).tearDown()
+        plugin.reset()
+        app.config["PLUGIN_CONFIG_PATHS"] = self.old_paths
+        app.config["TEST_PLUGIN_CFG"] = self.old_test_cfg
+        if self.old_class_refs is None:
+            app.config.pop("PLUGIN_CLASS_REFS", None)
+        else:
+            app.config["PLUGIN_CLASS_REFS"] = self.old_class_refs
+
+    def test_01_load(self):
+        assert plugin.load_class("octopus.lib.plugin.PluginException") is plugin.PluginException
+        assert plugin.load_function("octopus.lib.plugin.resolve") is plugin.resolve
+
+        # failures are remembered, and not imported again
+        imports = []
+        old = plugin.load_function_raw
+        def counting(path):
+            imports.append(path)
+            return old(path)
+        plugin.load_function_raw = counting
+        try:
+            assert plugin.load_function("octopus.lib.plugin.no_such_function") is None
+            assert plugin.load_function("octopus.lib.plugin.no_such_function") is None
+            assert plugin.load_function("octopus.lib.plugin.reset") is plugin.reset
+            assert plugin.load_function("octopus.lib.plugin.reset") is plugin.reset
+        finally:
+            plugin.load_function_raw = old
+        assert imports == ["octopus.lib.plugin.no_such_function", "octopus.lib.plugin.reset"]
+
+        plugin.register("my.plugin", plugin.reset)
+        assert plugin.load_function("my.plugin") is plugin.reset
+
+    def test_02_initialise(self):
+        app.config["TEST_PLUGIN_CFG"] = {
+            "one" : {"dao" : "octopus.lib.plugin.PluginException", "filters" : ["octopus.lib.plugin.reset"]},
+            "two" : {"dao" : "octopus.lib.plugin.PluginException", "filters" : []},
+            "three" : {"filters" : None}
+        }
+        app.config["PLUGIN_CONFIG_PATHS"] = ["TEST_PLUGIN_CFG.*.dao", "TEST_PLUGIN_CFG.*.filters.*", "NO_SUCH_CFG.*"]
+        assert sorted(plugin.configured_paths()) == ["octopus.lib.plugin.PluginException", "octopus.lib.plugin.reset"]
+        plugin.initialise()
+
+        app.config["TEST_PLUGIN_CFG"]["two"]["dao"] = "octopus.lib.plugin.NoSuchClass"
+        with self.assertRaises(plugin.PluginException):
+            plugin.initialise()
+
+    def test_03_overrides(self):
+        # a class override set in the config still applies after the plugins have been resolved at startup
+        class Override(object):
+            pass
+        app.config["PLUGIN_CLASS_REFS"] = {"octopus.lib.plugin.PluginException" : Override}
+        app.config["TEST_PLUGIN_CFG"] = {"one" : {"dao" : "octopus.lib.plugin.PluginException"}}
+        app.config["PLUGIN_CONFIG_PATHS"] = ["TEST_PLUGIN_CFG.*.dao"]
+
+        plugin.initialise()
+        assert plugin.load_class("octopus.lib.plugin.PluginException") is Override
+        assert plugin.resolve("octopus.lib.plugin.PluginException") is Override
+
+        # the function loader has its own overrides, so isn't affected
+        assert plugin.load_function("octopus.lib.plugin.PluginException") is plugin.PluginException
+
+    def test_04_classes_resolved(self):
+        # classes resolved at startup are not imported again when they are used
+        app.config["TEST_PLUGIN_CFG"] = {"one" : {"dao" : "octopus.lib.plugin.PluginException", "filters" : ["octopus.lib.plugin.reset"]}}
+        app.config["PLUGIN_CONFIG_PATHS"] = ["TEST_PLUGIN_CFG.*.dao", "TEST_PLUGIN_CFG.*.filters.*"]
+        plugin.initialise()
+
+        old_class, old_function = plugin.load_class_raw, plugin.load_function_raw
+        def fail(path):
+            raise AssertionError("imported again: " + path)
+        plugin.load_class_raw = fail
+        plugin.load_function_raw = fail
+        try:
+            assert plugin.load_class("octopus.lib.plugin.PluginException") is plugin.PluginException
+            assert plugin.load_function("octopus.lib.plugin.reset") is plugin.reset
+        finally:
+            plugin.load_class_raw, plugin.load_function_raw = old_class, old_function
+
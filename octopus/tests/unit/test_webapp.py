@@ -0,0 +1,94 @@
+from unittest import TestCase
+from octopus.core import app
+from octopus.lib import webapp
+import os, shutil, tempfile, gzip, mimetypes
+
+class TestWebapp(TestCase):
+    def setUp(self):
+        super(TestWebapp, self).setUp()
+        self.dir = tempfile.mkdtemp()
+        self.first = os.path.join(self.dir, "first")
+        self.second = os.path.join(self.dir, "second")
+        os.makedirs(os.path.join(self.first, "js"))
+        os.makedirs(os.path.join(self.second, "js"))
+        with open(os.path.join(self.first, "js", "app.js"), "w") as f:
+            f.write("var first = 1;")
+        with open(os.path.join(self.second, "js", "app.js"), "w") as f:
+            f.write("var second = 1;")
+        with open(os.path.join(self.second, "js", "other.js"), "w") as f:
+            f.write("var other = 1;")
+        g = gzip.open(os.path.join(self.first, "js", "app.js.gz"), "wb")
+        g.write("var first = 1;")
+        g.close()
+
+        self.old_index = webapp._static_index
+        self.old_precompressed = app.config.get("STATIC_PRECOMPRESSED")
+        webapp._static_index = webapp.StaticIndex(dirs=[self.first, self.second], reload=False)
+        app.config["STATIC_PRECOMPRESSED"] = []
+
+    def tearDown(self):
+        super(TestWebapp, self).tearDown()
+        webapp._static_index = self.old_index
+        app.config["STATIC_PRECOMPRESSED"] = self.old_precompressed
+        shutil.rmtree(self.dir)
+
+    def _get(self, path, headers=None):
+        with app.test_request_context("/static/" + path, headers=headers or {}):
+            try:
+                return webapp.custom_static(path)
+            except Exception as e:
+                return getattr(e, "code", e)
+
+    def test_01_index(self):
+        # the first directory wins, and anything else is found in the later ones
+        resp = self._get("js/app.js")
+        assert resp.status_code == 200
+        assert "".join(resp.response) == "var first = 1;"
+        assert "".join(self._get("js/other.js").response) == "var other = 1;"
+        assert self._get("js/missing.js") == 404
+        assert self._get("../first/js/app.js") == 404
+
+    def test_02_conditional(self):
+        resp = self._get("js/app.js")
+        etag = resp.headers.get("ETag")
+        assert etag is not None and not etag.startswith("W/")
+        assert resp.headers.get("Last-Modified") is not None
+
+        resp = self._get("js/app.js", headers={"If-None-Match" : etag})
+        assert resp.status_code == 304
+
+        resp = self._get("js/app.js", headers={"If-None-Match" : '"something-else"'})
+        assert resp.status_code == 200
+
+    def test_03_precompressed(self):
+        app.config["STATIC_PRECOMPRESSED"] = ["br", "gzip"]
+        resp = self._get("js/app.js", headers={"Accept-Encoding" : "gzip, deflate"})
+        assert resp.headers.get("Content-Encoding") == "gzip"
+        assert resp.mimetype == mimetypes.guess_type("app.js")[0]
+        assert "Accept-Encoding" in resp.headers.get("Vary")
+
+        resp = self._get("js/app.js")
+        assert resp.headers.get("Content-Encoding") is None
+
+        # no variant for this one
+        resp = self._get("js/other.js", headers={"Accept-Encoding" : "gzip"})
+        assert resp.headers.get("Content-Encoding") is None
+
+    def test_04_asset_path(self):
+        old = app.config.get("ASSET_MAP_FILE")
+        try:
+            app.config["ASSET_MAP_FILE"] = None
+            assert webapp.asset_path("js/app.js") == "js/app.js"
+
+            path = os.path.join(self.dir, "asset_map.json")
+            with open(path, "w") as f:
+                f.write('{"js/app.js" : "js/app.0123456789.js"}')
+            app.config["ASSET_MAP_FILE"] = path
+            assert webapp.asset_path("js/app.js") == "js/app.0123456789.js"
+            assert webapp.asset_path("js/other.js") == "js/other.js"
+
+            with app.test_request_context("/"):
+                assert app.jinja_env.from_string('{{ asset_path("js/app.js") }}').render() == "js/app.0123456789.js"
+        finally:
+            app.config["ASSET_MAP_FILE"] = old
+            webapp._asset_map = None